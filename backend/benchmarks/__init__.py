@@ -0,0 +1,4 @@
+"""
+Benchmark scripts for the Everglow backend.
+Run from the backend directory, e.g. `python -m benchmarks.bench_voice_audio`.
+"""
@@ -0,0 +1,120 @@
+"""
+bench_catalog_memory.py
+Per-worker memory of the product catalog: private pandas copies vs the shared Arrow segment
+(services/shared_catalog.py).
+
+Starts N worker processes per mode, each loading a synthetic catalog the way a uvicorn worker
+does (the DataFrame, an ID index and the category/tag/ingredient vocabularies), and reports every
+worker's RSS before and after loading, with the private (anonymous) and shared parts and PSS,
+which splits shared pages between the workers mapping them. All workers of a mode are measured
+while they are alive together.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_catalog_memory --workers 4 --products 50000
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from benchmarks.fakes import make_synthetic_catalog
+from services.shared_catalog import SHARED_CATALOG_DIR, attach_or_publish, process_memory
+
+MEMORY_FIELDS = ("rss", "rss_anon", "rss_shmem", "pss")
+
+
+def _load_private(source: str):
+    import pandas as pd
+    df = pd.read_parquet(source)
+    ids = {pid: row for row, pid in enumerate(df.index)}
+    vocabularies = (
+        sorted(set(df["category"].str.strip().str.lower())),
+        sorted({t.strip().lower() for tags in df["tags"] for t in str(tags).split("|") if t.strip()}),
+        sorted({i.strip().lower() for ingredients in df["top_ingredients"] for i in str(ingredients).split(";") if i.strip()}),
+    )
+    return df, ids, vocabularies
+
+
+def _load_shared(source: str, directory: str):
+    import pandas as pd
+    shared = attach_or_publish(source, lambda: pd.read_parquet(source), directory=directory)
+    vocabularies = tuple(shared.facet_values(f) for f in ("category", "tag", "ingredient"))
+    return shared.frame(), shared, vocabularies
+
+
+def _worker(mode: str, source: str, directory: str, ready, done, results) -> None:
+    before = process_memory()
+    if mode == "shared":
+        loaded = _load_shared(source, directory)
+    else:
+        loaded = _load_private(source)
+    frame = loaded[0]
+    # Touch every text column so its pages are resident, as they are after some traffic
+    touched = sum(int(frame[column].str.len().sum()) for column in ("name", "description", "tags"))
+    ready.wait()
+    results.put({"mode": mode, "pid": os.getpid(), "before": before, "after": process_memory(), "touched": touched})
+    done.wait()
+
+
+def run_mode(mode: str, workers: int, source: str, directory: str) -> List[Dict[str, Any]]:
+    context = mp.get_context("spawn")
+    ready, done = context.Barrier(workers), context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(mode, source, directory, ready, done, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    return rows
+
+
+def print_mode(mode: str, rows: List[Dict[str, Any]]) -> Dict[str, float]:
+    mib = lambda value: value / 2**20
+    print(f"\n== {mode}")
+    print(f"  {'pid':>8} {'rss before':>11} {'rss after':>10} {'anon before':>12} {'anon after':>11} {'shmem after':>12} {'pss after':>10}  (MiB)")
+    totals = {field: 0.0 for field in MEMORY_FIELDS}
+    for row in rows:
+        before, after = row["before"], row["after"]
+        print(f"  {row['pid']:>8} {mib(before.get('rss', 0)):>11.1f} {mib(after.get('rss', 0)):>10.1f} "
+              f"{mib(before.get('rss_anon', 0)):>12.1f} {mib(after.get('rss_anon', 0)):>11.1f} {mib(after.get('rss_shmem', 0)):>12.1f} {mib(after.get('pss', 0)):>10.1f}")
+        for field in MEMORY_FIELDS:
+            totals[field] += mib(after.get(field, 0) - before.get(field, 0))
+    print(f"  catalog growth per worker: rss {totals['rss'] / len(rows):.1f} MiB, private {totals['rss_anon'] / len(rows):.1f} MiB, "
+          f"pss {totals['pss'] / len(rows):.1f} MiB")
+    return totals
+
+
+def main(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="bench-catalog-")
+    segment_dir = tempfile.mkdtemp(prefix="bench-catalog-", dir=args.segment_dir)
+    try:
+        source = os.path.join(workdir, "catalog.parquet")
+        make_synthetic_catalog(args.products).to_parquet(source)
+        print(f"Synthetic catalog: {args.products} products ({os.path.getsize(source) / 2**20:.1f} MiB parquet); {args.workers} workers per mode")
+        # Published up front (in production the first worker does it once), so every worker measures attaching
+        import pandas as pd
+        attach_or_publish(source, lambda: pd.read_parquet(source), directory=segment_dir)
+        totals = {}
+        for mode in ("private", "shared"):
+            totals[mode] = print_mode(mode, run_mode(mode, args.workers, source, segment_dir))
+        saved = totals["private"]["pss"] - totals["shared"]["pss"]
+        print(f"\nShared segment saves {saved:.1f} MiB PSS across {args.workers} workers "
+              f"({saved / args.workers:.1f} MiB per worker).")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(segment_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker catalog memory: private copies vs the shared Arrow segment.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--products", type=int, default=50000, help="Size of the synthetic catalog.")
+    parser.add_argument("--segment-dir", default=SHARED_CATALOG_DIR, help="Where to publish the segment (a temp dir is created inside).")
+    sys.exit(main(parser.parse_args()))
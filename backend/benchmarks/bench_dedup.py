@@ -0,0 +1,80 @@
+"""
+bench_dedup.py
+Accuracy and cost of the MinHash/LSH near-duplicate collapsing used by feedback ingestion
+(services/dedup.py).
+
+Streams synthetic reviews of one product (a single collapsing group, the worst case) through
+NearDuplicateCollapser:
+  distinct       reviews drawn independently from a shared vocabulary (low true Jaccard), none of
+                 which may be collapsed; any collapse drops a real review from the index
+  near-duplicate copies of earlier reviews with one word replaced and some punctuation/case
+                 changes, which should be collapsed into their originals
+Reports false collapses, near-duplicate recall, documents per second and the memory the
+collapser holds per tracked document. Exits non-zero if any distinct review was collapsed.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_dedup --reviews 5000 --near-duplicates 500
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from services.dedup import NearDuplicateCollapser
+
+
+def make_review(rng: random.Random, vocabulary, words: int) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def near_duplicate(rng: random.Random, text: str, vocabulary) -> str:
+    words = text.split()
+    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    return (" ".join(words) + "!!").capitalize()
+
+
+def main(args) -> int:
+    rng = random.Random(args.seed)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    distinct = [make_review(rng, vocabulary, args.words) for _ in range(args.reviews)]
+    copies = [near_duplicate(rng, distinct[rng.randrange(args.reviews)], vocabulary) for _ in range(args.near_duplicates)]
+
+    collapser = NearDuplicateCollapser(
+        content_fn=lambda doc: doc.metadata["text"],
+        group_fn=lambda doc: ("review", "product-1"),
+        id_fn=lambda doc: doc.metadata["source_id"],
+    )
+    tracemalloc.start()
+    start = time.perf_counter()
+    false_collapses = sum(
+        collapser.offer(SimpleNamespace(metadata={"text": text, "source_id": f"r{i}"})) is None
+        for i, text in enumerate(distinct)
+    )
+    held = tracemalloc.get_traced_memory()[0]
+    detected = sum(
+        collapser.offer(SimpleNamespace(metadata={"text": text, "source_id": f"d{i}"})) is None
+        for i, text in enumerate(copies)
+    )
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    print(f"\n{args.reviews} distinct reviews of {args.words} words (vocabulary {args.vocabulary}), "
+          f"{args.near_duplicates} near-duplicates, one group")
+    print(f"  false collapses      {false_collapses} ({false_collapses / args.reviews:.2%})")
+    print(f"  near-duplicate recall {detected / max(args.near_duplicates, 1):.3f}")
+    print(f"  throughput           {(args.reviews + args.near_duplicates) / elapsed:,.0f} docs/s")
+    print(f"  memory held          {held / max(args.reviews - false_collapses, 1):,.0f} bytes per tracked document")
+    return 1 if false_collapses else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="False-collapse rate and recall of near-duplicate collapsing.")
+    parser.add_argument("--reviews", type=int, default=5000)
+    parser.add_argument("--near-duplicates", type=int, default=500)
+    parser.add_argument("--words", type=int, default=25)
+    parser.add_argument("--vocabulary", type=int, default=300, help="Shared words the synthetic reviews are drawn from.")
+    parser.add_argument("--seed", type=int, default=13)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,287 @@
+"""
+bench_load.py
+Offline load test: drives /api/chat, /api/products and /ws/voice-agent in-process with a mixed
+workload at rising concurrency, against local fakes for Gemini, Cohere, Pinecone and AIML
+(see benchmarks/fakes.py). No API keys or credits are needed.
+
+Reports requests/s, p50/p95/p99 latency per endpoint and the per-stage breakdown recorded by
+services/tracing.py. With --baseline, exits non-zero when throughput or p95 regress.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_load --concurrency 1 4 16 --requests 200
+    python -m benchmarks.bench_load --latency llm=1500:0.5:0.02 --output bench.json
+    python -m benchmarks.bench_load --baseline bench.json --max-regression 0.15
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fakes import DEFAULT_PROFILE, install_fakes, make_latency_profile
+
+CHAT_UTTERANCES = [
+    "Can you recommend a serum for dullness?",
+    "I need a cream / moisturizer for dryness with ceramides",
+    "Show me a cleanser for acne",
+    "Also add toner please",
+    "What is your brand philosophy on sustainability?",
+    "Are your products vegan and cruelty-free?",
+    "I'm just browsing",
+]
+REVIEW_TEMPLATE = "What do reviews say about {name}?"
+DEFAULT_MIX = "chat=0.6,products=0.3,voice=0.1"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"chat", "products", "voice"}
+    if unknown:
+        raise ValueError(f"Unknown workload kinds: {sorted(unknown)}")
+    return mix
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+class Workload:
+    """Picks the next request for a virtual user; chat sessions carry their state for a few turns."""
+    def __init__(self, mix: Dict[str, float], product_ids: List[str], product_names: List[str],
+                 turns_per_session: int, seed: int):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.product_ids = product_ids
+        self.product_names = product_names
+        self.turns_per_session = turns_per_session
+        self.rng = random.Random(seed)
+
+    def next_kind(self) -> str:
+        return self.rng.choices(self.kinds, self.weights)[0]
+
+    def utterance(self) -> str:
+        if self.rng.random() < 0.2:
+            return REVIEW_TEMPLATE.format(name=self.rng.choice(self.product_names))
+        return self.rng.choice(CHAT_UTTERANCES)
+
+    def product_query(self) -> List[str]:
+        return self.rng.sample(self.product_ids, k=min(len(self.product_ids), self.rng.randint(1, 10)))
+
+
+async def voice_turn(app, utterance: str, query_string: bytes = b"input_format=webm&output_format=opus") -> Tuple[bool, float]:
+    """
+    Runs one /ws/voice-agent session with a single turn directly against the ASGI app
+    (httpx's ASGI transport has no WebSocket support). Returns (ok, turn latency in seconds).
+    """
+    inbound: asyncio.Queue = asyncio.Queue()
+    outbound: asyncio.Queue = asyncio.Queue()
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+        "path": "/ws/voice-agent", "raw_path": b"/ws/voice-agent", "root_path": "",
+        "query_string": query_string, "headers": [], "subprotocols": [],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    await inbound.put({"type": "websocket.connect"})
+    server = asyncio.create_task(app(scope, inbound.get, outbound.put))
+    ok = False
+    elapsed = 0.0
+    try:
+        accept = await outbound.get()
+        if accept["type"] != "websocket.accept":
+            return False, 0.0
+        await outbound.get()  # negotiated format frame
+        start = time.perf_counter()
+        await inbound.put({"type": "websocket.receive", "bytes": utterance.encode("utf-8")})
+        message = await outbound.get()
+        elapsed = time.perf_counter() - start
+        ok = message["type"] == "websocket.send" and message.get("bytes") is not None
+    finally:
+        await inbound.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(server, timeout=5)
+        except Exception:
+            server.cancel()
+    return ok, elapsed
+
+
+async def run_level(app, client, workload: Workload, concurrency: int, total_requests: int) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` virtual users issue requests until `total_requests` are done."""
+    latencies: Dict[str, List[float]] = {"chat": [], "products": [], "voice": []}
+    errors: Dict[str, int] = {"chat": 0, "products": 0, "voice": 0}
+    remaining = total_requests
+
+    async def user(user_id: int) -> None:
+        nonlocal remaining
+        state: Optional[Dict[str, Any]] = None
+        turns = 0
+        while remaining > 0:
+            remaining -= 1
+            kind = workload.next_kind()
+            start = time.perf_counter()
+            ok = True
+            try:
+                if kind == "chat":
+                    if turns >= workload.turns_per_session:
+                        state, turns = None, 0
+                    response = await client.post("/api/chat", json={"text": workload.utterance(), "state_dict": state},
+                                                 headers={"X-Request-ID": f"bench-{concurrency}-{user_id}-{remaining}"})
+                    ok = response.status_code == 200
+                    if ok:
+                        state = response.json().get("state")
+                        turns += 1
+                elif kind == "products":
+                    response = await client.get("/api/products", params=[("ids", i) for i in workload.product_query()])
+                    ok = response.status_code == 200
+                else:
+                    ok, turn_seconds = await voice_turn(app, workload.utterance())
+                    if ok:
+                        latencies[kind].append(turn_seconds)
+                        continue
+            except Exception:
+                ok = False
+            if ok:
+                latencies[kind].append(time.perf_counter() - start)
+            else:
+                errors[kind] += 1
+
+    from services.tracing import STAGE_DURATION
+    before = STAGE_DURATION.snapshot()
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    wall = time.perf_counter() - start
+    after = STAGE_DURATION.snapshot()
+
+    endpoints = {}
+    for kind, values in latencies.items():
+        if not values and not errors[kind]:
+            continue
+        endpoints[kind] = {
+            "count": len(values),
+            "errors": errors[kind],
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    completed = sum(len(v) for v in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "requests": completed,
+        "errors": sum(errors.values()),
+        "wall_seconds": wall,
+        "rps": completed / wall if wall else 0.0,
+        "endpoints": endpoints,
+        "stages": stage_breakdown(before, after, STAGE_DURATION.buckets),
+    }
+
+
+def stage_breakdown(before, after, buckets) -> Dict[str, Dict[str, float]]:
+    """Per-stage count, mean and approximate p95 between two histogram snapshots."""
+    from services.tracing import bucket_quantile
+    stages = {}
+    for (stage, agent), (counts, total) in sorted(after.items()):
+        old_counts, old_total = before.get((stage, agent), ([0] * len(counts), 0.0))
+        delta = [a - b for a, b in zip(counts, old_counts)]
+        n = sum(delta)
+        if not n:
+            continue
+        p95 = bucket_quantile(buckets, delta, 0.95)
+        stages[f"{stage}[{agent}]" if agent else stage] = {
+            "count": n,
+            "mean_ms": (total - old_total) / n * 1000,
+            "p95_ms_le": p95 * 1000 if p95 != float("inf") else float("inf"),
+        }
+    return stages
+
+
+def print_level(result: Dict[str, Any]) -> None:
+    print(f"\n== concurrency {result['concurrency']}: {result['requests']} requests in {result['wall_seconds']:.1f}s "
+          f"= {result['rps']:.2f} req/s, {result['errors']} errors")
+    print(f"  {'endpoint':<10} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for kind, e in result["endpoints"].items():
+        print(f"  {kind:<10} {e['count']:>6} {e['errors']:>6} {e['p50_ms']:>9.0f} {e['p95_ms']:>9.0f} {e['p99_ms']:>9.0f}")
+    print(f"  {'stage':<40} {'count':>6} {'mean ms':>9} {'p95 ms <=':>10}")
+    for name, s in result["stages"].items():
+        print(f"  {name:<40} {s['count']:>6} {s['mean_ms']:>9.0f} {s['p95_ms_le']:>10.0f}")
+
+
+def compare_to_baseline(results: List[Dict[str, Any]], baseline_path: str, max_regression: float) -> List[str]:
+    """Returns a description of every throughput or p95 regression beyond the allowed fraction."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["concurrency"]: r for r in json.load(f)["levels"]}
+    regressions = []
+    for result in results:
+        base = baseline.get(result["concurrency"])
+        if not base:
+            continue
+        if result["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(f"concurrency {result['concurrency']}: {result['rps']:.2f} req/s vs baseline {base['rps']:.2f}")
+        for kind, e in result["endpoints"].items():
+            base_p95 = base["endpoints"].get(kind, {}).get("p95_ms")
+            if base_p95 and e["p95_ms"] > base_p95 * (1 + max_regression):
+                regressions.append(f"concurrency {result['concurrency']} {kind}: p95 {e['p95_ms']:.0f}ms vs baseline {base_p95:.0f}ms")
+    return regressions
+
+
+async def main(args) -> int:
+    overrides = dict(item.split("=", 1) for item in args.latency)
+    profile = make_latency_profile(overrides, seed=args.seed)
+    app, catalog = install_fakes(profile, n_products=args.products)
+    logging.getLogger().setLevel(args.log_level)
+
+    import httpx
+    workload = Workload(parse_mix(args.mix), list(catalog.index), list(catalog["name"]), args.turns_per_session, args.seed)
+    print("Upstream latency profile: " + ", ".join(f"{k}={v!r}" for k, v in profile.items()))
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in args.concurrency:
+            result = await run_level(app, client, workload, concurrency, args.requests)
+            print_level(result)
+            results.append(result)
+
+    from services.token_budget import prompt_report
+    print(f"\n  {'agent':<22} {'prompt part':<15} {'calls':>6} {'mean tok':>9} {'max tok':>8} {'share':>6}")
+    for row in prompt_report(top=10):
+        print(f"  {row['agent']:<22} {row['part']:<15} {row['calls']:>6} {row['mean_tokens']:>9.0f} {row['max_tokens']:>8} {row['share_of_agent']:>6.0%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"profile": {k: repr(v) for k, v in profile.items()}, "mix": args.mix, "levels": results}, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            return 1
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of the Everglow backend against local upstream fakes.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Workload weights, e.g. chat=0.6,products=0.3,voice=0.1")
+    parser.add_argument("--latency", nargs="*", default=[],
+                        help=f"Upstream latency overrides as name=median_ms[:sigma[:error_rate]]; names: {', '.join(DEFAULT_PROFILE)}")
+    parser.add_argument("--turns-per-session", type=int, default=4, help="Chat turns before a virtual user starts a new conversation.")
+    parser.add_argument("--products", type=int, default=200, help="Size of the synthetic catalog.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Write results as JSON (usable as a later --baseline).")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed fractional drop in req/s or rise in p95.")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,163 @@
+"""
+bench_logging.py
+Logging cost per chat request: the previous synchronous stdout handler with eager f-string payloads
+vs the queue-backed setup (services/logging_setup.py) with lazy, capped and sampled payloads.
+
+Each simulated request emits the log lines one /api/chat turn emits (main.py, english_agent, the
+router, NER and the recommendation agent), for a session of --turns history entries:
+  legacy  basicConfig-style StreamHandler, the call sites as they were (the whole state at INFO,
+          the formatted history at INFO, debug prompts built with f-strings even when DEBUG is off)
+  queued  configure_logging(), the call sites as they are now
+Requests run on --concurrency threads. Reported per request: CPU time of the request thread and
+wall time spent in logging calls, plus the bytes written. The process CPU column includes the
+listener thread, so work moved off the request path is still visible.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_logging --turns 60 --requests 2000 --levels INFO DEBUG
+"""
+
+import argparse
+import contextvars
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_load import percentile
+from services import logging_setup
+from services.logging_setup import TEXT_FORMAT, configure_logging, lazy, stop_logging
+from services.tracing import start_request
+
+PROMPT_TEMPLATE = "You are an AI assistant for a beauty and skincare store...\n{history}\nUser input: {input}\nJSON:"
+
+
+def make_state(turns: int) -> Dict[str, Any]:
+    history = []
+    for i in range(turns):
+        history.append(("user", f"Turn {i}: can you suggest something for dry, sensitive skin that layers well under sunscreen?"))
+        history.append(("agent", f"Turn {i}: " + "Here are a few hydrating options with ceramides and niacinamide. " * 5))
+    return {"history": history, "entities": {"categories": ["serum"], "skin_concerns": ["dryness"], "ingredients": []},
+            "intent": "recommend", "active_agent": "recommendation", "followup_questions": [], "summary": "", "summarized_turns": 0}
+
+
+def legacy_request(log: logging.Logger, text: str, state: Dict[str, Any]) -> None:
+    """The request's log calls as they were before the queue-backed setup."""
+    log.info(f"Received /api/chat request. Text: '{text}', State Dict from Frontend: {state}")
+    log.info(f"--- English Agent: Starting processing ---")
+    log.debug(f"Current state: {dict(state)}")
+    log.info(f"Intent Router: Starting intent classification for input: '{text}'.")
+    prompt_input = {"input": text, "history": state["history"][-10:]}
+    log.debug(f"Intent Router: Prompt input: {prompt_input}")
+    log.debug(f"Intent Router: Raw LLM output: content='{{\"intent\": \"recommend\"}}'")
+    log.info(f"Intent Router: Classified intent: recommend")
+    formatted_history = "\n".join(f"User: {u}\nAgent: {a}" for u, a in state["history"])
+    log.info(f"Conversational Search Agent: Formatted history: {formatted_history}")
+    log.info(f"Conversational Search Agent: Current entities JSON: {state['entities']}")
+    log.debug(f"Conversational Search Agent: NER input payload: {({'user_input': text, 'chat_history_formatted': formatted_history})}")
+    log.info(f"Recommendation Agent: Started with entities: {state['entities']}")
+    log.debug(f"Recommendation Agent: Justification prompt input: {PROMPT_TEMPLATE.format(history=formatted_history, input=text)}")
+    log.info(f"Recommendation Agent: Finished.")
+
+
+def queued_request(log: logging.Logger, text: str, state: Dict[str, Any]) -> None:
+    """The same request's log calls as they are now."""
+    log.info("Received /api/chat request. Text: '%s', state with %d history turns from frontend.", text, len(state["history"]))
+    log.debug("State Dict from Frontend: %s", state)
+    log.info("--- English Agent: Starting processing ---")
+    log.debug("Current state: %s", lazy(dict, state))
+    log.info("Intent Router: Starting intent classification for input: '%s'.", text)
+    prompt_input = {"input": text, "history": state["history"][-10:]}
+    log.debug("Intent Router: Prompt input: %s", prompt_input)
+    log.debug("Intent Router: Raw LLM output: %s", "content='{\"intent\": \"recommend\"}'")
+    log.info("Intent Router: Classified intent: %s", "recommend")
+    formatted_history = "\n".join(f"User: {u}\nAgent: {a}" for u, a in state["history"])
+    log.debug("Conversational Search Agent: Formatted history: %s", formatted_history)
+    log.info("Conversational Search Agent: Current entities JSON: %s", state["entities"])
+    log.debug("Conversational Search Agent: NER input payload: %s", {"user_input": text, "chat_history_formatted": formatted_history})
+    log.info("Recommendation Agent: Started with entities: %s", state["entities"])
+    log.debug("Recommendation Agent: Justification prompt input: %s", lazy(PROMPT_TEMPLATE.format, history=formatted_history, input=text))
+    log.info("Recommendation Agent: Finished.")
+
+
+def configure_legacy(level: str, sink) -> None:
+    stop_logging()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def run(mode: str, level: str, state: Dict[str, Any], requests: int, concurrency: int, sink_path: str) -> Dict[str, Any]:
+    with open(sink_path, "w", encoding="utf-8") as sink:
+        if mode == "legacy":
+            configure_legacy(level, sink)
+            emit: Callable = legacy_request
+        else:
+            configure_logging(level, "text", stream=sink)
+            emit = queued_request
+        log = logging.getLogger("bench.request")
+
+        def one(i: int):
+            start_request()
+            cpu, wall = time.thread_time(), time.perf_counter()
+            emit(log, f"request {i}: a serum for dullness under 30 dollars", state)
+            return time.thread_time() - cpu, time.perf_counter() - wall
+
+        process_cpu, start = time.process_time(), time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(lambda i: contextvars.copy_context().run(one, i), range(requests)))
+        stop_logging()  # the queued listener drains here; counted in process CPU and elapsed
+        elapsed, process_cpu = time.perf_counter() - start, time.process_time() - process_cpu
+        sink.flush()
+    configure_legacy(level, sys.stderr)
+    cpu = [s[0] for s in samples]
+    wall = [s[1] for s in samples]
+    return {
+        "mode": mode, "level": level,
+        "cpu_p50_us": percentile(cpu, 50) * 1e6, "cpu_p95_us": percentile(cpu, 95) * 1e6,
+        "wall_p50_us": percentile(wall, 50) * 1e6, "wall_p95_us": percentile(wall, 95) * 1e6,
+        "process_cpu_per_request_us": process_cpu / requests * 1e6,
+        "elapsed_s": elapsed,
+        "bytes_per_request": os.path.getsize(sink_path) / requests,
+    }
+
+
+def main(args) -> int:
+    state = make_state(args.turns)
+    logging_setup.LOG_DEBUG_SAMPLE_RATE = args.debug_sample_rate
+    workdir = tempfile.mkdtemp(prefix="bench-logging-")
+    sink_path = os.devnull if args.sink == "devnull" else os.path.join(workdir, "app.log")
+    results: List[Dict[str, Any]] = []
+    try:
+        for level in args.levels:
+            for mode in ("legacy", "queued"):
+                results.append(run(mode, level, state, args.requests, args.concurrency, sink_path))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nSession of {len(state['history'])} history entries, {args.requests} requests on {args.concurrency} threads, "
+          f"sink {args.sink}, debug sample rate {args.debug_sample_rate:.0%}")
+    print(f"  {'level':<6} {'mode':<7} {'req cpu p50':>12} {'req cpu p95':>12} {'wall p50':>9} {'wall p95':>9} "
+          f"{'proc cpu/req':>13} {'bytes/req':>10}  (us)")
+    for r in results:
+        print(f"  {r['level']:<6} {r['mode']:<7} {r['cpu_p50_us']:>12.0f} {r['cpu_p95_us']:>12.0f} {r['wall_p50_us']:>9.0f} "
+              f"{r['wall_p95_us']:>9.0f} {r['process_cpu_per_request_us']:>13.0f} {r['bytes_per_request']:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Logging cost per request: synchronous handler vs the queue-backed setup.")
+    parser.add_argument("--turns", type=int, default=60, help="Conversation turns in the simulated session state.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--levels", nargs="+", default=["INFO", "DEBUG"])
+    parser.add_argument("--debug-sample-rate", type=float, default=logging_setup.LOG_DEBUG_SAMPLE_RATE)
+    parser.add_argument("--sink", choices=["file", "devnull"], default="file", help="Where log lines are written.")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,221 @@
+"""
+bench_model_tiers.py
+Latency/quality comparison of LLM tier configurations (services/config.py LLM_TIERS).
+
+Runs a small labelled set through each LLM task (router, ner, justification, reviews, brand) under
+each configuration and reports p50/p95 latency per task next to a task-specific quality score:
+  router         intent accuracy against the labels
+  ner            exact match of categories/ingredients/skin concerns against the labels
+  justification  share of titles within the prompt's 10-word limit
+  reviews/brand  share of non-empty answers (mean words shown)
+
+Configurations: "tiered" is LLM_TIERS as configured (env overrides included), "single" puts every
+task on the default tier. By default the models are the stand-ins from benchmarks/fakes.py, whose
+per-model latency and quality are modelled (DEFAULT_MODEL_PROFILE, --model-profile); --live calls
+the real models instead (needs GEMINI_API_KEY and spends credits).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_model_tiers --repeats 5
+    python -m benchmarks.bench_model_tiers --model-profile gemini-2.0-flash-lite=300:0.3:0:0.9
+    python -m benchmarks.bench_model_tiers --live --repeats 2 --output tiers.json
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.bench_load import percentile
+from benchmarks.fakes import DEFAULT_MODEL_PROFILE, install_fakes, make_latency_profile
+
+TASKS = ("router", "ner", "justification", "reviews", "brand")
+
+# (utterance, expected intent, expected entities or None when NER is not scored)
+LABELLED_CASES: List[Tuple[str, str, Optional[Dict[str, List[str]]]]] = [
+    ("Can you recommend a serum for dullness?", "recommend",
+     {"categories": ["serum"], "ingredients": [], "skin_concerns": ["dullness"]}),
+    ("I need a moisturizer for dryness with ceramides", "recommend",
+     {"categories": ["cream / moisturizer"], "ingredients": ["ceramides"], "skin_concerns": ["dryness"]}),
+    ("Show me a cleanser for acne with salicylic acid", "recommend",
+     {"categories": ["cleanser"], "ingredients": ["salicylic acid"], "skin_concerns": ["acne"]}),
+    ("Any sunscreen that works for sensitivity?", "recommend",
+     {"categories": ["sunscreen"], "ingredients": [], "skin_concerns": ["sensitivity"]}),
+    ("I'd like a toner with niacinamide for oiliness", "recommend",
+     {"categories": ["toner"], "ingredients": ["niacinamide"], "skin_concerns": ["oiliness"]}),
+    ("A face mask for redness please", "recommend",
+     {"categories": ["face mask"], "ingredients": [], "skin_concerns": ["redness"]}),
+    ("What do reviews say about the EverGlow Hydra Serum?", "review_explanation", None),
+    ("How has the Calm Cleanser worked for people with dry skin?", "review_explanation", None),
+    ("What do customers think of the retinol eye cream?", "review_explanation", None),
+    ("What is your brand philosophy on sustainability?", "brand_info", None),
+    ("Are your products vegan and cruelty-free?", "brand_info", None),
+    ("Is the packaging sustainable?", "brand_info", None),
+]
+SAMPLE_PRODUCTS = "1. Name: EverGlow Hydra Serum\nTop Ingredients: hyaluronic acid; niacinamide\nTags: ['dullness', 'dryness']"
+SAMPLE_FEEDBACK = "Absorbs quickly and my skin feels calmer after a week.\n---\nHelped with my dry patches, will repurchase."
+
+
+def parse_json_block(text: str) -> Dict[str, Any]:
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+
+
+def entity_match(found: Dict[str, Any], expected: Dict[str, List[str]]) -> bool:
+    return all(
+        sorted(str(v).lower() for v in (found.get(key) or [])) == sorted(expected[key])
+        for key in expected
+    )
+
+
+def tier_configurations(names: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    from services import config
+    configurations = {}
+    for name in names:
+        if name == "tiered":
+            configurations[name] = {task: dict(tier) for task, tier in config.LLM_TIERS.items()}
+        elif name == "single":
+            configurations[name] = {task: dict(config.LLM_TIERS["default"]) for task in config.LLM_TIERS}
+        else:
+            raise ValueError(f"Unknown configuration: {name}")
+    return configurations
+
+
+def use_tiers(tiers: Dict[str, Dict[str, Any]]) -> None:
+    from services import config
+    config.LLM_TIERS.clear()
+    config.LLM_TIERS.update(tiers)
+    config._llms.clear()
+
+
+def build_task_calls() -> Dict[str, List[Tuple[Any, Any, Any]]]:
+    """(runnable, payload, scorer) per task for the current tiers; scorer maps the output text to a score."""
+    from services import config, prompts
+    from services.router import router_prompt
+    from services.agents.recommendation import justification_prompt
+
+    ner_chain = prompts.make_agent_llm(
+        prompts.CONVERSATIONAL_SEARCH_SYSTEM_PROMPT_TEMPLATE,
+        prompts.CONVERSATIONAL_SEARCH_HUMAN_PROMPT_TEMPLATE,
+        template_format_kwargs=prompts.conversational_search_system_prompt_kwargs,
+        task="ner",
+    )
+    justification_chain = prompts.make_agent_llm(prompts.RECOMMENDATION_SYSTEM_PROMPT, task="justification")
+    reviews_chain = prompts.make_agent_llm(prompts.REVIEWS_SYSTEM_PROMPT, task="reviews")
+    brand_chain = prompts.make_agent_llm(prompts.BRAND_SYSTEM_PROMPT, task="brand")
+    router_llm = config.get_llm("router")
+
+    calls: Dict[str, List[Tuple[Any, Any, Any]]] = {task: [] for task in TASKS}
+    for text, intent, entities in LABELLED_CASES:
+        calls["router"].append((router_llm, router_prompt.format(input=text, history=[]),
+                                lambda out, intent=intent: float(parse_json_block(out).get("intent") == intent)))
+        if entities is not None:
+            calls["ner"].append((ner_chain, {"user_input": text, "current_entities_json": "{}", "chat_history_formatted": ""},
+                                 lambda out, entities=entities: float(entity_match(parse_json_block(out), entities))))
+            calls["justification"].append((justification_chain, {"input": justification_prompt.format(query=text, products=SAMPLE_PRODUCTS)},
+                                           lambda out: float(0 < len(out.split()) <= 10)))
+        elif intent == "review_explanation":
+            prompt = f"Product: EverGlow Hydra Serum\nUser Question: {text}\nOther Customers Feedback:\n{SAMPLE_FEEDBACK}\n\nAnswer:"
+            calls["reviews"].append((reviews_chain, {"input": prompt}, lambda out: float(bool(out.strip()))))
+        elif intent == "brand_info":
+            calls["brand"].append((brand_chain, {"input": text}, lambda out: float(bool(out.strip()))))
+    return calls
+
+
+def run_configuration(name: str, tiers: Dict[str, Dict[str, Any]], repeats: int, concurrency: int) -> Dict[str, Any]:
+    use_tiers(tiers)
+    calls = build_task_calls()
+
+    def run_one(call):
+        runnable, payload, scorer = call
+        start = time.perf_counter()
+        try:
+            output = str(runnable.invoke(payload).content)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"{name}: call failed: {e}")
+            return time.perf_counter() - start, 0.0, 0, False
+        return time.perf_counter() - start, scorer(output), len(output.split()), True
+
+    tasks = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for task in TASKS:
+            outcomes = list(pool.map(run_one, calls[task] * repeats))
+            latencies = [o[0] for o in outcomes]
+            tasks[task] = {
+                "model": tiers[task]["model"],
+                "calls": len(outcomes),
+                "errors": sum(1 for o in outcomes if not o[3]),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "quality": sum(o[1] for o in outcomes) / len(outcomes) if outcomes else float("nan"),
+                "mean_words": sum(o[2] for o in outcomes) / len(outcomes) if outcomes else 0.0,
+            }
+    return {"configuration": name, "tasks": tasks}
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"\n  {'config':<8} {'task':<14} {'model':<32} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'quality':>8} {'words':>6}")
+    for result in results:
+        for task, t in result["tasks"].items():
+            print(f"  {result['configuration']:<8} {task:<14} {t['model']:<32} {t['calls']:>6} {t['p50_ms']:>8.0f} "
+                  f"{t['p95_ms']:>8.0f} {t['quality']:>8.1%} {t['mean_words']:>6.1f}")
+    if len(results) > 1:
+        base, other = results[0], results[1]
+        print(f"\n  {other['configuration']} vs {base['configuration']}:")
+        for task in TASKS:
+            b, o = base["tasks"][task], other["tasks"][task]
+            if b["model"] == o["model"]:
+                continue
+            change = (o["p50_ms"] / b["p50_ms"] - 1) if b["p50_ms"] else float("nan")
+            print(f"  {task:<14} p50 {change:+.0%}, quality {100 * (o['quality'] - b['quality']):+.1f} pts")
+
+
+def parse_model_profile(items: List[str]) -> Dict[str, Tuple[str, float]]:
+    """MODEL=median_ms[:sigma[:error_rate]]:quality entries on top of DEFAULT_MODEL_PROFILE."""
+    profile = dict(DEFAULT_MODEL_PROFILE)
+    for item in items:
+        model, spec = item.split("=", 1)
+        latency, quality = spec.rsplit(":", 1)
+        profile[model] = (latency, float(quality))
+    return profile
+
+
+def main(args) -> int:
+    logging.basicConfig(level=args.log_level)
+    if not args.live:
+        model_profile = parse_model_profile(args.model_profile)
+        install_fakes(make_latency_profile(seed=args.seed), model_profile=model_profile, load_app=False)
+        print("Stand-in models (latency, quality): " + ", ".join(f"{m}={spec} q={q:.0%}" for m, (spec, q) in model_profile.items()))
+
+    results = []
+    for name, tiers in tier_configurations(args.configs).items():
+        results.append(run_configuration(name, tiers, args.repeats, args.concurrency))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"live": args.live, "results": results}, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare LLM tier configurations by latency and quality per task.")
+    parser.add_argument("--configs", nargs="+", default=["single", "tiered"], help="Configurations to compare: single, tiered.")
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the labelled set per configuration.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model-profile", nargs="*", default=[],
+                        help="Stand-in model overrides as MODEL=median_ms[:sigma[:error_rate]]:quality")
+    parser.add_argument("--live", action="store_true", help="Call the real models (needs API keys).")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Write results as JSON.")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,135 @@
+"""
+bench_quantization.py
+Recall vs memory of the quantized local vector search (services/quantization.py) against exact
+float32 cosine search.
+
+Synthetic embeddings are drawn around --clusters centres (real catalog and feedback vectors are
+clustered by product and topic, which is what makes quantization hard: neighbours are close
+together), and each query is a perturbed copy of a stored vector. Modes:
+  float32        exact search over a float32 matrix held in RAM (the baseline and ground truth)
+  int8           scan of every int8 code
+  int8+rescore   int8 scan, best top_k * rescore_oversample rescored from the on-disk float32 .npy
+  binary+int8    Hamming prefilter to top_k * binary_oversample, then int8 scores
+  binary+rescore Hamming prefilter, int8 scores, full-precision rescoring
+Reported per mode: recall@k against exact search, query latency, resident bytes per vector and
+the resident memory projected to --project vectors (e.g. the whole feedback corpus).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_quantization --vectors 100000 --dim 1024 --queries 200 --project 5000000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.bench_load import percentile
+from benchmarks.fakes import EMBEDDING_DIM
+from services.quantization import BINARY_OVERSAMPLE, RESCORE_OVERSAMPLE, QuantizedVectors
+
+MODES = [
+    # (name, use bits, rescore)
+    ("int8", False, False),
+    ("int8+rescore", False, True),
+    ("binary+int8", True, False),
+    ("binary+rescore", True, True),
+]
+
+
+def make_vectors(n: int, dim: int, clusters: int, spread: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 65536):
+        end = min(start + 65536, n)
+        vectors[start:end] = centres[labels[start:end]] + spread * rng.standard_normal((end - start, dim)).astype(np.float32)
+    return vectors
+
+
+def exact_top(unit: np.ndarray, queries: np.ndarray, k: int) -> List[np.ndarray]:
+    scores = queries @ unit.T
+    return [np.argsort(-row)[:k] for row in scores]
+
+
+def run_mode(index: QuantizedVectors, queries: np.ndarray, truth: List[np.ndarray], k: int,
+             binary: bool, rescore: bool, args) -> Dict[str, Any]:
+    row_of = {vector_id: row for row, vector_id in enumerate(index.ids)}
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = index.search(query, k, binary=binary, rescore=rescore,
+                               binary_oversample=args.binary_oversample, rescore_oversample=args.rescore_oversample)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(expected.tolist()) & {row_of[vector_id] for vector_id, _ in results})
+    resident = index.codes.nbytes + index.scale.nbytes + index.low.nbytes
+    if binary:
+        resident += index.bits.nbytes + index.center.nbytes
+    return {"recall": hits / (len(queries) * k), "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000, "resident": resident}
+
+
+def main(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="bench-quantization-")
+    try:
+        vectors = make_vectors(args.vectors, args.dim, args.clusters, args.spread, args.seed)
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        rng = np.random.default_rng(args.seed + 1)
+        queries = unit[rng.integers(0, args.vectors, args.queries)] + args.query_noise * rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        # Baseline: exact search over the float32 matrix in RAM
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            scores = unit @ query
+            top = np.argpartition(-scores, args.k - 1)[:args.k]
+            top[np.argsort(-scores[top])]
+            latencies.append(time.perf_counter() - start)
+        truth = exact_top(unit, queries, args.k)
+        results = [{"mode": "float32", "recall": 1.0, "p50_ms": percentile(latencies, 50) * 1000,
+                    "p95_ms": percentile(latencies, 95) * 1000, "resident": unit.nbytes}]
+
+        # Full precision stays on disk, memory-mapped, as in the embedding store
+        path = os.path.join(workdir, "vectors.npy")
+        np.save(path, vectors)
+        full = np.load(path, mmap_mode="r")
+        del unit
+        start = time.perf_counter()
+        index = QuantizedVectors.build([str(i) for i in range(args.vectors)], full, binary=True, full=full)
+        build_s = time.perf_counter() - start
+        for name, binary, rescore in MODES:
+            results.append({"mode": name, **run_mode(index, queries, truth, args.k, binary, rescore, args)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{args.vectors} vectors of dimension {args.dim} ({args.clusters} clusters), {args.queries} queries, recall@{args.k}; "
+          f"quantized in {build_s:.1f}s; oversampling binary x{args.binary_oversample}, rescore x{args.rescore_oversample}")
+    print(f"  {'mode':<15} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'bytes/vec':>10} {'resident MiB':>13} "
+          f"{'at ' + format(args.project, ',') + ' GiB':>18}")
+    for r in results:
+        per_vector = r["resident"] / args.vectors
+        print(f"  {r['mode']:<15} {r['recall']:>7.3f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {per_vector:>10.0f} "
+              f"{r['resident'] / 2**20:>13.1f} {per_vector * args.project / 2**30:>18.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs memory of int8 / binary quantized vector search.")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--clusters", type=int, default=500, help="Cluster centres the synthetic vectors are drawn around.")
+    parser.add_argument("--spread", type=float, default=0.6, help="Within-cluster noise relative to the centres.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-noise", type=float, default=0.3, help="Perturbation of each query from its stored vector.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--binary-oversample", type=int, default=BINARY_OVERSAMPLE)
+    parser.add_argument("--rescore-oversample", type=int, default=RESCORE_OVERSAMPLE)
+    parser.add_argument("--project", type=int, default=5000000, help="Corpus size to project resident memory to.")
+    parser.add_argument("--seed", type=int, default=3)
+    sys.exit(main(parser.parse_args()))
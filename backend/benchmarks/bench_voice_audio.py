@@ -0,0 +1,84 @@
+"""
+bench_voice_audio.py
+Compares bytes-on-wire and latency of the voice agent's TTS output formats against today's WAV.
+
+Usage (from the backend directory, AIML_API_KEY must be set):
+    python -m benchmarks.bench_voice_audio --formats wav opus mp3 webm --bitrate 24000 --repeats 3
+"""
+
+import argparse
+import asyncio
+import io
+import statistics
+import time
+import wave
+from typing import Dict, List, Optional
+
+from services.audio_formats import negotiate_formats
+from services.text_to_speech import text_to_speech
+
+SAMPLE_TEXTS = [
+    "Here are some serums for dull skin.",
+    "Customers love how lightweight this moisturizer feels, and several reviewers mention it calmed redness within a week.",
+    "EverGlow Labs is 100% vegan, cruelty-free and silicone-free, and our supply chain is carbon-neutral.",
+]
+
+
+def wav_duration_seconds(wav_bytes: bytes) -> Optional[float]:
+    """Returns the playback duration of a WAV payload, or None if it cannot be parsed."""
+    try:
+        with wave.open(io.BytesIO(wav_bytes)) as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except Exception:
+        return None
+
+
+async def bench_format(output_format: str, bitrate: int, repeats: int, durations: Dict[str, float]) -> Dict[str, float]:
+    """Synthesizes every sample text `repeats` times and returns size/latency statistics."""
+    formats = negotiate_formats(output_format=output_format, bitrate=bitrate)
+    sizes: List[int] = []
+    latencies: List[float] = []
+    audio_seconds = 0.0
+    for text in SAMPLE_TEXTS:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            audio = await text_to_speech(text, output_format=formats["output_format"], bitrate=formats["bitrate"])
+            latencies.append(time.perf_counter() - start)
+            sizes.append(len(audio))
+            if output_format == "wav" and text not in durations:
+                durations[text] = wav_duration_seconds(audio) or 0.0
+            audio_seconds += durations.get(text, 0.0)
+    return {
+        "total_bytes": float(sum(sizes)),
+        "mean_bytes": statistics.mean(sizes),
+        "bytes_per_audio_second": sum(sizes) / audio_seconds if audio_seconds else float("nan"),
+        "p50_latency_ms": statistics.median(latencies) * 1000,
+        "max_latency_ms": max(latencies) * 1000,
+        "transcoded": float(formats["transcoded"]),
+    }
+
+
+async def main(formats: List[str], bitrate: int, repeats: int) -> None:
+    # WAV always runs first: it is the baseline and provides the audio durations
+    ordered = ["wav"] + [f for f in formats if f != "wav"]
+    durations: Dict[str, float] = {}
+    results = {}
+    for output_format in ordered:
+        results[output_format] = await bench_format(output_format, bitrate, repeats, durations)
+    baseline = results["wav"]["total_bytes"]
+    print(f"{'format':<6} {'bytes/req':>10} {'KB/s audio':>11} {'vs wav':>7} {'p50 ms':>8} {'max ms':>8} {'transcoded':>10}")
+    for output_format, r in results.items():
+        print(
+            f"{output_format:<6} {r['mean_bytes']:>10.0f} {r['bytes_per_audio_second'] / 1024:>11.1f} "
+            f"{r['total_bytes'] / baseline:>6.0%} {r['p50_latency_ms']:>8.0f} {r['max_latency_ms']:>8.0f} "
+            f"{'yes' if r['transcoded'] else 'no':>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark voice agent TTS output formats.")
+    parser.add_argument("--formats", nargs="+", default=["wav", "opus", "mp3", "webm"])
+    parser.add_argument("--bitrate", type=int, default=24000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.formats, args.bitrate, args.repeats))
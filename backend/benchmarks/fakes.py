@@ -0,0 +1,325 @@
+"""
+fakes.py
+Local stand-ins for the upstream services (Gemini, Cohere, Pinecone, AIML STT/TTS) with
+configurable latency distributions, so the backend can be load-tested offline.
+
+install_fakes() must run before `main` or any `services.*` module that binds the LLM or
+the index getters at import time (prompts, router, agents) is imported.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+EMBEDDING_DIM = 1024  # embed-english-light-v2.0
+
+CATEGORIES = ["serum", "cream / moisturizer", "cleanser", "toner", "sunscreen", "face mask", "hair mask", "eye cream"]
+SKIN_CONCERNS = ["dryness", "acne", "redness", "dullness", "fine lines", "oiliness", "dark spots", "sensitivity"]
+INGREDIENTS = ["niacinamide", "hyaluronic acid", "retinol", "vitamin c", "ceramides", "salicylic acid", "squalane", "peptides"]
+REVIEW_SNIPPETS = [
+    "Absorbs quickly and my skin feels calmer after a week.",
+    "Nice texture but the scent is a bit strong for me.",
+    "Helped with my dry patches, will repurchase.",
+    "Broke me out at first, fine after I used it every other day.",
+    "Great value, lasts for months.",
+]
+
+
+class LatencyModel:
+    """
+    Log-normal latency around a median, with an optional error rate.
+    Spec strings look like "median_ms[:sigma[:error_rate]]", e.g. "800:0.4:0.01".
+    """
+    def __init__(self, median_ms: float, sigma: float = 0.4, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> "LatencyModel":
+        parts = [float(p) for p in str(spec).split(":")]
+        return cls(*parts[:3], seed=seed)
+
+    def sample(self) -> float:
+        """Latency in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms / 1000.0 * math.exp(self._rng.gauss(0.0, self.sigma))
+
+    def maybe_fail(self, service: str) -> None:
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise RuntimeError(f"Injected {service} failure")
+
+    def wait(self, service: str) -> None:
+        time.sleep(self.sample())
+        self.maybe_fail(service)
+
+    async def wait_async(self, service: str) -> None:
+        await asyncio.sleep(self.sample())
+        self.maybe_fail(service)
+
+    def __repr__(self) -> str:
+        return f"{self.median_ms:g}ms (sigma {self.sigma:g}, errors {self.error_rate:.1%})"
+
+
+DEFAULT_PROFILE = {
+    "llm": "900:0.35",
+    "embed": "60:0.3",
+    "query": "40:0.3",
+    "stt": "700:0.3",
+    "tts": "500:0.3",
+}
+
+
+# Per-model stand-ins for tier comparisons: latency spec and the share of router/NER answers that
+# are right. These are modelled numbers, not measurements; bench_model_tiers --live measures the real ones.
+DEFAULT_MODEL_PROFILE = {
+    "gemini-2.5-flash-preview-05-20": ("900:0.35", 0.97),
+    "gemini-2.0-flash-lite": ("350:0.3", 0.92),
+}
+
+
+def make_latency_profile(overrides: Optional[Dict[str, str]] = None, seed: int = 7) -> Dict[str, LatencyModel]:
+    specs = {**DEFAULT_PROFILE, **(overrides or {})}
+    return {name: LatencyModel.parse(spec, seed=seed + i) for i, (name, spec) in enumerate(sorted(specs.items()))}
+
+
+def make_synthetic_catalog(n_products: int = 200, seed: int = 11) -> pd.DataFrame:
+    """Catalog DataFrame in the shape load_products_catalog() produces (cleaned columns, product_id index)."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_products):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        rows.append({
+            "product_id": f"P{i:04d}",
+            "name": f"EverGlow {rng.choice(['Daily', 'Calm', 'Bright', 'Hydra', 'Clear'])} {category.split(' / ')[0].title()} {i}",
+            "category": category,
+            "description": f"A {category} for {rng.choice(SKIN_CONCERNS)}.",
+            "top_ingredients": "; ".join(rng.sample(INGREDIENTS, 3)),
+            "tags": "|".join(rng.sample(SKIN_CONCERNS, 2)),
+            "priceusd": round(rng.uniform(8, 80), 2),
+        })
+    return pd.DataFrame(rows).set_index("product_id")
+
+
+def _prompt_text(value: Any) -> str:
+    if hasattr(value, "to_string"):
+        return value.to_string()
+    if isinstance(value, dict):
+        return "\n".join(str(v) for v in value.values())
+    return str(value)
+
+
+def _line_after(text: str, marker: str) -> str:
+    start = text.rfind(marker)
+    if start == -1:
+        return ""
+    rest = text[start + len(marker):].strip()
+    return rest.splitlines()[0] if rest else ""
+
+
+def fake_intent(user_input: str) -> str:
+    lowered = user_input.lower()
+    if any(k in lowered for k in ("review", "people say", "worked for", "customers think")):
+        return "review_explanation"
+    if any(k in lowered for k in ("brand", "sustainab", "vegan", "cruelty", "philosophy")):
+        return "brand_info"
+    return "recommend"
+
+
+def fake_entities(user_input: str) -> Dict[str, List[str]]:
+    lowered = user_input.lower()
+    categories = [c for c in CATEGORIES if c.split(" / ")[-1] in lowered or c.split(" / ")[0] in lowered]
+    return {
+        "categories": categories or ([CATEGORIES[0]] if "anything" in lowered else []),
+        "ingredients": [i for i in INGREDIENTS if i in lowered],
+        "skin_concerns": [c for c in SKIN_CONCERNS if c in lowered],
+    }
+
+
+class FakeChatModel:
+    """
+    Chat model stand-in that answers each agent's prompt shape; invoke() and stream() like a LangChain chat model.
+    Streaming spends FIRST_TOKEN_SHARE of the sampled latency before the first chunk and spreads the rest over
+    the chunks, so callers that stop reading early (the router) save the tail.
+    With quality < 1, that share of intent/NER answers is deliberately wrong (a wrong intent, dropped entities).
+    """
+    FIRST_TOKEN_SHARE = 0.6
+    CHARS_PER_CHUNK = 4
+
+    def __init__(self, latency: LatencyModel, quality: float = 1.0, seed: int = 5):
+        self.latency = latency
+        self.quality = quality
+        self._rng = random.Random(seed)
+
+    def _answer(self, prompt_value: Any) -> str:
+        text = _prompt_text(prompt_value)
+        wrong = self._rng.random() >= self.quality
+        if "determine their primary intent" in text:
+            intent = fake_intent(_line_after(text, "User input:"))
+            if wrong:
+                intent = self._rng.choice([i for i in ("recommend", "review_explanation", "brand_info", "search") if i != intent])
+            return "```json\n" + json.dumps({"intent": intent}) + "\n```"
+        if "Named Entity Recognition" in text:
+            entities = fake_entities(_line_after(text, "User's latest query:"))
+            if wrong:
+                entities = {key: values[:-1] for key, values in entities.items()}
+            return "```json\n" + json.dumps(entities) + "\n```"
+        if "justification" in text.lower():
+            return "Hydrating picks matched to your skin concerns."
+        return "Customers mostly report calmer, more hydrated skin within two weeks. " * 3
+
+    def invoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs):
+        from langchain_core.messages import AIMessage
+        self.latency.wait("llm")
+        return AIMessage(content=self._answer(input))
+
+    def stream(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs):
+        from langchain_core.messages import AIMessageChunk
+        content = self._answer(input)
+        total = self.latency.sample()
+        chunks = [content[i:i + self.CHARS_PER_CHUNK] for i in range(0, len(content), self.CHARS_PER_CHUNK)] or [""]
+        time.sleep(total * self.FIRST_TOKEN_SHARE)
+        self.latency.maybe_fail("llm")
+        per_chunk = total * (1 - self.FIRST_TOKEN_SHARE) / len(chunks)
+        for chunk in chunks:
+            time.sleep(per_chunk)
+            yield AIMessageChunk(content=chunk)
+
+
+def make_fake_llm(latency: LatencyModel, quality: float = 1.0, seed: int = 5) -> FakeChatModel:
+    return FakeChatModel(latency, quality=quality, seed=seed)
+
+
+class FakeEmbeddings:
+    """Deterministic pseudo-embeddings; same text, same vector."""
+    def __init__(self, latency: LatencyModel, dim: int = EMBEDDING_DIM):
+        self.latency = latency
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "big")
+        vector = np.random.RandomState(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        self.latency.wait("embed")
+        return self._vector(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.latency.wait("embed")
+        return [self._vector(t) for t in texts]
+
+
+class FakeIndex:
+    """Answers Pinecone-style query() calls from the synthetic catalog (catalog or feedback flavour)."""
+    def __init__(self, kind: str, catalog: pd.DataFrame, latency: LatencyModel):
+        self.kind = kind
+        self.catalog = catalog
+        self.latency = latency
+
+    def _catalog_matches(self, top_k: int, filter: Dict[str, Any]):
+        df = self.catalog
+        categories = (filter or {}).get("category", {}).get("$in")
+        if categories:
+            df = df[df["category"].isin(categories)]
+        matches = []
+        for rank, (product_id, row) in enumerate(df.head(top_k).iterrows()):
+            metadata = {"product_id": product_id, **row.to_dict(), "tags": str(row["tags"]).split("|")}
+            matches.append(SimpleNamespace(id=product_id, score=1.0 - rank * 0.01, metadata=metadata))
+        return matches
+
+    def _feedback_matches(self, top_k: int, filter: Dict[str, Any]):
+        product_id = (filter or {}).get("product_id")
+        return [
+            SimpleNamespace(
+                id=f"review-{product_id}-{i}",
+                score=0.9 - i * 0.05,
+                metadata={"product_id": product_id, "text": REVIEW_SNIPPETS[i % len(REVIEW_SNIPPETS)], "duplicate_count": 1 + i % 3},
+            )
+            for i in range(top_k)
+        ]
+
+    def query(self, vector=None, top_k: int = 10, include_metadata: bool = True, filter: Optional[Dict[str, Any]] = None, **kwargs):
+        self.latency.wait("query")
+        if self.kind == "catalog":
+            return SimpleNamespace(matches=self._catalog_matches(top_k, filter))
+        return SimpleNamespace(matches=self._feedback_matches(top_k, filter))
+
+    def upsert(self, vectors=None, **kwargs):
+        self.latency.wait("query")
+        return {"upserted_count": len(vectors or [])}
+
+
+def make_fake_stt(latency: LatencyModel):
+    """The load generator sends UTF-8 text as 'audio', so transcription is a decode."""
+    async def fake_speech_to_text(audio_bytes: bytes, filename: str = "audio.mp3", content_type: str = "audio/mpeg") -> str:
+        await latency.wait_async("stt")
+        return audio_bytes.decode("utf-8", errors="ignore")
+    return fake_speech_to_text
+
+
+def make_fake_tts(latency: LatencyModel, bytes_per_char: int = 400):
+    """Returns silence sized like real speech (~400 bytes of 16 kHz PCM per character at wav)."""
+    async def fake_text_to_speech(text: str, output_format: str = "wav", bitrate: Optional[int] = None) -> bytes:
+        await latency.wait_async("tts")
+        size = len(text) * bytes_per_char
+        if bitrate:
+            size = size * bitrate // 256000
+        return bytes(max(size, 1))
+    return fake_text_to_speech
+
+
+def install_fakes(profile: Dict[str, LatencyModel], n_products: int = 200,
+                  model_profile: Optional[Dict[str, Any]] = None, load_app: bool = True):
+    """
+    Swaps the upstream clients for fakes and returns the FastAPI app wired to them.
+    Must be called before anything imports services.prompts, services.router or main.
+
+    Without model_profile every LLM tier shares profile["llm"]; with it, each tier's model gets
+    its own (latency spec, quality) from the mapping (unknown models fall back to profile["llm"]).
+    """
+    # Placeholder keys so the real clients can be constructed (they are never called)
+    for key in ("GEMINI_API_KEY", "COHERE_API_KEY", "PINECONE_API_KEY", "AIML_API_KEY"):
+        os.environ.setdefault(key, "offline-benchmark")
+
+    from services import config, data_utils
+    from services.upstream import EmbeddingsProxy, IndexProxy
+    catalog = make_synthetic_catalog(n_products)
+    # Fakes sit behind the same proxies as the real clients, so upstream interceptors still apply
+    embeddings = EmbeddingsProxy(FakeEmbeddings(profile["embed"]), name=config.COHERE_EMBEDDING_MODEL)
+    catalog_index = IndexProxy(FakeIndex("catalog", catalog, profile["query"]), name=config.CATALOG_PINECONE_INDEX_NAME)
+    feedback_index = IndexProxy(FakeIndex("feedback", catalog, profile["query"]), name=config.FEEDBACK_PINECONE_INDEX_NAME)
+    seeds = iter(range(100, 10000))
+
+    def fake_chat_model(tier: Dict[str, Any]):
+        if model_profile and tier["model"] in model_profile:
+            spec, quality = model_profile[tier["model"]]
+            return make_fake_llm(LatencyModel.parse(spec, seed=next(seeds)), quality=quality, seed=next(seeds))
+        return make_fake_llm(profile["llm"])
+
+    # Every tier's client comes from make_chat_model, so each task keeps its own proxy (and model name)
+    config.make_chat_model = fake_chat_model
+    config._llms.clear()
+    config.llm = config.get_llm()
+    config.get_cohere_embeddings = lambda: embeddings
+    config.get_catalog_index = lambda: catalog_index
+    config.get_feedback_index = lambda: feedback_index
+    data_utils.set_product_catalog_data(catalog)
+    if not load_app:
+        return None, catalog
+
+    import main
+    main.speech_to_text = make_fake_stt(profile["stt"])
+    main.text_to_speech = make_fake_tts(profile["tts"])
+    return main.app, catalog
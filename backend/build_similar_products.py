@@ -0,0 +1,65 @@
+"""
+build_similar_products.py
+Offline step that builds the "similar products" neighbour table (services/similar.py) from the
+catalog vectors in the local embedding store. Run after preprocess_catalog_for_rag.py, which
+calls it at the end of a sync; products without a stored vector are left out of the table.
+
+Usage (from the backend directory):
+    python build_similar_products.py --top-n 20
+"""
+
+import time
+import argparse
+import logging
+
+import numpy as np
+
+from services.embedding_store import EmbeddingStore, content_hash, default_store_path
+from services.similar import SIMILAR_BLOCK_BYTES, SIMILAR_PRODUCTS_PATH, SIMILAR_TOP_N, build_neighbour_table, save_neighbour_table
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_PATH = default_store_path("catalog")
+
+
+def build_similar_products(docs, output_path=SIMILAR_PRODUCTS_PATH, top_n=SIMILAR_TOP_N, block_bytes=SIMILAR_BLOCK_BYTES,
+                           store_path=EMBEDDING_STORE_PATH):
+    """
+    Builds and saves the neighbour table for the catalog documents (make_documents output).
+    Vectors are looked up by the hash of each document's text, so they are exactly the ones in the index.
+    Returns the number of products in the table.
+    """
+    store = EmbeddingStore(store_path)
+    product_ids, vectors = [], []
+    for doc in docs:
+        vector = store.get(content_hash(doc.page_content))
+        if vector is not None:
+            product_ids.append(str(doc.metadata.get("product_id")))
+            vectors.append(vector)
+    missing = len(docs) - len(product_ids)
+    if missing:
+        logger.warning(f"{missing} products have no stored embedding and are left out of the similar-products table.")
+    if len(product_ids) < 2:
+        logger.warning("Fewer than two embedded products; similar-products table not built.")
+        return 0
+
+    start = time.perf_counter()
+    neighbours, scores = build_neighbour_table(np.stack(vectors), top_n=top_n, block_bytes=block_bytes)
+    logger.info(f"Computed top-{neighbours.shape[1]} neighbours for {len(product_ids)} products in {time.perf_counter() - start:.1f}s.")
+    save_neighbour_table(output_path, product_ids, neighbours, scores)
+    return len(product_ids)
+
+
+if __name__ == "__main__":
+    from services.data_utils import load_products_catalog
+    from preprocess_catalog_for_rag import make_documents
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build the precomputed similar-products neighbour table.")
+    parser.add_argument("--top-n", type=int, default=SIMILAR_TOP_N, help="Neighbours kept per product.")
+    parser.add_argument("--output", default=SIMILAR_PRODUCTS_PATH, help="Path of the .npz table.")
+    parser.add_argument("--block-mb", type=int, default=SIMILAR_BLOCK_BYTES // 2**20, help="Memory per similarity block, in MiB.")
+    args = parser.parse_args()
+
+    build_similar_products(make_documents(load_products_catalog()), output_path=args.output, top_n=args.top_n,
+                           block_bytes=args.block_mb * 2**20)
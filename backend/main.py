@@ -3,22 +3,20 @@ import sys # Import sys to output to stdout
 import pandas as pd # Import pandas for Excel handling
 import os # Import os for path joining
 import re  # Add this import
+from services.logging_setup import configure_logging, lazy
 
-# Configure basic logging
+# Configure logging
 # This will log messages from all loggers (including the one in english_agent.py)
-# to standard output (console) with a specified format and level.
-logging.basicConfig(
-    level=logging.INFO,  # Set the logging level (e.g., INFO, DEBUG, ERROR)
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)  # Output logs to stdout
-        # You can also add logging.FileHandler("app.log") to log to a file
-    ]
-)
+# to standard output (console). Request threads only enqueue (capped) records; a listener
+# thread formats and writes them. Level and format come from LOG_LEVEL and LOG_FORMAT.
+configure_logging()
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query
-from fastapi.responses import HTMLResponse
+import time
+import contextvars
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware  # Add this import
+from fastapi.concurrency import run_in_threadpool
 import asyncio
 from typing import Any, Dict, List, Tuple, Optional # Added Tuple
 from pydantic import BaseModel
@@ -27,7 +25,16 @@ from pydantic import BaseModel
 from services.speech_to_text import speech_to_text
 from services.english_agent import english_agent, AgentState # Import AgentState for type hinting if needed
 from services.text_to_speech import text_to_speech
-from services.data_utils import load_products_catalog, set_product_catalog_data, get_product_catalog_data
+from services.audio_formats import negotiate_formats
+from services.data_utils import get_product_catalog_data, get_products_by_ids as lookup_products, get_shared_catalog
+from services.shared_catalog import process_memory, format_memory
+from services.tracing import start_request, span, format_request_spans, render_metrics, REQUEST_DURATION, REQUESTS
+from services.token_budget import prompt_report
+from services.suggest import SUGGEST_LIMIT, get_suggest_index, suggest
+from services.similar import get_similar_products
+from services.warmup import get_warmup, start_warmup
+from services.tenants import TENANT_HEADER, TenantBundle, UnknownTenant, bind_tenant, get_tenant_registry
+from services.admission import Overloaded, RequestGate, get_limiter, start_deadline, MAX_INFLIGHT_REQUESTS
 
 app = FastAPI()
 
@@ -57,13 +64,106 @@ app.add_middleware(
 
 logger = logging.getLogger(__name__)
 
+chat_gate = RequestGate("/api/chat", MAX_INFLIGHT_REQUESTS)
+
+async def run_english_agent(text: str, state_dict: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Runs the synchronous agent chain on a worker thread so it does not block the event loop.
+    The request's context (request ID, spans, admission deadline) is carried into the thread.
+    """
+    context = contextvars.copy_context()
+    return await run_in_threadpool(context.run, english_agent, text, state_dict)
+
+async def resolve_tenant(tenant_id: Optional[str]) -> TenantBundle:
+    """The tenant's catalog bundle, loaded on a worker thread when it is not resident. Raises UnknownTenant."""
+    registry = get_tenant_registry()
+    bundle = registry.loaded(tenant_id)
+    if bundle is None:
+        bundle = await run_in_threadpool(registry.get, tenant_id)
+    return bundle
+
+def overloaded_response(error: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=error.status,
+        detail=f"Service busy: {error}",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Binds a request ID (taken from X-Request-ID or generated) to every log line and span of
+    the request, echoes it back in the response and records per-endpoint latency metrics.
+    Also binds the tenant's catalog bundle selected by X-Tenant-ID (services/tenants.py).
+    """
+    request_id = start_request(request.headers.get("x-request-id"))
+    endpoint = request.url.path
+    start = time.perf_counter()
+    status = 500
+    try:
+        tenant_id = request.headers.get(TENANT_HEADER)
+        try:
+            bind_tenant(await resolve_tenant(tenant_id))
+        except UnknownTenant:
+            status = 404
+            return JSONResponse({"detail": f"Unknown tenant: {tenant_id}"}, status_code=404, headers={"X-Request-ID": request_id})
+        except Exception as e:
+            logger.exception(f"Could not load tenant {tenant_id}: {e}")
+            status = 503
+            return JSONResponse({"detail": f"Tenant {tenant_id} is unavailable"}, status_code=503, headers={"X-Request-ID": request_id})
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        if endpoint not in ("/metrics", "/ready"):
+            REQUEST_DURATION.observe(elapsed, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=str(status))
+            spans = format_request_spans()
+            logger.info(f"[{request_id}] {request.method} {endpoint} -> {status} in {elapsed * 1000:.0f}ms" + (f" ({spans})" if spans else ""))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: request, stage and agent latency histograms and counters."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 while the startup warm-up (services/warmup.py) is still filling the caches,
+    200 once it has finished or timed out. The body is the warm-up report either way.
+    """
+    warmup = get_warmup()
+    return JSONResponse(warmup.report(), status_code=200 if warmup.is_ready() else 503)
+
+@app.get("/api/debug/prompt-tokens")
+async def prompt_tokens_report(top: int = 20):
+    """Biggest prompt contributors (agent, prompt part) by estimated tokens since startup."""
+    return prompt_report(top)
+
 @app.post("/api/chat")
 async def http_chat_agent(request: ChatRequest):
     """
     HTTP endpoint for text-based interaction with the English agent.
+    Answers 429 when too many chats are in flight and 503 when an upstream queue sheds the
+    request, both with Retry-After.
     """
     try:
-        logger.info(f"Received /api/chat request. Text: '{request.text}', State Dict from Frontend: {request.state_dict}") # <-- ADD THIS LINE
+        with chat_gate.admit() as ticket:
+            result = await _chat(request)
+        if ticket.rejected is not None:
+            raise overloaded_response(ticket.rejected)
+        return result
+    except Overloaded as e:
+        raise overloaded_response(e)
+
+async def _chat(request: ChatRequest):
+    try:
+        # The full state grows with the session, so only its size is logged at INFO
+        history_turns = len(request.state_dict.get("history") or []) if request.state_dict else 0
+        logger.info("Received /api/chat request. Text: '%s', state with %d history turns from frontend.", request.text, history_turns)
+        logger.debug("State Dict from Frontend: %s", request.state_dict)
 
         # Initialize current_state_data with defaults
         current_state_data = {
@@ -71,7 +171,10 @@ async def http_chat_agent(request: ChatRequest):
             "entities": {},
             "intent": None, 
             "active_agent": None, 
-            "followup_questions": []
+            "followup_questions": [],
+            "summary": "",
+            "summarized_turns": 0,
+            "last_product_ids": []
         }
 
         if request.state_dict:
@@ -105,39 +208,87 @@ async def http_chat_agent(request: ChatRequest):
             current_state_data["intent"] = request.state_dict.get("intent")
             current_state_data["active_agent"] = request.state_dict.get("active_agent")
             current_state_data["followup_questions"] = request.state_dict.get("followup_questions", [])
+            current_state_data["summary"] = request.state_dict.get("summary", "")
+            current_state_data["summarized_turns"] = request.state_dict.get("summarized_turns", 0)
+            current_state_data["last_product_ids"] = request.state_dict.get("last_product_ids", [])
         else:
             logger.info("No state_dict received from frontend, starting with default state.")
 
-        # Call the synchronous english_agent function
+        # Call the synchronous english_agent function (on a worker thread)
         # The english_agent function itself will call AgentState.from_dict(current_state_data)
-        result = english_agent(text=request.text, state_dict=current_state_data)
+        result = await run_english_agent(request.text, current_state_data)
         return result # english_agent returns a dict like {"response": ..., "state": ..., "product_ids": []}
     except Exception as e:
         logger.exception("Error processing chat: %s", e)
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
+async def voice_turn(audio_bytes: bytes, formats: Dict[str, Any]) -> bytes:
+    """One voice turn: STT, the agent chain and TTS, each behind its upstream's concurrency limit."""
+    async with get_limiter("stt").slot():
+        with span("stt"):
+            text = await speech_to_text(audio_bytes, filename=formats["input_filename"], content_type=formats["input_mime"])
+    logger.info("Transcribed text: %s", text)
+    response_data = await run_english_agent(text, None)
+    logger.info("english_agent WS result: %s", lazy(lambda: {k: v for k, v in response_data.items() if k != "state"}))
+    logger.debug("english_agent WS state: %s", response_data.get("state"))
+    response_text_content = ""
+    if isinstance(response_data.get("response"), dict):
+         response_text_content = response_data.get("response", {}).get("response", "Sorry, I could not understand.")
+    elif isinstance(response_data.get("response"), str):
+         response_text_content = response_data.get("response", "Sorry, I could not understand.")
+    else:
+        response_text_content = "I received a response I could not process."
+    async with get_limiter("tts").slot():
+        with span("tts"):
+            return await text_to_speech(response_text_content, output_format=formats["output_format"], bitrate=formats["bitrate"])
+
 @app.websocket("/ws/voice-agent")
-async def websocket_voice_agent(websocket: WebSocket):
+async def websocket_voice_agent(
+    websocket: WebSocket,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    bitrate: Optional[int] = None,
+    tenant: Optional[str] = None,
+):
+    """
+    Voice agent WebSocket. Audio formats are negotiated through query parameters,
+    e.g. /ws/voice-agent?input_format=webm&output_format=opus&bitrate=24000.
+    The negotiated formats are sent back as a JSON text frame before any audio.
+    The tenant comes from X-Tenant-ID or, since browsers cannot set WebSocket headers, ?tenant=.
+    """
+    tenant_id = websocket.headers.get(TENANT_HEADER) or tenant
+    try:
+        bind_tenant(await resolve_tenant(tenant_id))
+    except Exception as e:
+        logger.warning(f"Voice agent WebSocket rejected for tenant {tenant_id}: {e}")
+        await websocket.close(code=1008, reason=f"Unknown or unavailable tenant: {tenant_id}")
+        return
     await websocket.accept()
     try:
-        logger.info("WebSocket connection accepted.")
+        formats = negotiate_formats(input_format, output_format, bitrate)
+        logger.info("WebSocket connection accepted. Negotiated audio formats: %s", formats)
+        await websocket.send_json({"type": "format", **formats})
         while True:
             audio_bytes = await websocket.receive_bytes()
-            logger.info("Received audio bytes from frontend.")
-            text = await speech_to_text(audio_bytes)
-            logger.info("Transcribed text: %s", text)
-            response_data = english_agent(text, state_dict=None)
-            logger.info("english_agent WS result: %s", response_data)
-            response_text_content = ""
-            if isinstance(response_data.get("response"), dict):
-                 response_text_content = response_data.get("response", {}).get("response", "Sorry, I could not understand.")
-            elif isinstance(response_data.get("response"), str):
-                 response_text_content = response_data.get("response", "Sorry, I could not understand.")
-            else:
-                response_text_content = "I received a response I could not process."
-            response_audio = await text_to_speech(response_text_content)
-            logger.info("Sending audio bytes back to frontend.")
+            # Every voice turn is traced as its own request, with its own deadline
+            request_id = start_request()
+            ticket = start_deadline()
+            turn_start = time.perf_counter()
+            logger.info("[%s] Received %d audio bytes (%s) from frontend.", request_id, len(audio_bytes), formats["input_format"])
+            try:
+                response_audio = await voice_turn(audio_bytes, formats)
+                if ticket.rejected is not None:
+                    raise ticket.rejected
+            except Overloaded as e:
+                REQUESTS.inc(endpoint="/ws/voice-agent", status=str(e.status))
+                await websocket.send_json({"type": "error", "status": e.status, "retry_after": e.retry_after, "detail": str(e)})
+                continue
+            logger.info("Sending %d audio bytes (%s) back to frontend.", len(response_audio), formats["output_format"])
             await websocket.send_bytes(response_audio)
+            turn_elapsed = time.perf_counter() - turn_start
+            REQUEST_DURATION.observe(turn_elapsed, endpoint="/ws/voice-agent")
+            REQUESTS.inc(endpoint="/ws/voice-agent", status="ok")
+            logger.info(f"[{request_id}] voice turn in {turn_elapsed * 1000:.0f}ms ({format_request_spans()})")
     except WebSocketDisconnect:
         logger.info("Client disconnected from voice agent WebSocket")
         pass
@@ -153,30 +304,62 @@ async def get_products_by_ids(ids: List[str] = Query()):
     Looks up IDs in the in-memory product catalog data (pandas DataFrame).
     """
     logger.info("Received /api/products request with IDs: %s", ids)
-    df = get_product_catalog_data()
     try:
-        # Use pandas filtering to find products with matching IDs
-        # Assumes 'product_id' is the column name for IDs
-        # Use .isin() for efficient checking against a list of IDs
-        found_products_df = df.loc[ids].reset_index()
-
-        # Convert the filtered DataFrame back to a list of dictionaries for the response
-        found_products = found_products_df.to_dict('records')
-        
+        # Looks the IDs up in the shared catalog's ID index (or the private DataFrame)
+        found_products = lookup_products(ids)
+
         logger.info("Found %d products for IDs: %s", len(found_products), ids)
         return found_products
-    except KeyError:
-        logger.error("Product catalog DataFrame is missing the 'product_id' column.")
+    except KeyError as e:
+        logger.error(f"Unknown product ID in /api/products request: {e}")
         return []
     except Exception as e:
         logger.exception(f"Error filtering product catalog by IDs {ids}: {e}")
         return []
 
-# Startup event to load the product catalog
+@app.get("/api/suggest")
+async def suggest_products(q: str = "", limit: int = SUGGEST_LIMIT):
+    """
+    Typeahead suggestions (product names, categories, tags, ingredients) for a partial query.
+    Served from the in-memory index in services/suggest.py; never calls the LLM or any upstream.
+    """
+    return {"query": q, "suggestions": suggest(q, limit)}
+
+@app.get("/api/products/{product_id}/similar")
+async def similar_products(product_id: str, limit: int = Query(10, ge=1, le=50)):
+    """
+    The products most similar to product_id, from the precomputed neighbour table (services/similar.py).
+    Each record carries its cosine 'similarity'. 404 for a product not in the table, 503 if no table is built.
+    """
+    table = get_similar_products()
+    if table is None:
+        raise HTTPException(status_code=503, detail="Similar-products table not built. Run build_similar_products.py.")
+    if product_id not in table:
+        raise HTTPException(status_code=404, detail=f"Unknown product ID: {product_id}")
+    neighbours = table.similar(product_id, limit)
+    products = []
+    for pid, score in neighbours:
+        try:
+            record = lookup_products([pid])[0]
+        except KeyError:
+            # Built from an older catalog; the product has since been removed
+            continue
+        products.append({**record, "similarity": round(score, 4)})
+    return {"product_id": product_id, "products": products}
+
+# Startup event: the catalog was loaded (or attached from shared memory) when services.data_utils
+# was imported, so it is only reported here rather than loaded a second time
 @app.on_event("startup")
 async def load_product_catalog():
-    catalog_data = load_products_catalog()
-    set_product_catalog_data(catalog_data)
-    logger.info(f"Loaded {len(catalog_data)} products from catalog.")
+    catalog_data = get_product_catalog_data()
+    source = f"shared segment {get_shared_catalog().path}" if get_shared_catalog() is not None else "private copy"
+    logger.info(f"Worker {os.getpid()}: {len(catalog_data)} products from the {source}; memory {format_memory(process_memory())}.")
+    # Built here so the first keystroke does not pay for it
+    get_suggest_index()
+    get_similar_products()
+    # Reads tenants.json now, so a tenant missing its catalog or index names fails the deploy, not every request
+    get_tenant_registry()
+    # Embeds and retrieves the most popular queries in the background; /ready waits for it
+    start_warmup()
 
 # TODO: Add authentication, streaming audio support, and production-level error handling as needed.
\ No newline at end of file
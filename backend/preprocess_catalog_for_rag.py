@@ -1,4 +1,7 @@
 import os
+import json
+import hashlib
+import argparse
 import pandas as pd
 import logging
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -10,6 +13,9 @@ from langchain_cohere import CohereEmbeddings
 
 from dotenv import load_dotenv
 from services.data_utils import load_products_catalog  # Import the load_catalog function from data_util
+from services.embedding_pipeline import EmbedUpsertPipeline
+from services.embedding_store import EmbeddingStore, default_store_path
+from build_similar_products import build_similar_products
 
 load_dotenv()
 # --- Config ---
@@ -18,6 +24,9 @@ PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "everglow-catalog")
 PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")  # e.g., "us-east-1"
 PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")  # e.g., "aws"
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+EMBEDDING_MODEL = "embed-english-light-v2.0"
+EMBEDDING_STORE_PATH = default_store_path("catalog")
+MANIFEST_PATH = os.getenv("CATALOG_MANIFEST_PATH", os.path.join(os.path.dirname(__file__), "catalog_index_manifest.json"))
 
 # --- Logging setup ---
 logger = logging.getLogger(__name__)
@@ -34,6 +43,9 @@ def make_documents(df):
     Ensures all metadata values are primitives (str, int, float, bool, None).
     """
     docs = []
+    # load_products_catalog() indexes the DataFrame by product_id; bring it back as a column
+    if df.index.name == 'product_id':
+        df = df.reset_index()
     for _, row in df.iterrows():
         # --- Build document text ---
         text = (
@@ -64,72 +76,225 @@ def make_documents(df):
     logger.info(f"Created {len(docs)} documents for vector store.")
     return docs
 
-# --- Step 3: Generate Embeddings and Store in Pinecone Vector Store ---
-def build_and_upsert_pinecone(docs):
-    # 1. Generate embeddings using a 1024-dimensional model
-    if not COHERE_API_KEY:
-        logger.error("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
-        raise ValueError("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
-    embeddings_model = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model="embed-english-light-v2.0")
-    texts = [doc.page_content for doc in docs]
-    metadatas = [doc.metadata for doc in docs]
-    ids = [str(meta.get("product_id", i)) for i, meta in enumerate(metadatas)]
-    vectors = embeddings_model.embed_documents(texts)
-    assert len(vectors) == len(ids) == len(metadatas)
+# --- Step 3: Diff Documents Against the Index Manifest ---
+def document_content_hash(doc):
+    """
+    Returns a stable SHA-256 hash over a document's text and metadata.
+    Any change to either means the product must be re-embedded and re-upserted.
+    """
+    payload = json.dumps(
+        {"text": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    # 2. Initialize Pinecone client
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Loads the manifest of per-product content hashes from the previous run.
+    Returns an empty manifest if none exists or it belongs to a different index/model.
+    """
+    empty = {"index_name": PINECONE_INDEX_NAME, "model": EMBEDDING_MODEL, "products": {}}
+    if not os.path.exists(path):
+        logger.info(f"No catalog manifest found at {path}. All products will be indexed.")
+        return empty
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read catalog manifest at {path}: {e}. All products will be indexed.")
+        return empty
+    if manifest.get("index_name") != PINECONE_INDEX_NAME or manifest.get("model") != EMBEDDING_MODEL:
+        logger.warning("Catalog manifest was built for a different index or embedding model. All products will be indexed.")
+        return empty
+    return manifest
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Atomically writes the manifest so an interrupted run never leaves a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved catalog manifest with {len(manifest['products'])} products to {path}")
+
+def diff_documents(docs, manifest):
+    """
+    Compares the current documents with the manifest.
+    Returns a dict with 'added', 'changed', 'removed' and 'unchanged' product IDs,
+    plus 'hashes' (product_id -> content hash) for the current documents.
+    """
+    previous = manifest.get("products", {})
+    hashes = {str(doc.metadata.get("product_id")): document_content_hash(doc) for doc in docs}
+    added = sorted(pid for pid in hashes if pid not in previous)
+    changed = sorted(pid for pid in hashes if pid in previous and previous[pid] != hashes[pid])
+    removed = sorted(pid for pid in previous if pid not in hashes)
+    unchanged = sorted(pid for pid in hashes if previous.get(pid) == hashes[pid])
+    return {"added": added, "changed": changed, "removed": removed, "unchanged": unchanged, "hashes": hashes}
+
+def log_diff(diff):
+    logger.info(
+        f"Catalog diff: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+        f"{len(diff['removed'])} removed, {len(diff['unchanged'])} unchanged."
+    )
+    for key in ("added", "changed", "removed"):
+        if diff[key]:
+            logger.info(f"  {key}: {', '.join(diff[key])}")
+
+# --- Step 4: Generate Embeddings and Store in Pinecone Vector Store ---
+def get_pinecone_index(dimension=None):
+    """
+    Returns the Pinecone index object, creating the index if it does not exist and a dimension is given.
+    Raises ValueError on a dimension mismatch with an existing index.
+    """
     if not PINECONE_API_KEY:
         logger.error("PINECONE_API_KEY must be set in environment variables.")
         raise ValueError("PINECONE_API_KEY must be set in environment variables.")
     pc = Pinecone(api_key=PINECONE_API_KEY)
 
+    exists = PINECONE_INDEX_NAME in [idx.name for idx in pc.list_indexes()]
     # Check index dimension if it exists
-    if PINECONE_INDEX_NAME in [idx.name for idx in pc.list_indexes()]:
+    if exists and dimension is not None:
         index_description = pc.describe_index(PINECONE_INDEX_NAME)
         existing_dimension = index_description.dimension
-        if existing_dimension != len(vectors[0]):
-             logger.error(f"Pinecone index dimension mismatch. Existing: {existing_dimension}, Embedding dimension: {len(vectors[0])}")
-             raise ValueError(f"Pinecone index '{PINECONE_INDEX_NAME}' has dimension {existing_dimension}, but embeddings are dimension {len(vectors[0])}. Please delete the index and try again.")
+        if existing_dimension != dimension:
+             logger.error(f"Pinecone index dimension mismatch. Existing: {existing_dimension}, Embedding dimension: {dimension}")
+             raise ValueError(f"Pinecone index '{PINECONE_INDEX_NAME}' has dimension {existing_dimension}, but embeddings are dimension {dimension}. Please delete the index and try again.")
 
-    if PINECONE_INDEX_NAME not in [idx.name for idx in pc.list_indexes()]:
+    if not exists:
+        if dimension is None:
+            return None
         pc.create_index(
             name=PINECONE_INDEX_NAME,
-            dimension=len(vectors[0]),  # Use dimension from the chosen model
+            dimension=dimension,  # Use dimension from the chosen model
             metric="cosine",
             spec=ServerlessSpec(
                 cloud=PINECONE_CLOUD,
                 region=PINECONE_REGION
             )
         )
-        logger.info(f"Created new Pinecone index: {PINECONE_INDEX_NAME} with dimension {len(vectors[0])}")
-
-    # 3. Get index object
-    index = pc.Index(PINECONE_INDEX_NAME)
-
-    # 4. Prepare upsert data
-    upsert_data = [
-        {"id": id_, "values": vector, "metadata": metadata}
-        for id_, vector, metadata in zip(ids, vectors, metadatas)
-    ]
-
-    # 5. Upsert to Pinecone
-    logger.info(f"Upserting {len(upsert_data)} vectors to Pinecone index: {PINECONE_INDEX_NAME}")
-    # Implement batching for larger datasets
-    batch_size = 100
-    for i in range(0, len(upsert_data), batch_size):
-        batch = upsert_data[i:i + batch_size]
-        index.upsert(vectors=batch)
-        logger.info(f"Upserted batch {i // batch_size + 1} of {len(upsert_data) // batch_size + 1}")
+        logger.info(f"Created new Pinecone index: {PINECONE_INDEX_NAME} with dimension {dimension}")
 
+    return pc.Index(PINECONE_INDEX_NAME)
+
+def index_exists():
+    """Returns True if the catalog Pinecone index exists."""
+    if not PINECONE_API_KEY:
+        return False
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    return PINECONE_INDEX_NAME in [idx.name for idx in pc.list_indexes()]
+
+def build_and_upsert_pinecone(docs, checkpoint_path=None):
+    """
+    Embeds the documents and upserts them to Pinecone through the shared
+    concurrent, rate-limited pipeline. Raises if any batch fails after retries.
+    Vectors are also kept in the local embedding store, so re-indexing unchanged
+    text never calls Cohere again.
+    """
+    if not docs:
+        logger.info("No documents to embed and upsert.")
+        return
+    # 1. Generate embeddings using a 1024-dimensional model
+    if not COHERE_API_KEY:
+        logger.error("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
+        raise ValueError("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
+    embeddings_model = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model=EMBEDDING_MODEL)
+    texts = [doc.page_content for doc in docs]
+    metadatas = [doc.metadata for doc in docs]
+    ids = [str(meta.get("product_id", i)) for i, meta in enumerate(metadatas)]
+
+    # 2. Embed and upsert concurrently; the index is created from the first batch's dimension
+    logger.info(f"Embedding and upserting {len(ids)} vectors to Pinecone index: {PINECONE_INDEX_NAME}")
+    pipeline = EmbedUpsertPipeline(
+        embeddings_model,
+        index_factory=lambda dimension: get_pinecone_index(dimension=dimension),
+        checkpoint_path=checkpoint_path,
+        embedding_store=EmbeddingStore(EMBEDDING_STORE_PATH, model=EMBEDDING_MODEL),
+        name="catalog",
+    )
+    pipeline.run(zip(ids, texts, metadatas))
     logger.info("Upsert complete.")
 
+def delete_from_pinecone(product_ids):
+    """Deletes the vectors of removed products from the catalog index."""
+    if not product_ids:
+        return
+    index = get_pinecone_index()
+    if index is None:
+        logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist. Nothing to delete.")
+        return
+    batch_size = 1000
+    for i in range(0, len(product_ids), batch_size):
+        index.delete(ids=product_ids[i:i + batch_size])
+    logger.info(f"Deleted {len(product_ids)} removed products from Pinecone index: {PINECONE_INDEX_NAME}")
+
+def list_index_ids():
+    """IDs of every vector in the catalog index; empty if it does not exist or cannot be listed."""
+    if not index_exists():
+        return set()
+    try:
+        # Serverless indexes list IDs page by page; pod-based indexes do not support listing
+        return {vector_id for page in get_pinecone_index().list() for vector_id in page}
+    except Exception as e:
+        logger.warning(f"Could not list the vectors in Pinecone index '{PINECONE_INDEX_NAME}' ({e}). Removed products are taken from the manifest only.")
+        return set()
+
+def sync_catalog_index(docs, dry_run=False, full=False, manifest_path=MANIFEST_PATH, checkpoint_path=None):
+    """
+    Incrementally syncs the catalog index with the given documents.
+    Only new or changed products are embedded and upserted, and vectors of products
+    no longer in the catalog are deleted. With dry_run=True the diff is only reported.
+    A full re-index (or a missing or discarded manifest) re-embeds every product but still
+    deletes the products that were in the manifest, or in the index, and are no longer in the catalog.
+    Returns the diff dict.
+    """
+    manifest = load_manifest(manifest_path)
+    known_ids = set(manifest["products"])
+    if full or not known_ids:
+        # Everything is re-embedded, so the index itself is the only complete record of what to delete
+        known_ids |= list_index_ids()
+    if full:
+        logger.info("Full re-index requested. Ignoring the existing manifest.")
+        manifest["products"] = {}
+    elif manifest["products"] and not dry_run and not index_exists():
+        logger.warning(f"Pinecone index '{PINECONE_INDEX_NAME}' is missing. Ignoring the manifest and re-indexing everything.")
+        manifest["products"] = {}
+    diff = diff_documents(docs, manifest)
+    # Clearing the manifest hides removals from the diff; they are taken from the IDs known before
+    diff["removed"] = sorted(known_ids - set(diff["hashes"]))
+    log_diff(diff)
+    if dry_run:
+        logger.info("Dry run: no embeddings generated and no changes written.")
+        return diff
+
+    to_upsert = set(diff["added"]) | set(diff["changed"])
+    build_and_upsert_pinecone(
+        [doc for doc in docs if str(doc.metadata.get("product_id")) in to_upsert],
+        checkpoint_path=checkpoint_path,
+    )
+    delete_from_pinecone(diff["removed"])
+
+    manifest["products"] = diff["hashes"]
+    save_manifest(manifest, manifest_path)
+    return diff
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally index the product catalog into Pinecone.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which products would be added, changed or removed.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed every product.")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="Path of the per-product content hash manifest.")
+    parser.add_argument("--checkpoint", default=None, help="Optional checkpoint file to resume an interrupted upsert.")
+    parser.add_argument("--no-similar", action="store_true", help="Skip rebuilding the similar-products neighbour table.")
+    args = parser.parse_args()
+
     df = load_products_catalog()
     docs = make_documents(df)
-    build_and_upsert_pinecone(docs)
+    sync_catalog_index(docs, dry_run=args.dry_run, full=args.full, manifest_path=args.manifest, checkpoint_path=args.checkpoint)
     logger.info("Catalog preprocessing and upsert to Pinecone complete.")
+    if not args.dry_run and not args.no_similar:
+        build_similar_products(docs)
 
-# TODO: Add error handling, logging, and support for incremental updates.
+# TODO: Add error handling and logging.
 # TODO: Document the expected Excel columns and add validation.
 # TODO: Normalize tags (e.g., split by comma) and ensure price/margin are numeric if needed.
 # TODO: Add error handling for malformed tags or missing values if needed.
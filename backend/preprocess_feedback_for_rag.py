@@ -1,5 +1,8 @@
 import os
 import re
+import time
+import resource
+import argparse
 import pandas as pd
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.docstore.document import Document
@@ -10,7 +13,10 @@ from pinecone import Pinecone, ServerlessSpec
 from langchain_cohere import CohereEmbeddings
 
 # Import the moved function
-from services.data_utils import extract_product_from_text, load_catalog_product_id_name
+from services.data_utils import link_products_batch, load_catalog_product_id_name
+from services.embedding_pipeline import EmbedUpsertPipeline, bounded_prefetch
+from services.embedding_store import EmbeddingStore, default_store_path
+from services.dedup import NearDuplicateCollapser, stable_id
 
 from dotenv import load_dotenv
 
@@ -22,6 +28,12 @@ PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "everglow-feedback") # Us
 PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")
 PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+FEEDBACK_CHUNK_SIZE = int(os.getenv("FEEDBACK_CHUNK_SIZE", "5000"))
+REVIEWS_SHEET = "Reviews"
+TICKETS_SHEET = "Customer Support Tickets"
+EMBEDDING_MODEL = "embed-english-light-v2.0"
+EMBEDDING_STORE_PATH = default_store_path("feedback")
+CHECKPOINT_PATH = os.getenv("FEEDBACK_CHECKPOINT_PATH", os.path.join(os.path.dirname(__file__), "feedback_upsert.checkpoint"))
 
 # --- Logging setup ---
 logger = logging.getLogger(__name__)
@@ -53,37 +65,48 @@ def normalize_rating(rating):
     logger.warning(f"Could not normalize rating: {rating_str}. Returning original.")
     return rating_str
 
+# --- Utility: Column access ---
+def text_column(df, column):
+    """Returns a column as stripped strings (empty strings if the column is missing)."""
+    if column not in df.columns:
+        return pd.Series([""] * len(df), index=df.index)
+    return df[column].astype(str).str.strip()
+
 # --- Step 2: Preprocess Reviews Sheet ---
 def preprocess_reviews(df_reviews, catalog_products):
     """
     Converts review rows into LangChain Documents with metadata.
+    Product names are linked to the catalog in one batch call and metadata is built column-wise.
     """
+    reviewers = text_column(df_reviews, "Reviewer")
+    product_names = text_column(df_reviews, "Product")
+    reviews = text_column(df_reviews, "Review")
+    raw_ratings = df_reviews["Rating"] if "Rating" in df_reviews.columns else pd.Series([""] * len(df_reviews), index=df_reviews.index)
+    # Normalize each distinct rating once
+    rating_map = {r: normalize_rating(r) for r in pd.unique(raw_ratings)}
+    ratings = raw_ratings.map(rating_map)
+    # Link to catalog
+    product_ids = [pid or "" for pid in link_products_batch(product_names.tolist(), catalog_products=catalog_products or None)]
+
     docs = []
-    for index, row in df_reviews.iterrows():
-        try:
-            reviewer = str(row.get("Reviewer", "")).strip()
-            product_name = str(row.get("Product", "")).strip()
-            review = str(row.get("Review", "")).strip()
-            rating = normalize_rating(row.get("Rating", ""))
-            # Link to catalog
-            product_id = extract_product_from_text(product_name) or ""
-            # Build document text
-            text = f"Review for Product ID: {product_id}\nName: {product_name}: {review}\nRating: {rating}\nReviewer: {reviewer}"
-            metadata = {
-                "source": "review",
-                "source_id": f"review_{index}", # Add original row index for potential debugging/tracking
-                "reviewer": reviewer.lower(),
-                "product_id": product_id,
-                "rating": rating,
-                "product_in_catalog": bool(product_id),
-                "original_review": review,  # Store original review text for citations
-                "product_name": product_name,  # Store product name for context
-                "text": text,
-            }
-            docs.append(Document(page_content=text, metadata=metadata))
-        except Exception as e:
-             logger.error(f"Error processing review row {index}: {e}")
-             continue # Skip this row and continue with the next
+    for index, reviewer, product_name, review, rating, product_id in zip(
+        df_reviews.index, reviewers, product_names, reviews, ratings, product_ids
+    ):
+        # Build document text
+        text = f"Review for Product ID: {product_id}\nName: {product_name}: {review}\nRating: {rating}\nReviewer: {reviewer}"
+        metadata = {
+            "source": "review",
+            "source_id": f"review_{index}", # Add original row index for potential debugging/tracking
+            "row_index": int(index),
+            "reviewer": reviewer.lower(),
+            "product_id": product_id,
+            "rating": rating,
+            "product_in_catalog": bool(product_id),
+            "original_review": review,  # Store original review text for citations
+            "product_name": product_name,  # Store product name for context
+            "text": text,
+        }
+        docs.append(Document(page_content=text, metadata=metadata))
 
     logger.info(f"Processed {len(docs)} review documents.")
     return docs
@@ -92,57 +115,81 @@ def preprocess_reviews(df_reviews, catalog_products):
 def preprocess_support_tickets(df_tickets, catalog_products):
     """
     Converts support ticket rows into LangChain Documents with metadata.
+    Customer messages are linked in one batch call; only tickets without a match
+    fall back to a second batch over their support responses.
     """
+    ticket_ids = text_column(df_tickets, "Ticket ID")
+    customer_msgs = text_column(df_tickets, "Customer Message")
+    support_resps = text_column(df_tickets, "Support Response")
+    # Try to extract product from customer message or support response
+    product_ids = link_products_batch(customer_msgs.tolist(), catalog_products=catalog_products or None)
+    unmatched = [i for i, pid in enumerate(product_ids) if not pid]
+    if unmatched:
+        fallback_ids = link_products_batch([support_resps.iloc[i] for i in unmatched], catalog_products=catalog_products or None)
+        for i, pid in zip(unmatched, fallback_ids):
+            product_ids[i] = pid
+    product_ids = [pid or "" for pid in product_ids]
+
     docs = []
-    for index, row in df_tickets.iterrows():
-        try:
-            ticket_id = str(row.get("Ticket ID", "")).strip()
-            customer_msg = str(row.get("Customer Message", "")).strip()
-            support_resp = str(row.get("Support Response", "")).strip()
-            # Try to extract product from customer message or support response
-            product_id = extract_product_from_text(customer_msg) or extract_product_from_text(support_resp) or ""
-            in_catalog = bool(product_id) # True if a product was extracted
-            text = f"Product ID:{product_id}\nCustomer Support Ticket {ticket_id}:\nQ: {customer_msg}\nA: {support_resp}"
-            metadata = {
-                "source": "support_ticket",
-                "source_id": ticket_id,
-                "product_id": product_id,
-                "product_in_catalog": in_catalog,
-                "customer_message": customer_msg,  # Store original customer message
-                "support_response": support_resp,  # Store original support response
-                "text": text,
-            }
-            docs.append(Document(page_content=text, metadata=metadata))
-        except Exception as e:
-             logger.error(f"Error processing ticket row {index}: {e}")
-             continue # Skip this row and continue with the next
+    for ticket_id, customer_msg, support_resp, product_id in zip(ticket_ids, customer_msgs, support_resps, product_ids):
+        text = f"Product ID:{product_id}\nCustomer Support Ticket {ticket_id}:\nQ: {customer_msg}\nA: {support_resp}"
+        metadata = {
+            "source": "support_ticket",
+            "source_id": ticket_id,
+            "product_id": product_id,
+            "product_in_catalog": bool(product_id), # True if a product was extracted
+            "customer_message": customer_msg,  # Store original customer message
+            "support_response": support_resp,  # Store original support response
+            "text": text,
+        }
+        docs.append(Document(page_content=text, metadata=metadata))
 
     logger.info(f"Processed {len(docs)} support ticket documents.")
     return docs
 
 # --- Step 4: Generate Embeddings and Upsert to Pinecone Vector Store ---
-def build_and_upsert_pinecone_feedback(docs):
+def feedback_vector_id(metadata):
     """
-    Generates embeddings using Cohere and upserts documents to a Pinecone index.
+    Deterministic vector ID derived from the source identity and the content, so reruns are
+    idempotent and adding rows never shifts the IDs of existing feedback.
+    Reviews have no upstream ID, so reviewer and product identify them; tickets use the Ticket ID.
     """
-    # 1. Generate embeddings using a 1024-dimensional model
-    if not COHERE_API_KEY:
-        logger.error("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
-        raise ValueError("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
-    try:
-        embeddings_model = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model="embed-english-light-v2.0")
-        texts = [doc.page_content for doc in docs]
-        metadatas = [doc.metadata for doc in docs]
-        # Generate unique IDs for each document, perhaps combining source and row index
-        ids = [f"{meta.get('source', 'unknown')}-{meta.get('row_index', i)}" for i, meta in enumerate(metadatas)]
-        vectors = embeddings_model.embed_documents(texts)
-        assert len(vectors) == len(ids) == len(metadatas)
-        logger.info(f"Generated {len(vectors)} embeddings with dimension {len(vectors[0])}.")
-    except Exception as e:
-         logger.exception(f"Error generating embeddings: {e}")
-         raise
+    source = metadata.get("source", "unknown")
+    if source == "review":
+        return stable_id(source, metadata.get("reviewer", ""), metadata.get("product_name", ""), metadata.get("original_review", ""))
+    if source == "support_ticket":
+        return stable_id(source, metadata.get("source_id", ""), metadata.get("customer_message", ""), metadata.get("support_response", ""))
+    return stable_id(source, metadata.get("source_id", ""), metadata.get("text", ""))
+
+def make_feedback_collapser():
+    """
+    Near-duplicate detector for feedback: copy-pasted reviews and templated support
+    exchanges about the same product are collapsed into one vector with a count.
+    """
+    def content(doc):
+        meta = doc.metadata
+        if meta.get("source") == "review":
+            return meta.get("original_review", "")
+        return f"{meta.get('customer_message', '')} {meta.get('support_response', '')}"
+    return NearDuplicateCollapser(content_fn=content, group_fn=lambda doc: (doc.metadata.get("source"), doc.metadata.get("product_id")),
+                                  id_fn=lambda doc: feedback_vector_id(doc.metadata))
+
+def update_duplicate_counts(index, collapser):
+    """
+    Streaming mode emits a representative before all its duplicates have been seen,
+    so the final counts are patched onto the already-upserted vectors afterwards.
+    """
+    updated = 0
+    for vector_id, counts in collapser.duplicates.items():
+        index.update(id=vector_id, set_metadata=counts)
+        updated += 1
+    logger.info(f"Updated duplicate counts on {updated} representative vectors.")
 
-    # 2. Initialize Pinecone client
+def get_pinecone_index(dimension):
+    """
+    Connects to the feedback Pinecone index, creating it with the given dimension if needed.
+    Raises ValueError if an existing index has a different dimension.
+    """
     if not PINECONE_API_KEY:
         logger.error("PINECONE_API_KEY must be set in environment variables.")
         raise ValueError("PINECONE_API_KEY must be set in environment variables.")
@@ -153,14 +200,13 @@ def build_and_upsert_pinecone_feedback(docs):
          raise
 
     # Check index existence and dimension
-    expected_dimension = len(vectors[0])
     if PINECONE_INDEX_NAME in [idx.name for idx in pc.list_indexes()]:
         try:
             index_description = pc.describe_index(PINECONE_INDEX_NAME)
             existing_dimension = index_description.dimension
-            if existing_dimension != expected_dimension:
-                 logger.error(f"Pinecone index dimension mismatch. Existing: {existing_dimension}, Embedding dimension: {expected_dimension}")
-                 raise ValueError(f"Pinecone index '{PINECONE_INDEX_NAME}' has dimension {existing_dimension}, but embeddings are dimension {expected_dimension}. Please delete the index and try again.")
+            if existing_dimension != dimension:
+                 logger.error(f"Pinecone index dimension mismatch. Existing: {existing_dimension}, Embedding dimension: {dimension}")
+                 raise ValueError(f"Pinecone index '{PINECONE_INDEX_NAME}' has dimension {existing_dimension}, but embeddings are dimension {dimension}. Please delete the index and try again.")
             logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' exists with matching dimension {existing_dimension}.")
         except Exception as e:
              logger.exception(f"Error describing Pinecone index {PINECONE_INDEX_NAME}: {e}")
@@ -168,60 +214,180 @@ def build_and_upsert_pinecone_feedback(docs):
     else:
         # Create index if it doesn't exist
         try:
-            logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist. Creating with dimension {expected_dimension}.")
+            logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist. Creating with dimension {dimension}.")
             pc.create_index(
                 name=PINECONE_INDEX_NAME,
-                dimension=expected_dimension,
+                dimension=dimension,
                 metric="cosine", # Assuming cosine similarity
                 spec=ServerlessSpec(
                     cloud=PINECONE_CLOUD,
                     region=PINECONE_REGION
                 )
             )
-            logger.info(f"Created new Pinecone index: {PINECONE_INDEX_NAME} with dimension {expected_dimension}.")
+            logger.info(f"Created new Pinecone index: {PINECONE_INDEX_NAME} with dimension {dimension}.")
         except Exception as e:
              logger.exception(f"Error creating Pinecone index {PINECONE_INDEX_NAME}: {e}")
              raise
 
-    # 3. Get index object
     try:
         index = pc.Index(PINECONE_INDEX_NAME)
         logger.info(f"Connected to Pinecone index: {PINECONE_INDEX_NAME}")
+        return index
     except Exception as e:
          logger.exception(f"Error connecting to Pinecone index {PINECONE_INDEX_NAME}: {e}")
          raise e
 
-    # 4. Prepare upsert data
-    upsert_data = [
-        {"id": id_, "values": vector, "metadata": metadata}
-        for id_, vector, metadata in zip(ids, vectors, metadatas)
+def build_and_upsert_pinecone_feedback(docs, checkpoint_path=CHECKPOINT_PATH):
+    """
+    Generates embeddings using Cohere and upserts documents to a Pinecone index.
+    Embedding and upsert batches run concurrently under rate limits; failed batches are
+    retried with backoff and, if they still fail, the run raises and can be resumed
+    from the checkpoint.
+    """
+    if not COHERE_API_KEY:
+        logger.error("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
+        raise ValueError("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
+    embeddings_model = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model=EMBEDDING_MODEL)
+    texts = [doc.page_content for doc in docs]
+    metadatas = [doc.metadata for doc in docs]
+    ids = [feedback_vector_id(meta) for meta in metadatas]
+
+    logger.info(f"Starting embedding and upsert of {len(ids)} vectors to Pinecone index: {PINECONE_INDEX_NAME}")
+    pipeline = EmbedUpsertPipeline(
+        embeddings_model,
+        index_factory=get_pinecone_index,
+        checkpoint_path=checkpoint_path,
+        embedding_store=EmbeddingStore(EMBEDDING_STORE_PATH, model=EMBEDDING_MODEL),
+        name="feedback",
+    )
+    stats = pipeline.run(zip(ids, texts, metadatas))
+    logger.info(f"Upsert complete. {stats['docs_upserted']} vectors at {stats['docs_per_second']:.1f} docs/s.")
+    return stats
+
+# --- Step 5: Streaming, Bounded-Memory Ingestion for Large Exports ---
+def iter_excel_chunks(path, sheet_name, chunk_size=FEEDBACK_CHUNK_SIZE):
+    """
+    Streams an Excel sheet in DataFrame chunks using openpyxl's read-only mode,
+    so the whole workbook is never materialized in memory.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+        offset = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header, index=range(offset, offset + len(chunk)))
+                offset += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, index=range(offset, offset + len(chunk)))
+    finally:
+        workbook.close()
+
+def iter_feedback_chunks(path, sheet_name=None, chunk_size=FEEDBACK_CHUNK_SIZE):
+    """
+    Yields DataFrame chunks from an Excel sheet, CSV or JSONL export.
+    Rows with missing values are dropped, as in the batch mode.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        chunks = iter_excel_chunks(path, sheet_name, chunk_size)
+    elif extension == ".csv":
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+    elif extension in (".jsonl", ".ndjson"):
+        chunks = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        raise ValueError(f"Unsupported feedback export format: {path}")
+    for chunk in chunks:
+        yield chunk.dropna()
+
+def iter_feedback_records(reviews_path, tickets_path, catalog_products, chunk_size=FEEDBACK_CHUNK_SIZE, stats=None, collapser=None):
+    """
+    Generator pipeline: read chunk -> build and link documents -> yield (id, text, metadata) records.
+    Reading runs ahead on a background thread through a bounded queue, so at most a few
+    chunks are held in memory regardless of the export size.
+    """
+    sources = [
+        (reviews_path, REVIEWS_SHEET, preprocess_reviews),
+        (tickets_path, TICKETS_SHEET, preprocess_support_tickets),
     ]
+    for path, sheet_name, preprocess in sources:
+        if not path:
+            continue
+        logger.info(f"Streaming feedback rows from {path}" + (f" (sheet '{sheet_name}')" if path.endswith(".xlsx") else ""))
+        for chunk in bounded_prefetch(iter_feedback_chunks(path, sheet_name, chunk_size), maxsize=2, name="feedback-reader"):
+            if stats is not None:
+                stats["rows"] += len(chunk)
+            for doc in preprocess(chunk, catalog_products):
+                if collapser is not None and collapser.offer(doc) is None:
+                    continue
+                # A snapshot: the upsert workers serialize it while later rows are still being read
+                yield feedback_vector_id(doc.metadata), doc.page_content, dict(doc.metadata)
 
-    # 5. Upsert to Pinecone with batching
-    logger.info(f"Starting upsert of {len(upsert_data)} vectors to Pinecone index: {PINECONE_INDEX_NAME}")
-    batch_size = 100
-    for i in range(0, len(upsert_data), batch_size):
-        batch = upsert_data[i:i + batch_size]
-        try:
-            index.upsert(vectors=batch)
-            logger.info(f"Upserted batch {i // batch_size + 1} of {len(upsert_data) // batch_size + 1} to {PINECONE_INDEX_NAME}")
-        except Exception as e:
-             logger.error(f"Error upserting batch {i // batch_size + 1} to {PINECONE_INDEX_NAME}: {e}")
-             # Depending on requirements, you might want to raise the exception
-             # or log and continue. Here, we log and continue to process other batches.
-             pass
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
 
-    logger.info("Upsert complete.")
+def stream_feedback_to_pinecone(reviews_path, tickets_path, chunk_size=FEEDBACK_CHUNK_SIZE, checkpoint_path=CHECKPOINT_PATH):
+    """
+    Streams feedback exports through linking, embedding and upsert. Rows are held a few chunks
+    at a time; the near-duplicate collapser grows with the unique documents seen, up to
+    DEDUP_MAX_TRACKED_DOCS (services/dedup.py), so memory is bounded but not constant.
+    Reports rows/s and peak RSS when finished.
+    """
+    if not COHERE_API_KEY:
+        logger.error("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
+        raise ValueError("COHERE_API_KEY must be set in environment variables to use Cohere embeddings.")
+    embeddings_model = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model=EMBEDDING_MODEL)
+    catalog_products = load_catalog_product_id_name()
+    stats = {"rows": 0}
+    started = time.perf_counter()
+    pipeline = EmbedUpsertPipeline(
+        embeddings_model,
+        index_factory=get_pinecone_index,
+        checkpoint_path=checkpoint_path,
+        embedding_store=EmbeddingStore(EMBEDDING_STORE_PATH, model=EMBEDDING_MODEL),
+        name="feedback-stream",
+    )
+    collapser = make_feedback_collapser()
+    pipeline_stats = pipeline.run(iter_feedback_records(reviews_path, tickets_path, catalog_products, chunk_size, stats, collapser))
+    if pipeline.index is not None:
+        update_duplicate_counts(pipeline.index, collapser)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Streamed {stats['rows']} rows ({pipeline_stats['docs_upserted']} vectors) in {elapsed:.1f}s: "
+        f"{stats['rows'] / elapsed if elapsed else 0:.1f} rows/s, peak RSS {peak_rss_mb():.1f} MB."
+    )
+    return {**pipeline_stats, "rows": stats["rows"], "rows_per_second": stats["rows"] / elapsed if elapsed else 0.0, "peak_rss_mb": peak_rss_mb()}
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed customer feedback and upsert it into Pinecone.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file used to resume an interrupted run.")
+    parser.add_argument("--reset-checkpoint", action="store_true", help="Ignore and delete any existing checkpoint.")
+    parser.add_argument("--stream", action="store_true", help="Stream rows in chunks with bounded memory (for large exports).")
+    parser.add_argument("--reviews", default=FEEDBACK_PATH, help="Reviews export (.xlsx sheet 'Reviews', .csv or .jsonl). Streaming mode only.")
+    parser.add_argument("--tickets", default=FEEDBACK_PATH, help="Support tickets export (.xlsx sheet 'Customer Support Tickets', .csv or .jsonl). Streaming mode only.")
+    parser.add_argument("--chunk-size", type=int, default=FEEDBACK_CHUNK_SIZE, help="Rows read per chunk in streaming mode.")
+    args = parser.parse_args()
+    if args.reset_checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
     try:
         logger.info("Starting customer feedback preprocessing for RAG.")
-        catalog_products = load_catalog_product_id_name()
-        xls = pd.ExcelFile(FEEDBACK_PATH)
-        df_reviews = pd.read_excel(xls, sheet_name="Reviews").dropna()
-        df_tickets = pd.read_excel(xls, sheet_name="Customer Support Tickets").dropna()
-        docs = preprocess_reviews(df_reviews, catalog_products) + preprocess_support_tickets(df_tickets, catalog_products)
-        build_and_upsert_pinecone_feedback(docs)
+        if args.stream:
+            stream_feedback_to_pinecone(args.reviews, args.tickets, args.chunk_size, args.checkpoint)
+        else:
+            catalog_products = load_catalog_product_id_name()
+            xls = pd.ExcelFile(FEEDBACK_PATH)
+            df_reviews = pd.read_excel(xls, sheet_name=REVIEWS_SHEET).dropna()
+            df_tickets = pd.read_excel(xls, sheet_name=TICKETS_SHEET).dropna()
+            docs = preprocess_reviews(df_reviews, catalog_products) + preprocess_support_tickets(df_tickets, catalog_products)
+            docs = make_feedback_collapser().collapse(docs)
+            build_and_upsert_pinecone_feedback(docs, checkpoint_path=args.checkpoint)
         logger.info("Customer feedback preprocessing for RAG complete.")
     except FileNotFoundError as e:
         logger.error(f"Required input file not found: {e}")
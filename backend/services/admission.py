@@ -0,0 +1,271 @@
+"""
+admission.py
+Admission control and per-upstream concurrency limits with load shedding.
+
+Each upstream (llm, embeddings, vector_store, stt, tts) has its own concurrency limit and a
+bounded wait queue. Waiting is capped by the request's deadline (REQUEST_TIMEOUT_SECONDS), and a
+full queue rejects immediately instead of piling up retries against a rate-limited provider.
+/api/chat also has an entry gate (MAX_INFLIGHT_REQUESTS) that answers 429 when saturated.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .tracing import counter, gauge, histogram
+from .upstream import UpstreamCall, LLM_INVOKE, LLM_STREAM, EMBED_QUERY, EMBED_DOCUMENTS, INDEX_QUERY
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "30"))
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", "64"))
+
+# upstream -> (max concurrent calls, max queued calls); override with <UPSTREAM>_MAX_CONCURRENCY / <UPSTREAM>_MAX_QUEUE
+DEFAULT_LIMITS = {
+    "llm": (16, 64),
+    "embeddings": (16, 64),
+    "vector_store": (32, 128),
+    "stt": (8, 32),
+    "tts": (8, 32),
+}
+UPSTREAM_BY_KIND = {
+    LLM_INVOKE: "llm",
+    LLM_STREAM: "llm",
+    EMBED_QUERY: "embeddings",
+    EMBED_DOCUMENTS: "embeddings",
+    INDEX_QUERY: "vector_store",
+}
+
+QUEUE_DEPTH = gauge("everglow_upstream_queue_depth", "Calls waiting for an upstream concurrency slot.", ("upstream",))
+IN_FLIGHT = gauge("everglow_upstream_in_flight", "Calls currently running against an upstream.", ("upstream",))
+QUEUE_WAIT = histogram("everglow_upstream_queue_wait_seconds", "Time spent waiting for an upstream concurrency slot.", ("upstream",),
+                       buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+REJECTIONS = counter("everglow_upstream_rejections_total", "Calls shed by admission control.", ("upstream", "reason"))
+INFLIGHT_REQUESTS = gauge("everglow_inflight_requests", "Requests admitted through the entry gate.", ("endpoint",))
+
+
+class Overloaded(Exception):
+    """A call or request was shed. `status` is the HTTP status to answer with (429 or 503)."""
+    def __init__(self, upstream: str, reason: str, retry_after: int, status: int = 503):
+        super().__init__(f"{upstream} overloaded ({reason}); retry after {retry_after}s")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status = status
+
+
+class RequestTicket:
+    """Per-request admission state; shared (not copied) with worker threads via the context."""
+    def __init__(self, timeout: float):
+        self.deadline = time.monotonic() + timeout
+        self.rejected: Optional[Overloaded] = None
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+_ticket: contextvars.ContextVar[Optional[RequestTicket]] = contextvars.ContextVar("admission_ticket", default=None)
+_spare_capacity_only: contextvars.ContextVar[bool] = contextvars.ContextVar("spare_capacity_only", default=False)
+
+
+@contextmanager
+def spare_capacity_only() -> Iterator[None]:
+    """Calls made inside never queue: they run only if a slot is free right now (used for hedges)."""
+    token = _spare_capacity_only.set(True)
+    try:
+        yield
+    finally:
+        _spare_capacity_only.reset(token)
+
+
+def start_deadline(timeout: Optional[float] = None) -> RequestTicket:
+    """Binds a deadline to the current request; upstream queue waits never outlive it."""
+    ticket = RequestTicket(REQUEST_TIMEOUT_SECONDS if timeout is None else timeout)
+    _ticket.set(ticket)
+    return ticket
+
+
+def current_ticket() -> Optional[RequestTicket]:
+    return _ticket.get()
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None outside a request."""
+    ticket = _ticket.get()
+    return None if ticket is None else ticket.remaining()
+
+
+class _LimiterStats:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_time = 1.0  # EWMA of call duration in seconds, for Retry-After estimates
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.waiting + 1) * self.service_time / self.max_concurrency))
+
+    def _reject(self, reason: str) -> Overloaded:
+        REJECTIONS.inc(upstream=self.name, reason=reason)
+        error = Overloaded(self.name, reason, self.retry_after())
+        ticket = _ticket.get()
+        if ticket is not None and ticket.rejected is None:
+            ticket.rejected = error
+        logger.warning(f"Admission: shed {self.name} call ({reason}); {self.in_flight} in flight, {self.waiting} queued.")
+        return error
+
+    def _started(self, waited: float) -> None:
+        self.in_flight += 1
+        QUEUE_WAIT.observe(waited, upstream=self.name)
+        IN_FLIGHT.set(self.in_flight, upstream=self.name)
+        QUEUE_DEPTH.set(self.waiting, upstream=self.name)
+
+    def _finished(self, duration: float) -> None:
+        self.in_flight -= 1
+        self.service_time = 0.9 * self.service_time + 0.1 * duration
+        IN_FLIGHT.set(self.in_flight, upstream=self.name)
+
+
+class UpstreamLimiter(_LimiterStats):
+    """Concurrency limit + bounded queue for blocking calls made from worker threads."""
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        super().__init__(name, max_concurrency, max_queue)
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        start = time.monotonic()
+        ticket = _ticket.get()
+        with self._cond:
+            if self.in_flight >= self.max_concurrency and _spare_capacity_only.get():
+                # Optional work (a hedge) is dropped without marking the request as shed
+                REJECTIONS.inc(upstream=self.name, reason="no_spare_capacity")
+                raise Overloaded(self.name, "no spare capacity", self.retry_after())
+            if self.in_flight >= self.max_concurrency:
+                if self.waiting >= self.max_queue:
+                    raise self._reject("queue_full")
+                self.waiting += 1
+                QUEUE_DEPTH.set(self.waiting, upstream=self.name)
+                try:
+                    while self.in_flight >= self.max_concurrency:
+                        timeout = None if ticket is None else ticket.remaining()
+                        if timeout is not None and timeout <= 0:
+                            raise self._reject("deadline")
+                        self._cond.wait(timeout)
+                finally:
+                    self.waiting -= 1
+            self._started(time.monotonic() - start)
+
+    def release(self, duration: float) -> None:
+        with self._cond:
+            self._finished(duration)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+
+class AsyncUpstreamLimiter(_LimiterStats):
+    """The same limit + queue for coroutines (STT/TTS run on the event loop)."""
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        super().__init__(name, max_concurrency, max_queue)
+        self._cond: Optional[asyncio.Condition] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        start = time.monotonic()
+        ticket = _ticket.get()
+        async with self._cond:
+            if self.in_flight >= self.max_concurrency:
+                if self.waiting >= self.max_queue:
+                    raise self._reject("queue_full")
+                self.waiting += 1
+                QUEUE_DEPTH.set(self.waiting, upstream=self.name)
+                try:
+                    while self.in_flight >= self.max_concurrency:
+                        timeout = None if ticket is None else ticket.remaining()
+                        if timeout is not None and timeout <= 0:
+                            raise self._reject("deadline")
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), timeout)
+                        except asyncio.TimeoutError:
+                            pass
+                finally:
+                    self.waiting -= 1
+            self._started(time.monotonic() - start)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._finished(time.monotonic() - started)
+                self._cond.notify()
+
+
+def _limits(name: str):
+    default_concurrency, default_queue = DEFAULT_LIMITS[name]
+    prefix = name.upper()
+    return (int(os.getenv(f"{prefix}_MAX_CONCURRENCY", default_concurrency)),
+            int(os.getenv(f"{prefix}_MAX_QUEUE", default_queue)))
+
+
+_limiters: Dict[str, Any] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str):
+    """Singleton limiter per upstream; STT and TTS get the asyncio flavour."""
+    with _limiters_lock:
+        if name not in _limiters:
+            limiter_cls = AsyncUpstreamLimiter if name in ("stt", "tts") else UpstreamLimiter
+            _limiters[name] = limiter_cls(name, *_limits(name))
+            logger.info(f"Admission: {name} limited to {_limiters[name].max_concurrency} concurrent calls, {_limiters[name].max_queue} queued.")
+        return _limiters[name]
+
+
+def admission_interceptor(call: UpstreamCall, proceed: Callable[[], Any]) -> Any:
+    """Upstream interceptor: runs each LLM/embedding/vector call inside its upstream's limiter."""
+    upstream = UPSTREAM_BY_KIND.get(call.kind)
+    if upstream is None:
+        return proceed()
+    with get_limiter(upstream).slot():
+        return proceed()
+
+
+class RequestGate:
+    """Entry gate: at most `limit` requests of an endpoint in flight; the rest are refused with 429."""
+    def __init__(self, endpoint: str, limit: int):
+        self.endpoint = endpoint
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self) -> Iterator[RequestTicket]:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                REJECTIONS.inc(upstream=self.endpoint, reason="gate_full")
+                raise Overloaded(self.endpoint, "too many requests in flight", get_limiter("llm").retry_after(), status=429)
+            self.in_flight += 1
+            INFLIGHT_REQUESTS.set(self.in_flight, endpoint=self.endpoint)
+        try:
+            yield start_deadline()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                INFLIGHT_REQUESTS.set(self.in_flight, endpoint=self.endpoint)
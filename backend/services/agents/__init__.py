@@ -2,10 +2,12 @@ from .conversational_search import conversational_search_agent
 from .recommendation import recommendation_agent
 from .reviews import reviews_explanation_agent
 from .brand import brand_answer_agent
+from .similar import similar_products_agent
 
 __all__ = [
     'conversational_search_agent',
     'recommendation_agent', 
     'reviews_explanation_agent',
-    'brand_answer_agent'
+    'brand_answer_agent',
+    'similar_products_agent'
 ]
\ No newline at end of file
@@ -1,9 +1,20 @@
 import logging
 from ..state import AgentState
-from ..prompts import brand_llm
+from ..tenants import current_tenant, get_tenant_prompts
+from ..tracing import span
+from ..token_budget import PromptBudget, record_completion
+from ..hedging import invoke_with_deadline, record_fallback, DeadlineExceeded
 
 logger = logging.getLogger(__name__)
 
+# Served when the brand LLM misses its deadline
+BRAND_FALLBACK_ANSWER = (
+    "EverGlow Labs builds every product on three pillars: plant-powered, clinically proven formulas "
+    "(100% vegan and cruelty-free); radical transparency, with full-dose hero ingredient percentages "
+    "and a carbon-neutral supply chain; and barrier-first, planet-first care. "
+    "Ask me again in a moment for more detail on any of these."
+)
+
 def brand_answer_agent(state: AgentState, user_input: str) -> (str, AgentState):
     """
     Uses agent-specific LLM to answer brand-related questions.
@@ -11,8 +22,24 @@ def brand_answer_agent(state: AgentState, user_input: str) -> (str, AgentState):
     """
     logger.info("Brand Answer Agent: Started.")
     try:
-        response = brand_llm.invoke({"input": user_input})
+        budget = PromptBudget("brand")
+        prompts = get_tenant_prompts()
+        budget.add("system_prompt", prompts["brand_system_prompt"])
+        user_input_fitted = budget.fit_text("input", user_input)
+        budget.record()
+        with span("brand_llm"):
+            response = invoke_with_deadline("brand", prompts["brand"], {"input": user_input_fitted})
+        record_completion("brand", response)
         logger.info("Brand Answer Agent: Generated brand answer.")
+    except DeadlineExceeded as e:
+        logger.warning(f"Brand Answer Agent: {e}. Returning the fallback answer.")
+        record_fallback("brand", "deadline")
+        state.active_agent = "brand_answer"
+        tenant = current_tenant()
+        if not tenant.is_default:
+            # The canned answer describes EverGlow; other brands get a retry hint instead
+            return {"response": f"Sorry, I can't answer questions about {tenant.config.name} right now. Please ask again in a moment."}, state
+        return {"response": BRAND_FALLBACK_ANSWER}, state
     except Exception as e:
         logger.exception(f"Error generating brand answer: {e}")
         error_msg = "Sorry, I can't answer brand questions right now due to an internal issue."
@@ -2,8 +2,14 @@ import copy
 import json
 import logging
 from ..state import AgentState
-from ..prompts import conversational_search_llm
-from ..data_utils import AVAILABLE_CATEGORIES
+from ..prompts import CONVERSATIONAL_SEARCH_HUMAN_PROMPT_TEMPLATE
+from ..data_utils import get_available_vocabularies
+from ..tenants import get_tenant_prompts
+from ..tracing import span, agent_span
+from ..token_budget import PromptBudget, record_completion
+from ..memory import memory_context
+from ..hedging import invoke_with_deadline, record_fallback, DeadlineExceeded
+from ..json_stream import parse_json_object
 from .recommendation import recommendation_agent
 
 logger = logging.getLogger(__name__)
@@ -17,11 +23,24 @@ def conversational_search_agent(state: AgentState, user_input: str) -> (dict, Ag
     logger.info("Conversational Search Agent: Started.")
     entities = copy.deepcopy(state.entities) # Initialize entities at the start
 
-    # Format chat history and current entities for the prompt
-    formatted_history = "\n".join([f"User: {turn[0]}\nAgent: {turn[1]}" for turn in state.history])
+    # Format chat history and current entities for the prompt; history gets what is left of the token budget
     current_entities_json = json.dumps(state.entities if isinstance(state.entities, dict) else state.entities.to_dict())
-    logger.info(f"Conversational Search Agent: Formatted history: {formatted_history}")
-    logger.info(f"Conversational Search Agent: Current entities JSON: {current_entities_json}")
+    budget = PromptBudget("conversational_search")
+    # NER prompt over the current tenant's vocabularies
+    prompts = get_tenant_prompts()
+    budget.add("system_prompt", prompts["conversational_search_system_prompt"])
+    budget.add("template", CONVERSATIONAL_SEARCH_HUMAN_PROMPT_TEMPLATE)
+    budget.add("input", user_input)
+    budget.add("entities", current_entities_json)
+    summary, window = memory_context(state)
+    summary = budget.fit_text("summary", summary) if summary else ""
+    format_turn = lambda turn: f"User: {turn[0]}\nAgent: {turn[1]}"
+    formatted_history = "\n".join(format_turn(turn) for turn in budget.fit_history("history", window, format_turn))
+    if summary:
+        formatted_history = f"Summary of earlier conversation: {summary}\n{formatted_history}"
+    budget.record()
+    logger.debug("Conversational Search Agent: Formatted history: %s", formatted_history)
+    logger.info("Conversational Search Agent: Current entities JSON: %s", current_entities_json)
     # 1. Use agent-specific LLM to extract entities (NER) and match category with confidence
     try:
         ner_input_payload = {
@@ -29,23 +48,18 @@ def conversational_search_agent(state: AgentState, user_input: str) -> (dict, Ag
             "current_entities_json": current_entities_json,
             "chat_history_formatted": formatted_history
         }
-        logger.debug(f"Conversational Search Agent: NER input payload: {ner_input_payload}")
-        ner_output = conversational_search_llm.invoke(ner_input_payload)
+        logger.debug("Conversational Search Agent: NER input payload: %s", ner_input_payload)
+        with span("ner_llm"):
+            ner_output = invoke_with_deadline("conversational_search", prompts["conversational_search"], ner_input_payload)
+        record_completion("conversational_search", ner_output)
         ner_output_content = ner_output.content.strip()
         # Attempt to parse the JSON output from the LLM
         try:
-            # Handle cases where the LLM might output more than just JSON, e.g., in markdown code blocks
-            cleaned_output = ner_output_content
-            if "```json" in cleaned_output:
-                cleaned_output = cleaned_output.split("```json")[1].split("```" )[0].strip()
-            elif "```" in cleaned_output:  # A more general attempt to extract from a code block
-                cleaned_output = cleaned_output.split("```" )[1].strip()
+            # The incremental JSON parser skips markdown code fences and any prose around the object
+            updated_entities = parse_json_object(ner_output_content)
+            entities.update(updated_entities)  # LLM provides the full new entity state
 
-            logger.debug(f"Conversational Search Agent: NER cleaned output: {cleaned_output}")
-            updated_entities = json.loads(cleaned_output)
-            entities.update(updated_entities)  # Use cleaned_output, LLM provides the full new entity state
-
-            logger.info(f"Conversational Search Agent: NER processed entities: {cleaned_output}")
+            logger.info(f"Conversational Search Agent: NER processed entities: {updated_entities}")
         except Exception as e:
             logger.error(f"An unexpected error occurred during LLM NER output parsing. Error: {e}. Output was: {ner_output_content}", exc_info=True) # Log ner_output_content
             # Return error immediately on other parsing failures
@@ -53,9 +67,13 @@ def conversational_search_agent(state: AgentState, user_input: str) -> (dict, Ag
             # Return error immediately on other parsing failures
             error_msg = "Sorry, an unexpected error occurred while processing the product category."
             state.history.append(("agent", error_msg))
-            logger.error(f"Conversational Search Agent: Unexpected error during NER parsing. Returning error. cleaned_output={cleaned_output if 'cleaned_output' in locals() else 'undefined'}")
+            logger.error("Conversational Search Agent: Unexpected error during NER parsing. Returning error.")
             return {"error": error_msg}, state # Return error structure
 
+    except DeadlineExceeded as e:
+        # Carry on with the entities gathered so far rather than failing the turn
+        logger.warning(f"Conversational Search Agent: {e}. Continuing with the current entities: {state.entities}")
+        record_fallback("conversational_search", "deadline")
     except Exception as e:
         logger.exception(f"Error running conversational search LLM for NER: {e}")
         # Return error immediately on LLM invocation failure
@@ -73,7 +91,7 @@ def conversational_search_agent(state: AgentState, user_input: str) -> (dict, Ag
     if not entities.get("categories", []):
         # Vague query, ask clarifying question with up-to-date categories
         followup_questions.append(
-            f"What products are you looking for? Choose from: {', '.join(AVAILABLE_CATEGORIES)}."
+            f"What products are you looking for? Choose from: {', '.join(get_available_vocabularies()[0])}."
         )
         logger.info("Conversational Search Agent: Asking for product category.")
 
@@ -84,7 +102,8 @@ def conversational_search_agent(state: AgentState, user_input: str) -> (dict, Ag
 
     if ready_for_recommendation:
         logger.info("Conversational Search Agent: Ready for recommendation. Calling recommendation_agent.")
-        rec_result, new_state = recommendation_agent(state, user_input, entities)
+        with agent_span("recommendation"):
+            rec_result, new_state = recommendation_agent(state, user_input, entities)
         # History updated within recommendation_agent
         new_state.active_agent = "recommendation"
         return rec_result, new_state
@@ -3,32 +3,39 @@ from typing import Dict, Any
 from langchain.prompts import PromptTemplate
 from ..state import AgentState
 from ..config import get_cohere_embeddings, get_catalog_index
-from ..prompts import recommendation_llm
+from ..prompts import recommendation_llm, RECOMMENDATION_SYSTEM_PROMPT
+from ..tracing import span
+from ..token_budget import PromptBudget, record_completion
+from ..hedging import invoke_with_deadline, record_fallback, DeadlineExceeded
+from ..graph import Graph, NodeFailed, speculative_result
+from ..logging_setup import lazy
 
 logger = logging.getLogger(__name__)
 
-def recommendation_agent(state: AgentState, user_input: str, entities: Dict[str, Any]) -> (Dict[str, Any], AgentState):
-    """
-    Generates embeddings for the user query, filters the Pinecone catalog index using entities, performs semantic search, and returns top recommendations with justification.
-    Returns a dict with 'products' (list of product dicts) and 'justification' (string for chat/TTS).
+justification_prompt = PromptTemplate(
+    input_variables=["query", "products"],
+    template="""
+    You are a helpful skincare shopping assistant. Given the user's query and the recommended products, write a friendly, concise of upto 10 words justification for why these products are a good fit. Mention the category, tags, or ingredients if relevant. This justification will act like a search result title.
+    User query: {query}
+    Products: {products}
+    Justification:
     """
-    logger.info(f"Recommendation Agent: Started with entities: {entities}")
-
-    embeddings_model = get_cohere_embeddings()
-    catalog_index = get_catalog_index()
+)
 
-    # 1. Generate embedding for the user query
-    try:
-        query_vector = embeddings_model.embed_query(user_input)
-    except Exception as e:
-        logger.exception(f"Error generating embedding for query: {e}")
-        # Fallback or error response
-        error_msg = "Sorry, I had trouble processing your request to find recommendations."
-        state.history.append(("agent", error_msg))
-        logger.error("Recommendation Agent: Failed to generate embedding. Returning error.")
-        return {"error": error_msg}, state # Return error structure
+def templated_justification(entities: Dict[str, Any], products: list) -> str:
+    """A short search-result title built from the entities, used when the justification LLM is too slow."""
+    categories = entities.get("categories") or sorted({p["category"] for p in products if p.get("category")})[:1]
+    what = " & ".join(str(c).lower() for c in categories[:2]) or "products"
+    concerns = entities.get("skin_concerns") or []
+    if concerns:
+        return f"Top {what} picks for {' & '.join(str(c).lower() for c in concerns[:2])}"
+    ingredients = entities.get("ingredients") or []
+    if ingredients:
+        return f"Top {what} picks with {' & '.join(str(i).lower() for i in ingredients[:2])}"
+    return f"Top {what} picks for you"
 
-    # 2. Build metadata filter based on extracted entities
+def build_metadata_filter(entities: Dict[str, Any]) -> Dict[str, Any]:
+    """Pinecone metadata filter for the extracted entities (category, skin concerns as tags, ingredients)."""
     metadata_filter = {}
     # Filter by category (case-insensitive match requires $eq or transforming all metadata to lower)
     # Pinecone filter values are case-sensitive. We can either lowercase all category metadata during preprocessing
@@ -45,26 +52,49 @@ def recommendation_agent(state: AgentState, user_input: str, entities: Dict[str,
 
     if entities.get('ingredients'):
         metadata_filter["top_ingredients"] = {"$in": list(map(str.lower, entities["ingredients"]))}
-        logger.debug(f"Recommendation Agent: Adding ingredients filter: {metadata_filter['ingredients']}")
+        logger.debug(f"Recommendation Agent: Adding ingredients filter: {metadata_filter['top_ingredients']}")
 
     logger.info(f"Recommendation Agent: Performing Pinecone similarity search with filter: {metadata_filter}")
+    return metadata_filter
 
+def recommendation_agent(state: AgentState, user_input: str, entities: Dict[str, Any]) -> (Dict[str, Any], AgentState):
+    """
+    Generates embeddings for the user query, filters the Pinecone catalog index using entities, performs semantic search, and returns top recommendations with justification.
+    Returns a dict with 'products' (list of product dicts) and 'justification' (string for chat/TTS).
+    """
+    logger.info(f"Recommendation Agent: Started with entities: {entities}")
+
+    embeddings_model = get_cohere_embeddings()
+
+    # Embedding, filter and index handle are independent; the embedding is usually already
+    # prefetched (english_agent starts it while the router classifies)
+    graph = Graph("recommendation")
+    # 1. Generate embedding for the user query
+    graph.add("embedding", lambda r: speculative_result("embed_query", embeddings_model.embed_query, user_input))
+    # 2. Build metadata filter based on extracted entities
+    graph.add("metadata_filter", lambda r: build_metadata_filter(entities))
+    graph.add("catalog_index", lambda r: get_catalog_index())
     # 3. Perform Pinecone similarity search
+    graph.add("vector_query", lambda r: r["catalog_index"].query(
+        vector=r["embedding"],
+        top_k=10,  # Get top 5 results
+        include_metadata=True,  # Include metadata to get product details
+        filter=r["metadata_filter"] if r["metadata_filter"] else {}  # Apply filter if exists
+    ), deps=("embedding", "metadata_filter", "catalog_index"))
     try:
-        query_response = catalog_index.query(
-            vector=query_vector,
-            top_k=10,  # Get top 5 results
-            include_metadata=True,  # Include metadata to get product details
-            filter=metadata_filter if metadata_filter else {}  # Apply filter if exists
-        )
-        results = query_response.matches
+        results = graph.run()["vector_query"].matches
         logger.info(f"Recommendation Agent: Pinecone query returned {len(results)} matches.")
-
-    except Exception as e:
-        logger.exception(f"Error during Pinecone similarity search: {e}")
-        error_msg = "Sorry, I encountered an error while searching for products based on your criteria."
+    except NodeFailed as e:
+        if e.node == "embedding":
+            logger.exception(f"Error generating embedding for query: {e.error}")
+            # Fallback or error response
+            error_msg = "Sorry, I had trouble processing your request to find recommendations."
+            logger.error("Recommendation Agent: Failed to generate embedding. Returning error.")
+        else:
+            logger.exception(f"Error during Pinecone similarity search: {e.error}")
+            error_msg = "Sorry, I encountered an error while searching for products based on your criteria."
+            logger.error("Recommendation Agent: Pinecone search failed. Returning error.")
         state.history.append(("agent", error_msg))
-        logger.error("Recommendation Agent: Pinecone search failed. Returning error.")
         return {"error": error_msg}, state # Return error structure
 
     # 4. Format product results from Pinecone response
@@ -91,24 +121,27 @@ def recommendation_agent(state: AgentState, user_input: str, entities: Dict[str,
         logger.debug(f"Recommendation Agent: Formatted product: {meta.get('name')}")
 
     # 5. Generate contextual justification using agent-specific LLM
-    justification_prompt = PromptTemplate(
-        input_variables=["query", "products"],
-        template="""
-        You are a helpful skincare shopping assistant. Given the user's query and the recommended products, write a friendly, concise of upto 10 words justification for why these products are a good fit. Mention the category, tags, or ingredients if relevant. This justification will act like a search result title.
-        User query: {query}
-        Products: {products}
-        Justification:
-        """
-    )
     try:
         # Pass product names or a summary to the LLM for justification
-        products_text = "---\n".join([f"{i+1}. Name: {p['name']}\nTop Ingredients: {p['top_ingredients']}\nTags: {p['tags']}" for i, p in enumerate(products)])
-        logger.debug(f"Recommendation Agent: Justification prompt input: {justification_prompt.format(query=user_input, products=products_text)}")
-        justification_response = recommendation_llm.invoke({
-            "input": justification_prompt.format(query=user_input, products=products_text)
-        })
+        budget = PromptBudget("recommendation")
+        budget.add("system_prompt", RECOMMENDATION_SYSTEM_PROMPT)
+        budget.add("template", justification_prompt.template)
+        budget.add("input", user_input)
+        product_texts = [f"{i+1}. Name: {p['name']}\nTop Ingredients: {p['top_ingredients']}\nTags: {p['tags']}" for i, p in enumerate(products)]
+        products_text = "---\n".join(budget.fit_texts("products", product_texts, separator="---\n"))
+        budget.record()
+        logger.debug("Recommendation Agent: Justification prompt input: %s", lazy(justification_prompt.format, query=user_input, products=products_text))
+        with span("justification_llm"):
+            justification_response = invoke_with_deadline("recommendation", recommendation_llm, {
+                "input": justification_prompt.format(query=user_input, products=products_text)
+            })
+        record_completion("recommendation", justification_response)
         justification = justification_response.content
-        logger.debug(f"Recommendation Agent: LLM Response {justification}")
+        logger.debug("Recommendation Agent: LLM Response %s", justification)
+    except DeadlineExceeded as e:
+        logger.warning(f"Recommendation Agent: {e}. Using a templated justification.")
+        justification = templated_justification(entities, products)
+        record_fallback("recommendation", "deadline")
     except Exception as e:
         logger.exception(f"Error generating recommendation justification: {e}")
         # This error is less critical, can fallback to a generic justification
@@ -3,11 +3,111 @@ import logging
 from langchain.prompts import PromptTemplate
 from ..state import AgentState
 from ..config import llm, get_cohere_embeddings, get_feedback_index
-from ..prompts import reviews_llm
+from ..prompts import reviews_llm, REVIEWS_SYSTEM_PROMPT
+from ..tracing import span
+from ..token_budget import PromptBudget, record_completion, truncate_text
+from ..hedging import invoke_with_deadline, record_fallback, DeadlineExceeded
 from ..data_utils import extract_product_from_text, get_product_catalog_data
+from ..graph import Graph, NodeFailed, speculative_result
+from ..logging_setup import lazy
 
 logger = logging.getLogger(__name__)
 
+# Catalog columns worth showing the LLM; the full product row is mostly noise for a review summary
+PRODUCT_CONTEXT_FIELDS = ["name", "brand", "category", "description", "top_ingredients", "tags", "priceusd"]
+PRODUCT_CONTEXT_TOKENS = 300
+# Deadline fallback: quote the top feedback snippets instead of an LLM summary
+REVIEW_SNIPPETS = 3
+REVIEW_SNIPPET_TOKENS = 60
+
+def product_context(product: dict) -> str:
+    """Compact 'field: value' rendering of the relevant catalog fields of a product."""
+    fields = [f for f in PRODUCT_CONTEXT_FIELDS if f in product] or list(product)
+    return "\n".join(f"{field}: {product[field]}" for field in fields)
+
+def extract_review_product_id(user_input: str):
+    """Product ID the user asks about, fuzzy-matched against the catalog names; None when nothing matches."""
+    try:
+        extracted_product_id = extract_product_from_text(user_input)
+        if extracted_product_id:
+            logger.info(f"Reviews Explanation Agent: Extracted product ID from fuzzy matching: {extracted_product_id}")
+            return extracted_product_id
+        # else:
+        #     # Fallback to LLM extraction if fuzzy matching fails
+        #     extraction_prompt_template = """
+        #     Given the user's input, identify the specific product name they are asking about for reviews.
+        #     If a product name is mentioned, extract it. If not, return null.
+
+        #     User input: {user_input}
+
+        #     Respond ONLY with a JSON object like: {{"product_name": <product name or null>}}
+        #     """
+        #     extraction_prompt = PromptTemplate(
+        #         input_variables=["user_input"],
+        #         template=extraction_prompt_template
+        #     )
+        #     extracted_product_name = None
+        #     try:
+        #         logger.debug(f"Reviews Explanation Agent: Product extraction prompt input: {extraction_prompt.format(user_input=user_input)}")
+        #         extraction_output = llm.invoke(extraction_prompt.format(user_input=user_input))
+        #         logger.debug(f"Reviews Explanation Agent: Product extraction raw output: {extraction_output}")
+        #         cleaned_output = extraction_output.content.strip()
+        #         if "```json" in cleaned_output:
+        #              cleaned_output = cleaned_output.split("```json")[1].split("```")[0].strip()
+        #         elif "```" in cleaned_output:
+        #              cleaned_output = cleaned_output.split("```")[1].strip()
+
+        #         logger.debug(f"Reviews Explanation Agent: Product extraction cleaned output: {cleaned_output}")
+        #         extraction_json = json.loads(cleaned_output)
+        #         extracted_product_name = extraction_json.get("product_name")
+        #         logger.info(f"Reviews Explanation Agent: Extracted product name from LLM: {extracted_product_name}")
+
+        #         if extracted_product_name:
+        #              product = extracted_product_name
+        #              state.entities["product_name"] = product # Store in state for future turns
+
+        #     except json.JSONDecodeError as e:
+        #         logger.error(f"Failed to decode JSON from product extraction LLM output. Error: {e}. Output was: {cleaned_output}", exc_info=True)
+        #         # If JSON decode fails, it means the LLM likely gave a conversational response.
+        #         # Use this response as a clarifying question.
+        #         response = cleaned_output
+        #         state.active_agent = "reviews_explanation" # Stay in reviews agent context or clarify
+        #         state.followup_questions = [response] # Use the non-JSON response as a followup
+        #         # Do NOT update product in entities, as extraction failed
+        #         state.history.append(("agent", response))
+        #         logger.warning("Reviews Explanation Agent: LLM returned non-JSON output during product extraction. Using it as a clarifying question.")
+        #         return {"response": response}, state # Return the conversational response
+        #     except Exception as e:
+        #         logger.exception(f"Error during product name extraction: {e}")
+        #         error_msg = "Sorry, an error occurred while trying to identify the product you're asking about for reviews."
+        #         state.history.append(("agent", error_msg))
+        #         logger.error("Reviews Explanation Agent: Unexpected error during product extraction. Returning error.")
+        #         return {"error": error_msg}, state
+    except Exception as e:
+        logger.exception(f"Error during fuzzy product extraction: {e}")
+    return None
+
+def _catalog_context(product_id):
+    """Catalog fields of the product for the prompt; None when no product was identified."""
+    if not product_id:
+        return None
+    df = get_product_catalog_data()
+    return product_context(df.loc[product_id].to_dict())
+
+def _search_feedback(feedback_index, query_vector, product_id) -> list:
+    if not product_id:
+        return []
+    metadata_filter = {"product_id": product_id}
+    logger.debug(f"Reviews Explanation Agent: Adding product_id filter for feedback search: {metadata_filter['product_id']}")
+    logger.info(f"Reviews Explanation Agent: Performing Pinecone feedback search with filter: {metadata_filter}")
+    query_response = feedback_index.query(
+        vector=query_vector,
+        top_k=5,  # Get top 5 relevant feedback entries
+        include_metadata=True,  # Include metadata
+        filter=metadata_filter  # Apply filter
+    )
+    return query_response.matches
+
 def reviews_explanation_agent(state: AgentState, user_input: str) -> (str, AgentState):
     """
     Generates embeddings for the user query/product question, queries the Pinecone feedback index for relevant reviews, and uses agent-specific LLM to answer with review-backed explanations.
@@ -17,69 +117,41 @@ def reviews_explanation_agent(state: AgentState, user_input: str) -> (str, Agent
 
     # --- 1. Extract or confirm Product Name ---
     product_id = state.entities.get("review_product_id") # Check if product ID is already in state
+    embeddings_model = get_cohere_embeddings()
 
-    if not product_id:
-        # If not in state, attempt to extract from user_input using fuzzy matching
-        try:
-            extracted_product_id = extract_product_from_text(user_input)
-            if extracted_product_id:
-                product_id = extracted_product_id
-                state.entities["review_product_id"] = product_id
-                logger.info(f"Reviews Explanation Agent: Extracted product ID from fuzzy matching: {product_id}")
-            # else:
-            #     # Fallback to LLM extraction if fuzzy matching fails
-            #     extraction_prompt_template = """
-            #     Given the user's input, identify the specific product name they are asking about for reviews.
-            #     If a product name is mentioned, extract it. If not, return null.
-
-            #     User input: {user_input}
-
-            #     Respond ONLY with a JSON object like: {{"product_name": <product name or null>}}
-            #     """
-            #     extraction_prompt = PromptTemplate(
-            #         input_variables=["user_input"],
-            #         template=extraction_prompt_template
-            #     )
-            #     extracted_product_name = None
-            #     try:
-            #         logger.debug(f"Reviews Explanation Agent: Product extraction prompt input: {extraction_prompt.format(user_input=user_input)}")
-            #         extraction_output = llm.invoke(extraction_prompt.format(user_input=user_input))
-            #         logger.debug(f"Reviews Explanation Agent: Product extraction raw output: {extraction_output}")
-            #         cleaned_output = extraction_output.content.strip()
-            #         if "```json" in cleaned_output:
-            #              cleaned_output = cleaned_output.split("```json")[1].split("```")[0].strip()
-            #         elif "```" in cleaned_output:
-            #              cleaned_output = cleaned_output.split("```")[1].strip()
-
-            #         logger.debug(f"Reviews Explanation Agent: Product extraction cleaned output: {cleaned_output}")
-            #         extraction_json = json.loads(cleaned_output)
-            #         extracted_product_name = extraction_json.get("product_name")
-            #         logger.info(f"Reviews Explanation Agent: Extracted product name from LLM: {extracted_product_name}")
-
-            #         if extracted_product_name:
-            #              product = extracted_product_name
-            #              state.entities["product_name"] = product # Store in state for future turns
-
-            #     except json.JSONDecodeError as e:
-            #         logger.error(f"Failed to decode JSON from product extraction LLM output. Error: {e}. Output was: {cleaned_output}", exc_info=True)
-            #         # If JSON decode fails, it means the LLM likely gave a conversational response.
-            #         # Use this response as a clarifying question.
-            #         response = cleaned_output
-            #         state.active_agent = "reviews_explanation" # Stay in reviews agent context or clarify
-            #         state.followup_questions = [response] # Use the non-JSON response as a followup
-            #         # Do NOT update product in entities, as extraction failed
-            #         state.history.append(("agent", response))
-            #         logger.warning("Reviews Explanation Agent: LLM returned non-JSON output during product extraction. Using it as a clarifying question.")
-            #         return {"response": response}, state # Return the conversational response
-            #     except Exception as e:
-            #         logger.exception(f"Error during product name extraction: {e}")
-            #         error_msg = "Sorry, an error occurred while trying to identify the product you're asking about for reviews."
-            #         state.history.append(("agent", error_msg))
-            #         logger.error("Reviews Explanation Agent: Unexpected error during product extraction. Returning error.")
-            #         return {"error": error_msg}, state
-        except Exception as e:
-            logger.exception(f"Error during fuzzy product extraction: {e}")
+    # Product extraction, the query embedding (usually prefetched while the router classified)
+    # and the index handle are independent; the feedback search needs all three, and the catalog
+    # row for the prompt only the product
+    graph = Graph("reviews")
+    # If not in state, attempt to extract from user_input using fuzzy matching
+    graph.add("product_extraction", lambda r: product_id or extract_review_product_id(user_input))
+    # 2. Generate embedding for the query; the product is applied as a metadata filter, so the
+    # question alone is embedded (the same vector the other agents use)
+    graph.add("embedding", lambda r: speculative_result("embed_query", embeddings_model.embed_query, user_input))
+    graph.add("feedback_index", lambda r: get_feedback_index())
+    graph.add("product_context", lambda r: _catalog_context(r["product_extraction"]), deps=("product_extraction",))
+    # 3./4. Filter by product ID and perform Pinecone similarity search on feedback index
+    graph.add("vector_query", lambda r: _search_feedback(r["feedback_index"], r["embedding"], r["product_extraction"]),
+              deps=("product_extraction", "embedding", "feedback_index"))
+    try:
+        outputs = graph.run()
+    except NodeFailed as e:
+        if e.node == "embedding":
+            logger.exception(f"Error generating embedding for feedback query: {e.error}")
+            error_msg = "Sorry, I had trouble processing your request to search for reviews."
+            logger.error("Reviews Explanation Agent: Failed to generate feedback embedding. Returning error.")
+        elif e.node == "product_context":
+            logger.exception(f"Error looking up the product for the review explanation: {e.error}")
+            error_msg = "Sorry, I couldn't generate a review explanation for that product at this time."
+            logger.error("Reviews Explanation Agent: Catalog lookup failed. Returning error.")
+        else:
+            logger.exception(f"Error during Pinecone feedback search: {e.error}")
+            error_msg = "Sorry, I encountered an error while searching for reviews for that product."
+            logger.error("Reviews Explanation Agent: Pinecone feedback search failed. Returning error.")
+        state.history.append(("agent", error_msg))
+        return {"error": error_msg}, state
 
+    product_id = outputs["product_extraction"]
     if not product_id:
         # If product still not identified, ask user for clarification
         response = "Which product would you like to know about? Please specify the product name." # Agent response
@@ -90,51 +162,11 @@ def reviews_explanation_agent(state: AgentState, user_input: str) -> (str, Agent
         logger.warning("Reviews Explanation Agent: No product name found. Asking for clarification.")
         # Returning a dictionary like other agents for consistency, even if just a response
         return {"response": response}, state
+    state.entities["review_product_id"] = product_id
 
     # Product name or ID is identified, proceed with review search
-    logger.info(f"Reviews Explanation Agent: Proceeding with reviews search for product: {product_id}")
-
-    embeddings_model = get_cohere_embeddings()
-    feedback_index = get_feedback_index()
-
-    # 2. Generate embedding for the query (user input + product)
-    query_text = f"Reviews and feedback for product: {product_id}. User question: {user_input}" # Use full user_input as context for query
-    try:
-        logger.debug(f"Reviews Explanation Agent: Feedback query text: {query_text}")
-        query_vector = embeddings_model.embed_query(query_text)
-        logger.info("Reviews Explanation Agent: Generated embedding for feedback query.")
-    except Exception as e:
-        logger.exception(f"Error generating embedding for feedback query: {e}")
-        error_msg = "Sorry, I had trouble processing your request to search for reviews."
-        state.history.append(("agent", error_msg))
-        logger.error("Reviews Explanation Agent: Failed to generate feedback embedding. Returning error.")
-        return {"error": error_msg}, state
-
-    # 3. Build metadata filter (filter by product name or ID if available)
-    metadata_filter = {}
-    if product_id:
-        metadata_filter["product_id"] = product_id
-        logger.debug(f"Reviews Explanation Agent: Adding product_id filter for feedback search: {metadata_filter['product_id']}")
-
-    logger.info(f"Reviews Explanation Agent: Performing Pinecone feedback search with filter: {metadata_filter}")
-
-    # 4. Perform Pinecone similarity search on feedback index
-    try:
-        query_response = feedback_index.query(
-            vector=query_vector,
-            top_k=5,  # Get top 5 relevant feedback entries
-            include_metadata=True,  # Include metadata
-            filter=metadata_filter if metadata_filter else {}  # Apply filter
-        )
-        results = query_response.matches
-        logger.info(f"Reviews Explanation Agent: Pinecone feedback query returned {len(results)} matches.")
-
-    except Exception as e:
-        logger.exception(f"Error during Pinecone feedback search: {e}")
-        error_msg = "Sorry, I encountered an error while searching for reviews for that product."
-        state.history.append(("agent", error_msg))
-        logger.error("Reviews Explanation Agent: Pinecone feedback search failed. Returning error.")
-        return {"error": error_msg}, state
+    results = outputs["vector_query"]
+    logger.info(f"Reviews Explanation Agent: Pinecone feedback query returned {len(results)} matches.")
 
     # 5. Format feedback results and provide to LLM
     if not results:
@@ -149,6 +181,10 @@ def reviews_explanation_agent(state: AgentState, user_input: str) -> (str, Agent
         # Get the full text from metadata
         text = match.metadata.get('text')
         if text:
+            # Near-duplicate feedback is collapsed into one vector at indexing time
+            duplicate_count = int(match.metadata.get('duplicate_count', 1) or 1)
+            if duplicate_count > 1:
+                text = f"{text}\n(Similar feedback from {duplicate_count} customers)"
             feedback_texts.append(str(text))
     
     # Handle case where no valid text content is found
@@ -159,7 +195,7 @@ def reviews_explanation_agent(state: AgentState, user_input: str) -> (str, Agent
         return {"response": response}, state
     
     feedback_context = "\n---\n".join(feedback_texts)
-    logger.debug(f"Reviews Explanation Agent: Feedback context for LLM: {feedback_context[:200]}...")
+    logger.debug("Reviews Explanation Agent: Feedback context for LLM: %.200s...", feedback_context)
 
     # 6. Use agent-specific LLM to answer with review-backed explanations
     review_prompt_template = """
@@ -179,17 +215,32 @@ def reviews_explanation_agent(state: AgentState, user_input: str) -> (str, Agent
     )
 
     try:
-        df = get_product_catalog_data()
         user_question = user_input # Use original user input as the question context
-        product = df.loc[product_id].to_dict() # Use product name if available
-        logger.debug(f"Reviews Explanation Agent: Review prompt input: {review_prompt.format(product=product, user_question=user_question, feedback_context=feedback_context[:200] + '...')}")
-        response = reviews_llm.invoke({
-            "input": review_prompt.format(
-                product=product,
-                user_question=user_question,
-                feedback_context=feedback_context
-            )
-        })
+        # Fit product details and feedback into the reviews agent's token budget (most relevant feedback first)
+        budget = PromptBudget("reviews")
+        budget.add("system_prompt", REVIEWS_SYSTEM_PROMPT)
+        budget.add("template", review_prompt_template)
+        budget.add("input", user_question)
+        product = budget.fit_text("product", outputs["product_context"], max_tokens=PRODUCT_CONTEXT_TOKENS)
+        feedback_context = "\n---\n".join(budget.fit_texts("feedback", feedback_texts, separator="\n---\n"))
+        budget.record()
+        logger.debug("Reviews Explanation Agent: Review prompt input: %s", lazy(review_prompt.format, product=product, user_question=user_question, feedback_context=feedback_context[:200] + '...'))
+        with span("reviews_llm"):
+            response = invoke_with_deadline("reviews", reviews_llm, {
+                "input": review_prompt.format(
+                    product=product,
+                    user_question=user_question,
+                    feedback_context=feedback_context
+                )
+            })
+        record_completion("reviews", response)
+    except DeadlineExceeded as e:
+        # Quote the most relevant feedback directly instead of a generated summary
+        logger.warning(f"Reviews Explanation Agent: {e}. Answering with the top feedback snippets.")
+        record_fallback("reviews", "deadline")
+        snippets = "\n".join(f"- \"{truncate_text(text, REVIEW_SNIPPET_TOKENS)}\"" for text in feedback_texts[:REVIEW_SNIPPETS])
+        state.active_agent = "reviews_explanation"
+        return {"response": f"Here is what customers say about {product_id}:\n{snippets}"}, state
     except Exception as e:
         logger.exception(f"Error generating review explanation: {e}")
         error_msg = "Sorry, I couldn't generate a review explanation for that product at this time."
@@ -0,0 +1,81 @@
+import re
+import logging
+from typing import List
+from ..state import AgentState
+from ..similar import get_similar_products
+from ..data_utils import extract_product_from_text, get_products_by_ids
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_RESULTS = 10
+
+# "more like this", "something like the Hydra Serum", "similar to ...", "alternatives to ...", "a dupe for ..."
+_SIMILAR_REQUEST = re.compile(r"\b(?:more|something|anything|products?|items?|ones?)\s+(?:just\s+)?like\b|\bsimilar\b|\balternatives?\b|\bdupes?\b", re.IGNORECASE)
+# Words that refer back to the products already shown rather than naming one
+_REFERENCE_WORDS = {"this", "these", "that", "those", "it", "them", "one", "ones", "to", "for", "the", "a", "an", "any", "some",
+                    "me", "show", "please", "products", "product", "items", "item", "something", "anything", "else"}
+# Words that only phrase the request ("do you have ...", "can you show me ...")
+_REQUEST_WORDS = _REFERENCE_WORDS | {"do", "you", "have", "got", "can", "could", "would", "will", "i", "im", "m", "want", "need",
+                                     "like", "find", "get", "give", "recommend", "looking", "what", "are", "there", "is", "other",
+                                     "more", "just", "hi", "hey", "ok", "okay", "so", "and", "also"}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def similar_seeds(state: AgentState, user_input: str) -> List[str]:
+    """
+    Product IDs a "more like this" request refers to: a product named after the trigger phrase, or
+    the products shown last turn for a bare reference ("more like these"). Empty when the input is
+    not such a request, nothing resolves, or it adds anything else ("alternatives without
+    fragrance", "similar but cheaper"): those constraints need the router and NER, which the
+    neighbour table would silently drop.
+    """
+    match = _SIMILAR_REQUEST.search(user_input or "")
+    table = get_similar_products()
+    if match is None or table is None:
+        return []
+    if any(word not in _REQUEST_WORDS for word in _words(user_input[:match.start()])):
+        return []
+    rest = user_input[match.end():]
+    content = [word for word in _words(rest) if word not in _REFERENCE_WORDS]
+    if not content:
+        return [pid for pid in state.last_product_ids if pid in table]
+    product_id = extract_product_from_text(rest)
+    if product_id is None or product_id not in table:
+        return []
+    try:
+        name_words = set(_words(get_products_by_ids([product_id])[0].get("name")))
+    except KeyError:
+        return []
+    # Anything beyond the product's name is a constraint on the alternatives
+    return [str(product_id)] if all(word in name_words for word in content) else []
+
+
+def similar_products_agent(state: AgentState, user_input: str) -> (dict, AgentState):
+    """
+    Answers "more like this" from the precomputed neighbour table (services/similar.py): no LLM,
+    embedding or vector-store call. Returns 'product_ids' and a templated 'justification'.
+    """
+    seeds = similar_seeds(state, user_input)
+    logger.info("Similar Products Agent: Started with seed products %s.", seeds)
+    table = get_similar_products()
+    neighbours = table.similar_to_many(seeds, SIMILAR_RESULTS) if table is not None and seeds else []
+    if not neighbours:
+        response = "Sorry, I couldn't find products similar to that one."
+        state.history.append(("agent", response))
+        return {"response": response}, state
+
+    product_ids = [pid for pid, _ in neighbours]
+    if len(seeds) == 1:
+        try:
+            name = get_products_by_ids(seeds)[0].get("name")
+        except KeyError:
+            name = None
+        justification = f"More products like {name}" if name else "More products like this one"
+    else:
+        justification = "More products like the ones you viewed"
+    state.active_agent = "similar_products"
+    logger.info("Similar Products Agent: Finished with %d products.", len(product_ids))
+    return {"product_ids": product_ids, "justification": justification}, state
@@ -0,0 +1,124 @@
+"""
+audio_formats.py
+Audio format negotiation and (fallback) transcoding for the voice WebSocket.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Formats the client may send to /ws/voice-agent. Whisper accepts all of them as-is,
+# so the upload only needs the right filename/MIME type (no transcoding on the way in).
+INPUT_FORMATS: Dict[str, Dict[str, str]] = {
+    "webm": {"filename": "audio.webm", "mime": "audio/webm"},   # MediaRecorder default in Chrome/Firefox
+    "ogg": {"filename": "audio.ogg", "mime": "audio/ogg"},
+    "opus": {"filename": "audio.ogg", "mime": "audio/ogg"},     # Opus in an Ogg container
+    "mp3": {"filename": "audio.mp3", "mime": "audio/mpeg"},
+    "wav": {"filename": "audio.wav", "mime": "audio/wav"},
+}
+
+# Formats the server may send back. "native" formats are produced by the upstream TTS
+# service directly; the others are transcoded locally from WAV with ffmpeg.
+# "bitrate" is None for uncompressed output, a (min, max) range, or the fixed set of
+# bitrates the encoder accepts (the TTS service only encodes MP3 at 32 or 48 kbps).
+OPUS_BITRATE_RANGE = (6000, 256000)
+OUTPUT_FORMATS: Dict[str, Dict[str, Any]] = {
+    "wav": {"container": "wav", "encoding": "linear16", "mime": "audio/wav", "native": True, "bitrate": None},
+    "opus": {"container": "ogg", "encoding": "opus", "mime": "audio/ogg; codecs=opus", "native": True, "bitrate": {"range": OPUS_BITRATE_RANGE}},
+    "mp3": {"container": "none", "encoding": "mp3", "mime": "audio/mpeg", "native": True, "bitrate": {"choices": (32000, 48000)}},
+    "webm": {"container": "webm", "encoding": "opus", "mime": "audio/webm; codecs=opus", "native": False, "bitrate": {"range": OPUS_BITRATE_RANGE}},
+}
+
+DEFAULT_INPUT_FORMAT = os.getenv("VOICE_INPUT_FORMAT", "mp3").strip().lower()
+DEFAULT_OUTPUT_FORMAT = os.getenv("VOICE_OUTPUT_FORMAT", "wav").strip().lower()
+# The defaults are what unknown client formats fall back to, so they are checked at import rather than per session
+if DEFAULT_INPUT_FORMAT not in INPUT_FORMATS:
+    raise ValueError(f"VOICE_INPUT_FORMAT '{DEFAULT_INPUT_FORMAT}' is not supported. Use one of: {', '.join(INPUT_FORMATS)}.")
+if DEFAULT_OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    raise ValueError(f"VOICE_OUTPUT_FORMAT '{DEFAULT_OUTPUT_FORMAT}' is not supported. Use one of: {', '.join(OUTPUT_FORMATS)}.")
+DEFAULT_BITRATE = int(os.getenv("VOICE_OUTPUT_BITRATE", "32000"))  # bits per second for compressed output
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+# ffmpeg arguments for the locally transcoded (non-native) output formats
+_FFMPEG_CODECS = {
+    "webm": ["-c:a", "libopus", "-f", "webm"],
+}
+
+
+def resolve_bitrate(output_format: str, bitrate: Optional[int] = None) -> Optional[int]:
+    """
+    The bitrate to encode `output_format` at: the requested one (or the default) clamped to the
+    format's range, or snapped to the nearest bitrate it accepts. None for uncompressed formats.
+    """
+    spec = OUTPUT_FORMATS[output_format]["bitrate"]
+    if not spec:
+        return None
+    requested = int(bitrate or DEFAULT_BITRATE)
+    if "choices" in spec:
+        return min(spec["choices"], key=lambda choice: (abs(choice - requested), choice))
+    low, high = spec["range"]
+    return min(max(requested, low), high)
+
+
+def negotiate_formats(input_format: Optional[str] = None,
+                      output_format: Optional[str] = None,
+                      bitrate: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Resolves the client's requested formats against the supported ones.
+    Unknown formats fall back to the defaults and the bitrate is fitted to the output format
+    (resolve_bitrate).
+    Returns a dict describing the negotiated input/output formats.
+    """
+    in_fmt = (input_format or DEFAULT_INPUT_FORMAT).strip().lower()
+    if in_fmt not in INPUT_FORMATS:
+        logger.warning(f"Unsupported voice input format '{in_fmt}'. Falling back to '{DEFAULT_INPUT_FORMAT}'.")
+        in_fmt = DEFAULT_INPUT_FORMAT
+    out_fmt = (output_format or DEFAULT_OUTPUT_FORMAT).strip().lower()
+    if out_fmt not in OUTPUT_FORMATS:
+        logger.warning(f"Unsupported voice output format '{out_fmt}'. Falling back to '{DEFAULT_OUTPUT_FORMAT}'.")
+        out_fmt = DEFAULT_OUTPUT_FORMAT
+    out_bitrate = resolve_bitrate(out_fmt, bitrate)
+    return {
+        "input_format": in_fmt,
+        "input_mime": INPUT_FORMATS[in_fmt]["mime"],
+        "input_filename": INPUT_FORMATS[in_fmt]["filename"],
+        "output_format": out_fmt,
+        "output_mime": OUTPUT_FORMATS[out_fmt]["mime"],
+        "bitrate": out_bitrate,
+        "transcoded": not OUTPUT_FORMATS[out_fmt]["native"],
+    }
+
+
+async def transcode_audio(audio_bytes: bytes, output_format: str, bitrate: Optional[int] = None) -> bytes:
+    """
+    Transcodes audio bytes (any ffmpeg-readable input, typically WAV) into the given output format.
+    Only used for output formats the upstream TTS service cannot produce natively.
+    Raises:
+        RuntimeError: If ffmpeg is missing or fails.
+    """
+    if output_format not in _FFMPEG_CODECS:
+        raise ValueError(f"Cannot transcode to unsupported format: {output_format}")
+    args = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0"]
+    args += _FFMPEG_CODECS[output_format][:2]
+    if bitrate:
+        args += ["-b:a", str(bitrate)]
+    args += _FFMPEG_CODECS[output_format][2:] + ["pipe:1"]
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        logger.error(f"ffmpeg binary '{FFMPEG_BINARY}' not found. Cannot transcode audio to {output_format}.")
+        raise RuntimeError(f"ffmpeg binary '{FFMPEG_BINARY}' not found.")
+    stdout, stderr = await process.communicate(audio_bytes)
+    if process.returncode != 0:
+        logger.error("ffmpeg transcoding to %s failed: %s", output_format, stderr.decode(errors="ignore"))
+        raise RuntimeError(f"ffmpeg transcoding to {output_format} failed.")
+    logger.info("Transcoded %d bytes of audio to %d bytes of %s.", len(audio_bytes), len(stdout), output_format)
+    return stdout
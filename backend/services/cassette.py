@@ -0,0 +1,118 @@
+"""
+cassette.py
+Record/replay of upstream calls (LLM invokes, embeddings, vector-store queries) to a local
+JSONL cassette, so agent-chain performance can be compared on identical conversation traces.
+
+    CASSETTE_MODE=record   call the real services and append every call + result to the cassette
+    CASSETTE_MODE=replay   serve results from the cassette by request fingerprint, never calling out
+    CASSETTE_REPLAY_LATENCY=1  in replay mode, sleep for the latency recorded with each call
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .upstream import UpstreamCall, add_interceptor, encode_result, decode_result
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").strip().lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", os.path.join(os.path.dirname(__file__), "..", "cassettes", "default.jsonl"))
+CASSETTE_REPLAY_LATENCY = os.getenv("CASSETTE_REPLAY_LATENCY", "0").lower() in ("1", "true", "yes")
+
+
+class CassetteMissError(RuntimeError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class Cassette:
+    """
+    Interceptor that records upstream calls to, or replays them from, a JSONL file.
+    Repeated identical requests are replayed in their recorded order; once exhausted,
+    the last recorded response is reused.
+    """
+    def __init__(self, path: str, mode: str, replay_latency: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found at {self.path}. Record one with CASSETTE_MODE=record first.")
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["fingerprint"], []).append(entry)
+                    count += 1
+        logger.info(f"Loaded cassette {self.path}: {count} calls, {len(self._entries)} distinct requests.")
+
+    def __call__(self, call: UpstreamCall, proceed: Callable[[], Any]) -> Any:
+        if self.mode == "replay":
+            return self._replay(call)
+        return self._record(call, proceed)
+
+    def _record(self, call: UpstreamCall, proceed: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = proceed()
+        latency = time.perf_counter() - start
+        entry = {
+            "fingerprint": call.fingerprint,
+            "kind": call.kind,
+            "target": call.target,
+            "request": call.describe(),
+            "latency": round(latency, 4),
+            "result": encode_result(call.kind, result),
+        }
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+        return result
+
+    def _replay(self, call: UpstreamCall) -> Any:
+        with self._lock:
+            entries = self._entries.get(call.fingerprint)
+            if not entries:
+                logger.error(f"Cassette miss for {call.describe()}")
+                raise CassetteMissError(f"No recorded response for {call.kind} on {call.target} (fingerprint {call.fingerprint[:12]}).")
+            position = self._positions.get(call.fingerprint, 0)
+            entry = entries[min(position, len(entries) - 1)]
+            self._positions[call.fingerprint] = position + 1
+            self.replayed += 1
+        if self.replay_latency:
+            time.sleep(entry.get("latency", 0.0))
+        return decode_result(call.kind, entry["result"])
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette configured by CASSETTE_MODE, installed as an upstream interceptor (or None when off)."""
+    global _cassette
+    if _cassette is None and CASSETTE_MODE in ("record", "replay"):
+        _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_REPLAY_LATENCY)
+        add_interceptor(_cassette)
+        logger.info(f"Cassette {CASSETTE_MODE} mode enabled: {CASSETTE_PATH} (replay latency: {CASSETTE_REPLAY_LATENCY}).")
+    return _cassette
+
+
+def is_replay() -> bool:
+    return CASSETTE_MODE == "replay"
@@ -1,10 +1,17 @@
 import os
 import logging
-from typing import Optional
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from pinecone import Pinecone
 from langchain_cohere import CohereEmbeddings
+from .upstream import LLMProxy, EmbeddingsProxy, IndexProxy
+from .cassette import get_cassette, is_replay
+from .upstream import add_interceptor
+from .admission import admission_interceptor
+from .singleflight import singleflight_interceptor
+from .tenants import tenant_setting
+from .result_cache import result_cache_interceptor
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -16,29 +23,95 @@ PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")
 CATALOG_PINECONE_INDEX_NAME = os.getenv("CATALOG_PINECONE_INDEX_NAME", "everglow-catalog")
 FEEDBACK_PINECONE_INDEX_NAME = os.getenv("FEEDBACK_PINECONE_INDEX_NAME", "everglow-feedback")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+GEMINI_LITE_MODEL = os.getenv("GEMINI_LITE_MODEL", "gemini-2.0-flash-lite")
+COHERE_EMBEDDING_MODEL = "embed-english-light-v2.0"
+
+# Upstream interceptors, outermost first: record/replay (CASSETTE_MODE=record|replay; a no-op when off),
+# the embedding/vector-query result cache, coalescing of identical concurrent calls, then
+# per-upstream concurrency limits (replayed, cached and coalesced calls never take a slot)
+get_cassette()
+add_interceptor(result_cache_interceptor)
+add_interceptor(singleflight_interceptor)
+add_interceptor(admission_interceptor)
 
 # LLM Setup
-if not os.getenv("GEMINI_API_KEY"):
+if not os.getenv("GEMINI_API_KEY") and not is_replay():
     logger.error("GEMINI_API_KEY not set in environment variables.")
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-preview-05-20",
-    temperature=0.2,
-    google_api_key=os.getenv("GEMINI_API_KEY")
-)
+# Model tier per LLM task. Short, structured tasks (intent, NER, the 10-word justification, memory
+# summaries) run on the lite model; free-form answers keep the full model. `timeout` is the client
+# request timeout, which also bounds calls abandoned at their agent deadline (services/hedging.py).
+# Each field can be overridden with LLM_<TASK>_MODEL / _TEMPERATURE / _MAX_OUTPUT_TOKENS / _TIMEOUT.
+DEFAULT_LLM_TIERS: Dict[str, Dict[str, Any]] = {
+    "default": {"model": GEMINI_MODEL, "temperature": 0.2, "max_output_tokens": None, "timeout": 30.0},
+    "router": {"model": GEMINI_LITE_MODEL, "temperature": 0.0, "max_output_tokens": 64, "timeout": 8.0},
+    "ner": {"model": GEMINI_LITE_MODEL, "temperature": 0.0, "max_output_tokens": 512, "timeout": 15.0},
+    "justification": {"model": GEMINI_LITE_MODEL, "temperature": 0.4, "max_output_tokens": 64, "timeout": 10.0},
+    "reviews": {"model": GEMINI_MODEL, "temperature": 0.2, "max_output_tokens": 2048, "timeout": 25.0},
+    "brand": {"model": GEMINI_MODEL, "temperature": 0.3, "max_output_tokens": 1024, "timeout": 20.0},
+    "summary": {"model": GEMINI_LITE_MODEL, "temperature": 0.0, "max_output_tokens": 512, "timeout": 30.0},
+}
+
+
+def _tier_from_env(task: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    prefix = f"LLM_{task.upper()}_"
+    tier = dict(defaults)
+    tier["model"] = os.getenv(prefix + "MODEL", tier["model"])
+    tier["temperature"] = float(os.getenv(prefix + "TEMPERATURE", tier["temperature"]))
+    max_output_tokens = os.getenv(prefix + "MAX_OUTPUT_TOKENS")
+    if max_output_tokens:
+        tier["max_output_tokens"] = int(max_output_tokens)
+    tier["timeout"] = float(os.getenv(prefix + "TIMEOUT", tier["timeout"]))
+    return tier
+
+
+LLM_TIERS: Dict[str, Dict[str, Any]] = {task: _tier_from_env(task, tier) for task, tier in DEFAULT_LLM_TIERS.items()}
+
+
+def make_chat_model(tier: Dict[str, Any]):
+    """The chat model client for one tier (None in replay mode, where every response comes from the cassette)."""
+    if is_replay():
+        return None
+    return ChatGoogleGenerativeAI(
+        model=tier["model"],
+        temperature=tier["temperature"],
+        max_output_tokens=tier["max_output_tokens"],
+        timeout=tier["timeout"],
+        google_api_key=os.getenv("GEMINI_API_KEY")
+    )
+
+
+# All upstream clients are wrapped in proxies (services/upstream.py) so calls can be intercepted.
+_llms: Dict[str, LLMProxy] = {}
+
+def get_llm(task: str = "default") -> LLMProxy:
+    """The LLM for a task's tier; unknown tasks get the default tier. One client per task."""
+    if task not in LLM_TIERS:
+        task = "default"
+    if task not in _llms:
+        tier = LLM_TIERS[task]
+        _llms[task] = LLMProxy(make_chat_model(tier), name=tier["model"])
+        logger.info(f"Initialized LLM for '{task}': {tier['model']} (temperature {tier['temperature']}, max output tokens {tier['max_output_tokens']}, timeout {tier['timeout']}s)")
+    return _llms[task]
+
+llm = get_llm()
 
 # Singleton patterns for efficiency
-_cohere_embeddings: Optional[CohereEmbeddings] = None
+_cohere_embeddings: Optional[EmbeddingsProxy] = None
 _pinecone_client: Optional[Pinecone] = None
 
-def get_cohere_embeddings() -> CohereEmbeddings:
+def get_cohere_embeddings() -> EmbeddingsProxy:
     global _cohere_embeddings
     if _cohere_embeddings is None:
+        if is_replay():
+            _cohere_embeddings = EmbeddingsProxy(None, name=COHERE_EMBEDDING_MODEL)
+            return _cohere_embeddings
         if not COHERE_API_KEY:
             logger.error("COHERE_API_KEY not set in environment variables.")
             raise ValueError("COHERE_API_KEY not set in environment variables.")
-        _cohere_embeddings = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model="embed-english-light-v2.0")
-        logger.info("Initialized Cohere Embeddings model: embed-english-light-v2.0")
+        _cohere_embeddings = EmbeddingsProxy(CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model=COHERE_EMBEDDING_MODEL), name=COHERE_EMBEDDING_MODEL)
+        logger.info(f"Initialized Cohere Embeddings model: {COHERE_EMBEDDING_MODEL}")
     return _cohere_embeddings
 
 def get_pinecone_client() -> Pinecone:
@@ -51,16 +124,25 @@ def get_pinecone_client() -> Pinecone:
         logger.info("Initialized Pinecone client.")
     return _pinecone_client
 
-def get_catalog_index():
-    pc = get_pinecone_client()
-    if CATALOG_PINECONE_INDEX_NAME not in [idx.name for idx in pc.list_indexes()]:
-        logger.error(f"Pinecone catalog index '{CATALOG_PINECONE_INDEX_NAME}' not found. Please run preprocessing script.")
-        raise ValueError(f"Pinecone catalog index '{CATALOG_PINECONE_INDEX_NAME}' not found. Please run preprocessing script.")
-    return pc.Index(CATALOG_PINECONE_INDEX_NAME)
-
-def get_feedback_index():
-    pc = get_pinecone_client()
-    if FEEDBACK_PINECONE_INDEX_NAME not in [idx.name for idx in pc.list_indexes()]:
-        logger.error(f"Pinecone feedback index '{FEEDBACK_PINECONE_INDEX_NAME}' not found. Please run preprocessing script.")
-        raise ValueError(f"Pinecone feedback index '{FEEDBACK_PINECONE_INDEX_NAME}' not found. Please run preprocessing script.")
-    return pc.Index(FEEDBACK_PINECONE_INDEX_NAME)
\ No newline at end of file
+_indexes: Dict[str, IndexProxy] = {}
+
+def _get_index(name: str, kind: str) -> IndexProxy:
+    # Resolved once per process: list_indexes() is a control-plane round trip on every call otherwise
+    if name not in _indexes:
+        if is_replay():
+            _indexes[name] = IndexProxy(None, name=name)
+            return _indexes[name]
+        pc = get_pinecone_client()
+        if name not in [idx.name for idx in pc.list_indexes()]:
+            logger.error(f"Pinecone {kind} index '{name}' not found. Please run preprocessing script.")
+            raise ValueError(f"Pinecone {kind} index '{name}' not found. Please run preprocessing script.")
+        _indexes[name] = IndexProxy(pc.Index(name), name=name)
+        logger.info(f"Initialized Pinecone {kind} index: {name}")
+    return _indexes[name]
+
+# Index names are per tenant (services/tenants.py); handles are cached by name, so tenants never share one
+def get_catalog_index() -> IndexProxy:
+    return _get_index(tenant_setting("catalog_index", CATALOG_PINECONE_INDEX_NAME), "catalog")
+
+def get_feedback_index() -> IndexProxy:
+    return _get_index(tenant_setting("feedback_index", FEEDBACK_PINECONE_INDEX_NAME), "feedback")
@@ -1,23 +1,56 @@
 import os
 import re
 import logging
+import numpy as np
 import pandas as pd
+from typing import Dict, Iterable, List, Optional
 from rapidfuzz import process, fuzz
+from .shared_catalog import SHARED_CATALOG, SharedCatalog, attach_or_publish, process_memory, format_memory
+from .tenants import current_tenant
 # Global variable to hold the product catalog DataFrame
 PRODUCT_CATALOG_DATA: pd.DataFrame = pd.DataFrame()
+# Memory-mapped catalog segment shared by all worker processes (services/shared_catalog.py), when in use
+SHARED_CATALOG_DATA: Optional[SharedCatalog] = None
 
 def set_product_catalog_data(data=None):
-    """Set the global product catalog data."""
-    global PRODUCT_CATALOG_DATA
+    """Set the global product catalog data. Without data, attaches to (or publishes) the shared catalog."""
+    global PRODUCT_CATALOG_DATA, SHARED_CATALOG_DATA
     if data is not None:
         PRODUCT_CATALOG_DATA = data
-    else:
-        PRODUCT_CATALOG_DATA = load_products_catalog()
+        SHARED_CATALOG_DATA = None
+        return
+    before = process_memory()
+    shared = None
+    if SHARED_CATALOG:
+        try:
+            shared = attach_or_publish(CATALOG_PATH, load_products_catalog)
+        except Exception as e:
+            logger.exception(f"Shared catalog unavailable, loading a private copy: {e}")
+    SHARED_CATALOG_DATA = shared
+    PRODUCT_CATALOG_DATA = shared.frame() if shared is not None else load_products_catalog()
+    logger.info(f"Product catalog ready ({len(PRODUCT_CATALOG_DATA)} products, {'shared' if shared is not None else 'private'}). "
+                f"Process memory before: {format_memory(before)}; after: {format_memory(process_memory())}.")
 
 def get_product_catalog_data() -> pd.DataFrame:
-    """Get the global product catalog data."""
+    """The current tenant's product catalog (services/tenants.py); the global one for the default tenant."""
+    tenant = current_tenant()
+    if not tenant.is_default:
+        return tenant.catalog
     return PRODUCT_CATALOG_DATA
 
+def get_shared_catalog() -> Optional[SharedCatalog]:
+    """The shared catalog segment with its ID/name/facet indexes, or None when the catalog is private."""
+    return SHARED_CATALOG_DATA
+
+def get_products_by_ids(product_ids: List[str]) -> List[Dict]:
+    """Product records for the given IDs, in request order. Raises KeyError if any ID is unknown."""
+    tenant = current_tenant()
+    if not tenant.is_default:
+        return tenant.catalog.loc[product_ids].reset_index().to_dict('records')
+    if SHARED_CATALOG_DATA is not None:
+        return SHARED_CATALOG_DATA.products_by_ids(product_ids)
+    return PRODUCT_CATALOG_DATA.loc[product_ids].reset_index().to_dict('records')
+
 logger = logging.getLogger(__name__)
 
 CATALOG_PATH = os.path.join(os.path.dirname(__file__), "..", "skincare catalog.xlsx")
@@ -28,22 +61,20 @@ def get_catalog_categories_and_skin_concerns_from_source():
     This is used to get available options for the agent.
     Note: This function reads the source file, not the Pinecone index.
     """
+    if SHARED_CATALOG_DATA is not None:
+        # Vocabularies come straight from the shared facet index
+        shared = SHARED_CATALOG_DATA
+        categories, skin_concerns, ingredients = (shared.facet_values(f) for f in ("category", "tag", "ingredient"))
+        logger.info(f"Loaded {len(categories)} categories and {len(skin_concerns)} skin concerns and {len(ingredients)} ingredients from the shared catalog.")
+        return categories, skin_concerns, ingredients
     try:
         # Use the shared data if available, otherwise load from file
-        df = get_product_catalog_data()
+        df = PRODUCT_CATALOG_DATA
         if df is None or df.empty:
             df = pd.read_excel(CATALOG_PATH).dropna()
-        # Convert all values to strings and remove whitespace, then get uniques
-        categories = set(str(p).strip().lower() for p in df["category"].dropna().unique())
-        skin_concerns = set()
-        for tags_str in df["tags"].dropna().unique():
-            tag_list = [t.strip().lower() for t in str(tags_str).split('|') if t.strip()]
-            skin_concerns.update(tag_list)
-        ingredients = set()
-        for ingredient in df['top_ingredients'].str.split('; ').explode().unique():
-            ingredients.update(ingredient.lower())
+        categories, skin_concerns, ingredients = catalog_vocabularies(df)
         logger.info(f"Loaded {len(categories)} categories and {len(skin_concerns)} skin concerns and {len(ingredients)} ingredients from catalog source.")
-        return sorted(list(categories)), sorted(list(skin_concerns)), sorted(list(ingredients))
+        return categories, skin_concerns, ingredients
     except FileNotFoundError:
         logger.error(f"Catalog source file not found at {CATALOG_PATH}. Cannot extract categories and skin concerns.")
         return [], [], []
@@ -54,13 +85,34 @@ def get_catalog_categories_and_skin_concerns_from_source():
         logger.exception(f"Error loading categories and skin concerns from catalog source: {e}.")
         return [], [], []
 
-def load_products_catalog():
+def catalog_vocabularies(df: pd.DataFrame):
+    """Sorted categories, skin concerns (tags) and ingredients of a catalog DataFrame."""
+    # Convert all values to strings and remove whitespace, then get uniques
+    categories = set(str(p).strip().lower() for p in df["category"].dropna().unique())
+    skin_concerns = set()
+    for tags_str in df["tags"].dropna().unique():
+        tag_list = [t.strip().lower() for t in str(tags_str).split('|') if t.strip()]
+        skin_concerns.update(tag_list)
+    ingredients = set()
+    for ingredient in df['top_ingredients'].str.split('; ').explode().unique():
+        ingredients.add(str(ingredient).strip().lower())
+    return sorted(list(categories)), sorted(list(skin_concerns)), sorted(list(ingredients))
+
+def get_available_vocabularies():
+    """(categories, skin concerns, ingredients) of the current tenant's catalog."""
+    tenant = current_tenant()
+    if not tenant.is_default:
+        return tenant.vocabularies
+    return AVAILABLE_CATEGORIES, AVAILABLE_SKIN_CONCERNS, AVAILABLE_INGREDIENTS
+
+def load_products_catalog(path=None):
     """
-    Loads the skincare catalog Excel file and returns a DataFrame.
+    Loads the skincare catalog Excel file (CATALOG_PATH, or a tenant's catalog_path) and returns a DataFrame.
     This is used for catalog-related operations.
     """
+    path = path or CATALOG_PATH
     try:
-        df = pd.read_excel(CATALOG_PATH).dropna()
+        df = pd.read_excel(path).dropna()
         # Clean column names: keep only alphabets and underscores, trim whitespace
         df.columns = [re.sub(r'[^a-zA-Z_]', '', col).strip().lower() for col in df.columns]
 
@@ -70,11 +122,11 @@ def load_products_catalog():
         logger.info(f"Cleaned column names: {list(df.columns)}")
         return PRODUCT_CATALOG_DATA
     except FileNotFoundError:
-        logger.error(f"Product catalog file not found at {CATALOG_PATH}. The /api/products endpoint will return empty results.")
+        logger.error(f"Product catalog file not found at {path}. The /api/products endpoint will return empty results.")
         PRODUCT_CATALOG_DATA = pd.DataFrame() # Assign an empty DataFrame if file is missing
         return PRODUCT_CATALOG_DATA
     except Exception as e:
-        logger.exception(f"Error loading product catalog from {CATALOG_PATH}: {e}")
+        logger.exception(f"Error loading product catalog from {path}: {e}")
         PRODUCT_CATALOG_DATA = pd.DataFrame() # Assign an empty DataFrame if loading fails
         return PRODUCT_CATALOG_DATA
 
@@ -112,21 +164,19 @@ def extract_product_from_text(text, threshold=80):
     Returns:
         str: The ID of the matched product, or None if no match is found above the threshold.
     """
-    global PRODUCT_CATALOG_DATA
     if not text:
         return None
     
-    # Load catalog products if not provided
-    if PRODUCT_CATALOG_DATA is None:
-        PRODUCT_CATALOG_DATA = get_product_catalog_data()
+    # The current tenant's catalog
+    catalog = get_product_catalog_data()
     
-    if PRODUCT_CATALOG_DATA.empty:
+    if catalog is None or catalog.empty:
         logger.error("No catalog products loaded. Cannot perform fuzzy product extraction.")
         return None
     
     # Create a list of product names (choices) for fuzzy matching
     # and a mapping from lowercased name back to original ID
-    product_id_names = load_catalog_product_id_name(PRODUCT_CATALOG_DATA)
+    product_id_names = load_catalog_product_id_name(catalog)
     product_names_lower_to_id = {}
     choices_for_fuzzy_match = []
 
@@ -145,6 +195,42 @@ def extract_product_from_text(text, threshold=80):
         logger.error(f"Error during fuzzy product extraction from text: {text[:50]}... Error: {e}")
         return None
 
-# Cache these at startup from the source file
+def link_products_batch(texts: Iterable[str], threshold=80, catalog_products: Optional[Dict[str, str]] = None) -> List[Optional[str]]:
+    """
+    Batch version of extract_product_from_text: links many texts to catalog product IDs at once.
+    Identical texts are deduplicated first, then all unique texts are scored against all
+    catalog names in a single rapidfuzz cdist call spread over every CPU core.
+
+    Args:
+        texts: The input texts to search within.
+        threshold (int): The minimum fuzzy matching score (0-100) to consider a match.
+        catalog_products: Optional product_id -> name mapping (defaults to the loaded catalog).
+
+    Returns:
+        list: The matched product ID (or None) for each input text, in input order.
+    """
+    texts = [str(t).lower() if t else "" for t in texts]
+    if catalog_products is None:
+        catalog_products = load_catalog_product_id_name(get_product_catalog_data())
+    if not catalog_products:
+        logger.error("No catalog products loaded. Cannot perform fuzzy product linking.")
+        return [None] * len(texts)
+    product_ids = list(catalog_products.keys())
+    choices = [str(name).lower() for name in catalog_products.values()]
+
+    unique_texts = list(dict.fromkeys(t for t in texts if t))
+    if not unique_texts:
+        return [None] * len(texts)
+    scores = process.cdist(unique_texts, choices, scorer=fuzz.partial_token_set_ratio, workers=-1)
+    best = scores.argmax(axis=1)  # first best choice on ties, like extractOne
+    best_scores = scores[np.arange(len(unique_texts)), best]
+    matches = {
+        text: (product_ids[choice] if score >= threshold else None)
+        for text, choice, score in zip(unique_texts, best, best_scores)
+    }
+    logger.info(f"Linked {sum(m is not None for m in matches.values())} of {len(unique_texts)} unique texts ({len(texts)} total) to catalog products.")
+    return [matches.get(t) if t else None for t in texts]
+
+# Load (or attach to the shared copy of) the catalog once per process, then derive the vocabularies
 set_product_catalog_data()
 AVAILABLE_CATEGORIES, AVAILABLE_SKIN_CONCERNS, AVAILABLE_INGREDIENTS = get_catalog_categories_and_skin_concerns_from_source()
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+dedup.py
+Stable content-addressed IDs and MinHash near-duplicate collapsing for feedback documents.
+"""
+
+import os
+import re
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard very likely share a band
+DEFAULT_THRESHOLD = 0.75  # estimated Jaccard similarity of word sets to count as a near-duplicate
+MAX_TRACKED_DUPLICATE_IDS = 20  # keeps Pinecone metadata well under its size limit
+DEDUP_MAX_TRACKED_DOCS = int(os.getenv("DEDUP_MAX_TRACKED_DOCS", "250000"))  # about 500 MB of collapser state
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_LOW_31 = np.uint64((1 << 31) - 1)
+_LOW_30 = np.uint64((1 << 30) - 1)
+_rng = np.random.RandomState(1)  # fixed seed: signatures must be comparable across runs
+# a, b uniform over [1, p) and [0, p): with small multipliers a*h + b rarely wraps mod p, every
+# permutation is then nearly monotone in h and they all pick the same minimum token
+_PERM_A = _rng.randint(1, (1 << 61) - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, (1 << 61) - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases and strips punctuation/extra whitespace, so trivial edits hash identically."""
+    return " ".join(_TOKEN_RE.findall(str(text).lower()))
+
+
+def stable_id(prefix: str, *parts: Any) -> str:
+    """Deterministic ID from a prefix and the normalized parts, e.g. 'review-3f2a9c0d1b7e4a65'."""
+    digest = hashlib.sha1("\x1f".join(normalize_text(p) for p in parts).encode("utf-8")).hexdigest()
+    return f"{prefix}-{digest[:16]}"
+
+
+def _mulmod_mersenne(a: np.ndarray, h: np.ndarray) -> np.ndarray:
+    """
+    a * h mod 2**61 - 1 for a, h < 2**61 without overflowing uint64: both are split into
+    31-bit halves, and 2**61 = 1 (mod p) folds the high partial products back in.
+    """
+    a_hi, a_lo = a >> np.uint64(31), a & _LOW_31
+    h_hi, h_lo = h >> np.uint64(31), h & _LOW_31
+    mid = a_hi * h_lo + a_lo * h_hi  # < 2**62
+    # a*h = a_hi*h_hi*2**62 + mid*2**31 + a_lo*h_lo, with 2**62 = 2 and mid*2**31 = (mid >> 30) + (mid & (2**30-1))*2**31
+    total = (a_hi * h_hi << np.uint64(1)) + (mid >> np.uint64(30)) + ((mid & _LOW_30) << np.uint64(31)) + a_lo * h_lo
+    return total % _MERSENNE_PRIME
+
+
+def minhash_signature(normalized: str) -> np.ndarray:
+    """
+    MinHash signature over the set of words. Word sets (rather than SimHash bit votes)
+    behave well on short reviews, where a single edited word must still match.
+    Each permutation is h -> (a*h + b) mod 2**61 - 1 over 64-bit token digests.
+    """
+    tokens = set(normalized.split()) or {""}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big") for t in tokens],
+        dtype=np.uint64,
+    ) % _MERSENNE_PRIME
+    permuted = (_mulmod_mersenne(hashes[:, None], _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class _GroupIndex:
+    """Signatures, text digests and LSH buckets of one group's representatives."""
+    __slots__ = ("ids", "signatures", "exact", "bands")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        # Low 32 bits of each MinHash value: equality (all Jaccard estimation needs) is kept up to 2**-32
+        self.signatures = np.empty((8, MINHASH_PERMUTATIONS), dtype=np.uint32)
+        self.exact: Dict[int, int] = {}
+        self.bands: Dict[int, Any] = {}  # band key -> position, or a list of positions when several share it
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id: str, signature: np.ndarray, digest: int, band_keys: List[int]) -> None:
+        position = len(self.ids)
+        if position == len(self.signatures):
+            grown = np.empty((2 * position, MINHASH_PERMUTATIONS), dtype=np.uint32)
+            grown[:position] = self.signatures
+            self.signatures = grown
+        self.ids.append(doc_id)
+        self.signatures[position] = signature
+        self.exact[digest] = position
+        for key in band_keys:
+            bucket = self.bands.get(key)
+            if bucket is None:
+                self.bands[key] = position
+            elif isinstance(bucket, list):
+                bucket.append(position)
+            else:
+                self.bands[key] = [bucket, position]
+
+
+class NearDuplicateCollapser:
+    """
+    Streams documents through exact and MinHash/LSH near-duplicate detection.
+    The first document of each cluster is kept as the representative; later near-duplicates
+    are counted against it (`duplicates`: representative ID -> duplicate_count and up to a cap
+    of duplicate_source_ids). Only signatures, band buckets, a digest of each text and the
+    counts are retained, never the documents, and offered documents are not modified after
+    they are returned, so the caller can hand them straight to other threads.
+
+    Memory is O(tracked representatives), about 2 KB each (see benchmarks/bench_dedup.py), plus
+    the counts of clusters that have duplicates. Beyond max_tracked representatives the least
+    recently used groups are dropped whole: exports are mostly ordered by product or time, and a
+    later duplicate of a dropped group's review is kept as a new representative instead.
+
+    Args:
+        content_fn: Returns the text compared for duplication (e.g. the review body).
+        group_fn: Documents are only compared within the same group (e.g. source + product).
+        id_fn: Returns the representative's vector ID, the key of `duplicates`.
+        threshold: Minimum estimated Jaccard similarity of word sets to count as a near-duplicate.
+        max_tracked: Representatives kept for comparison across all groups.
+    """
+    def __init__(self, content_fn: Callable[[Any], str], group_fn: Callable[[Any], Hashable],
+                 id_fn: Callable[[Any], str], threshold: float = DEFAULT_THRESHOLD,
+                 max_tracked: int = DEDUP_MAX_TRACKED_DOCS):
+        self.content_fn = content_fn
+        self.group_fn = group_fn
+        self.id_fn = id_fn
+        self.threshold = threshold
+        self.max_tracked = max_tracked
+        self.duplicates: Dict[str, Dict[str, Any]] = {}
+        self._groups: "OrderedDict[Hashable, _GroupIndex]" = OrderedDict()
+        self._tracked = 0
+        self.collapsed = 0
+        self.evicted_groups = 0
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> List[int]:
+        rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        # Colliding keys only cost an extra Jaccard check
+        return [hash((band, signature[band * rows:(band + 1) * rows].tobytes())) for band in range(MINHASH_BANDS)]
+
+    def _find(self, index: _GroupIndex, digest: int, signature: np.ndarray, band_keys: List[int]) -> Optional[int]:
+        exact = index.exact.get(digest)
+        if exact is not None:
+            return exact
+        seen = set()
+        for key in band_keys:
+            bucket = index.bands.get(key)
+            for candidate in (bucket if isinstance(bucket, list) else () if bucket is None else (bucket,)):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if estimated_jaccard(index.signatures[candidate], signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def _evict(self, keep: Hashable) -> None:
+        while self._tracked > self.max_tracked:
+            victim = next((group for group in self._groups if group != keep), None)
+            if victim is None:
+                return
+            self._tracked -= len(self._groups.pop(victim))
+            if not self.evicted_groups:
+                logger.warning(f"Near-duplicate collapsing: over {self.max_tracked} tracked documents; "
+                               f"dropping the least recently used groups.")
+            self.evicted_groups += 1
+
+    def offer(self, doc) -> Optional[Any]:
+        """
+        Returns the document if it starts a new cluster, or None if it was counted as a
+        duplicate of an existing representative (see `duplicates`).
+        """
+        group = self.group_fn(doc)
+        normalized = normalize_text(self.content_fn(doc))
+        digest = int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "big")
+        signature = minhash_signature(normalized).astype(np.uint32)
+        band_keys = self._band_keys(signature)
+        index = self._groups.get(group)
+        if index is None:
+            index = self._groups[group] = _GroupIndex()
+        else:
+            self._groups.move_to_end(group)
+        match = self._find(index, digest, signature, band_keys)
+        if match is not None:
+            entry = self.duplicates.setdefault(index.ids[match], {"duplicate_count": 1, "duplicate_source_ids": []})
+            entry["duplicate_count"] += 1
+            if len(entry["duplicate_source_ids"]) < MAX_TRACKED_DUPLICATE_IDS:
+                entry["duplicate_source_ids"].append(str(doc.metadata.get("source_id", "")))
+            self.collapsed += 1
+            return None
+        doc.metadata.setdefault("duplicate_count", 1)
+        index.add(self.id_fn(doc), signature, digest, band_keys)
+        self._tracked += 1
+        self._evict(keep=group)
+        return doc
+
+    def collapse(self, docs: List[Any]) -> List[Any]:
+        """
+        Collapses a whole list of documents and returns the representatives in input order,
+        with their final duplicate counts written into their metadata.
+        """
+        kept = [doc for doc in docs if self.offer(doc) is not None]
+        for doc in kept:
+            doc.metadata.update(self.duplicates.get(self.id_fn(doc), {}))
+        logger.info(f"Near-duplicate collapsing: kept {len(kept)} of {len(docs)} documents ({self.collapsed} collapsed so far).")
+        return kept
@@ -0,0 +1,341 @@
+"""
+embedding_pipeline.py
+Shared embed-and-upsert stage for the preprocessing scripts: batches texts to the
+embedding provider's limit, runs embedding and upsert batches concurrently under
+token-bucket rate limits, retries failed batches with backoff, reports throughput
+and keeps a resumable checkpoint of completed batches.
+"""
+
+import os
+import time
+import random
+import hashlib
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .embedding_store import EmbeddingStore, content_hash
+
+logger = logging.getLogger(__name__)
+
+# Cohere's embed endpoint accepts at most 96 texts per call; Pinecone recommends <=100 vectors per upsert.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+EMBED_REQUESTS_PER_SECOND = float(os.getenv("EMBED_REQUESTS_PER_SECOND", "5"))
+UPSERT_REQUESTS_PER_SECOND = float(os.getenv("UPSERT_REQUESTS_PER_SECOND", "20"))
+PIPELINE_MAX_RETRIES = int(os.getenv("PIPELINE_MAX_RETRIES", "5"))
+
+# (id, text, metadata)
+Record = Tuple[str, str, Dict[str, Any]]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate` tokens are added per second up to `capacity`;
+    acquire() blocks until enough tokens are available.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("TokenBucket rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Blocks until `tokens` are available. Returns the time spent waiting in seconds."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class PipelineCheckpoint:
+    """
+    Append-only record of completed batch keys, so an interrupted run can resume
+    without re-embedding batches that were already upserted.
+    """
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._done = {line.strip() for line in f if line.strip()}
+            logger.info(f"Loaded pipeline checkpoint with {len(self._done)} completed batches from {path}")
+
+    def is_done(self, key: str) -> bool:
+        return key in self._done
+
+    def mark_done(self, key: str) -> None:
+        with self._lock:
+            self._done.add(key)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(key + "\n")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._done.clear()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def batch_key(records: List[Record]) -> str:
+    """Stable key for a batch: hash of its record IDs and texts, so edited records are never skipped."""
+    digest = hashlib.sha1()
+    for id_, text, _ in records:
+        digest.update(f"{id_}\t{text}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def retry_with_backoff(fn: Callable[[], Any], description: str, max_retries: int = PIPELINE_MAX_RETRIES,
+                       base_delay: float = 1.0, max_delay: float = 60.0) -> Any:
+    """Calls fn(), retrying with exponential backoff and jitter. Re-raises after max_retries."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                logger.error(f"{description} failed after {max_retries} retries: {e}")
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+            logger.warning(f"{description} failed (attempt {attempt}/{max_retries}): {e}. Retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+def iter_batches(records: Iterable[Record], size: int) -> Iterable[List[Record]]:
+    batch: List[Record] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_END_OF_STREAM = object()
+
+
+def bounded_prefetch(iterable: Iterable[Any], maxsize: int = 4, name: str = "prefetch") -> Iterable[Any]:
+    """
+    Consumes `iterable` on a background thread through a bounded queue, so the producer
+    (e.g. file reading) overlaps with the consumer while at most `maxsize` items are buffered.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    buffer: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put(_END_OF_STREAM)
+        except BaseException as e:  # surfaced to the consumer below
+            buffer.put(e)
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class EmbedUpsertPipeline:
+    """
+    Embeds records in provider-sized batches and upserts them to a vector index.
+
+    Args:
+        embeddings_model: Object with embed_documents(texts) -> List[List[float]].
+        index_factory: Callable(dimension) -> index with upsert(vectors=...). Called once,
+            with the dimension of the first embedded batch, so the index can be created lazily.
+        checkpoint_path: Optional path of the resumable checkpoint file.
+        embedding_store: Optional local EmbeddingStore. Texts whose content hash is already
+            stored are not sent to the provider, and newly computed vectors are added to it.
+        max_in_flight: Maximum number of batches queued or running at once (bounds memory).
+    """
+    def __init__(self, embeddings_model, index_factory: Callable[[int], Any],
+                 embed_batch_size: int = EMBED_BATCH_SIZE,
+                 upsert_batch_size: int = UPSERT_BATCH_SIZE,
+                 max_workers: int = PIPELINE_WORKERS,
+                 embed_requests_per_second: float = EMBED_REQUESTS_PER_SECOND,
+                 upsert_requests_per_second: float = UPSERT_REQUESTS_PER_SECOND,
+                 max_retries: int = PIPELINE_MAX_RETRIES,
+                 checkpoint_path: Optional[str] = None,
+                 embedding_store: Optional[EmbeddingStore] = None,
+                 max_in_flight: Optional[int] = None,
+                 name: str = "pipeline"):
+        self.embeddings_model = embeddings_model
+        self.index_factory = index_factory
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers * 2
+        self.max_retries = max_retries
+        self.embed_limiter = TokenBucket(embed_requests_per_second)
+        self.upsert_limiter = TokenBucket(upsert_requests_per_second)
+        self.checkpoint = PipelineCheckpoint(checkpoint_path)
+        self.embedding_store = embedding_store
+        self.name = name
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, Any] = {}
+
+    @property
+    def index(self):
+        """The index the pipeline upserted into, or None if nothing was upserted."""
+        return self._index
+
+    def _get_index(self, dimension: int):
+        with self._index_lock:
+            if self._index is None:
+                self._index = self.index_factory(dimension)
+            return self._index
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embeds one provider-sized batch of texts under the embedding rate limit."""
+        def call():
+            self.embed_limiter.acquire()
+            return self.embeddings_model.embed_documents(texts)
+        vectors = retry_with_backoff(call, f"[{self.name}] Embedding batch of {len(texts)}", self.max_retries)
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {len(texts)} texts.")
+        return vectors
+
+    def embed_records(self, batch: List[Record]) -> List[List[float]]:
+        """Embeds a batch, reusing vectors from the local embedding store where possible."""
+        texts = [r[1] for r in batch]
+        if self.embedding_store is None:
+            return self.embed_batch(texts)
+        keys = [content_hash(text) for text in texts]
+        found = self.embedding_store.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            new_vectors = self.embed_batch([texts[i] for i in missing])
+            self.embedding_store.add(
+                [batch[i][0] for i in missing], [keys[i] for i in missing],
+                new_vectors, [batch[i][2] for i in missing],
+            )
+            for i, vector in zip(missing, new_vectors):
+                found[keys[i]] = vector
+        with self._stats_lock:
+            self.stats["docs_reused"] += len(batch) - len(missing)
+        return [[float(x) for x in found[key]] for key in keys]
+
+    def _process_batch(self, batch: List[Record]) -> int:
+        key = batch_key(batch)
+        vectors = self.embed_records(batch)
+        index = self._get_index(len(vectors[0]))
+        upsert_data = [
+            {"id": id_, "values": vector, "metadata": metadata}
+            for (id_, _, metadata), vector in zip(batch, vectors)
+        ]
+        for i in range(0, len(upsert_data), self.upsert_batch_size):
+            chunk = upsert_data[i:i + self.upsert_batch_size]
+            def call():
+                self.upsert_limiter.acquire()
+                index.upsert(vectors=chunk)
+            retry_with_backoff(call, f"[{self.name}] Upserting batch of {len(chunk)}", self.max_retries)
+        self.checkpoint.mark_done(key)
+        return len(batch)
+
+    def _log_progress(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self.stats["started"]
+        self.stats["elapsed_seconds"] = elapsed
+        self.stats["docs_per_second"] = self.stats["docs_upserted"] / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"[{self.name}] {'Finished' if final else 'Progress'}: {self.stats['docs_upserted']} docs upserted "
+            f"({self.stats['docs_reused']} embeddings reused from the local store), "
+            f"{self.stats['batches_skipped']} batches skipped (checkpoint), {self.stats['batches_failed']} failed, "
+            f"{self.stats['docs_per_second']:.1f} docs/s over {elapsed:.1f}s."
+        )
+
+    def run(self, records: Iterable[Record]) -> Dict[str, Any]:
+        """
+        Runs the pipeline over an iterable of (id, text, metadata) records.
+        Records are consumed lazily, so generators are processed with bounded memory.
+        Returns throughput statistics. Raises RuntimeError if any batch still fails after retries;
+        completed batches are checkpointed, so rerunning resumes from the failures.
+        """
+        self.stats = {
+            "docs_upserted": 0, "docs_reused": 0, "batches_done": 0, "batches_skipped": 0, "batches_failed": 0,
+            "failed_batch_ids": [], "started": time.perf_counter(),
+        }
+        in_flight = {}
+        last_log = time.perf_counter()
+
+        def collect(done_futures):
+            nonlocal last_log
+            for future in done_futures:
+                batch = in_flight.pop(future)
+                try:
+                    count = future.result()
+                    with self._stats_lock:
+                        self.stats["docs_upserted"] += count
+                        self.stats["batches_done"] += 1
+                except Exception as e:
+                    logger.error(f"[{self.name}] Batch starting at id '{batch[0][0]}' failed permanently: {e}")
+                    with self._stats_lock:
+                        self.stats["batches_failed"] += 1
+                        self.stats["failed_batch_ids"].append(batch[0][0])
+            if time.perf_counter() - last_log > 10:
+                self._log_progress()
+                last_log = time.perf_counter()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name) as executor:
+                for batch in iter_batches(records, self.embed_batch_size):
+                    if self.checkpoint.is_done(batch_key(batch)):
+                        self.stats["batches_skipped"] += 1
+                        continue
+                    while len(in_flight) >= self.max_in_flight:
+                        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight[executor.submit(self._process_batch, batch)] = batch
+                while in_flight:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    collect(done)
+        finally:
+            # Keep every vector we paid for, even if the run fails part-way
+            if self.embedding_store is not None:
+                self.embedding_store.save()
+
+        self._log_progress(final=True)
+        if self.stats["batches_failed"]:
+            raise RuntimeError(
+                f"[{self.name}] {self.stats['batches_failed']} batches failed after retries. "
+                "Rerun with the same checkpoint to resume."
+            )
+        # Every batch made it; the checkpoint is only needed to resume interrupted runs
+        self.checkpoint.reset()
+        return self.stats
@@ -0,0 +1,217 @@
+"""
+embedding_store.py
+Local, content-addressed store for document embeddings.
+
+Layout of a store directory:
+    store.json      model name and vector dimension
+    vectors.npy     float32 matrix (n, dim), opened with np.load(mmap_mode="r")
+    table.parquet   columnar ID/offset table: content_hash, id, offset, metadata (JSON)
+
+Vectors are keyed by the hash of the embedded text, so unchanged documents are never
+re-embedded. Because vectors.npy is memory-mapped read-only, loading is near-free and
+several processes (e.g. uvicorn workers) share the same page-cache pages. New vectors
+are spilled to append-only pending files and merged into the matrix by save().
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", os.path.join(os.path.dirname(__file__), "..", "embeddings"))
+
+_INFO_FILE = "store.json"
+_VECTORS_FILE = "vectors.npy"
+_TABLE_FILE = "table.parquet"
+_PENDING_VECTORS_FILE = "pending.f32"
+_PENDING_TABLE_FILE = "pending.jsonl"
+_COPY_ROWS = 65536
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the embedded text; the store key for its vector."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def default_store_path(name: str) -> str:
+    """Store directory for a named corpus, e.g. 'catalog' or 'feedback'."""
+    return os.path.join(EMBEDDING_STORE_DIR, name)
+
+
+class EmbeddingStore:
+    """
+    Content-hash keyed embedding store backed by a memory-mapped float32 .npy matrix.
+    Thread-safe for concurrent add()/get() from pipeline workers.
+    """
+    def __init__(self, path: str, model: Optional[str] = None):
+        self.path = path
+        self.model = model
+        self.dim: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.table = pd.DataFrame(columns=["content_hash", "id", "offset", "metadata"])
+        self._offsets: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # --- Loading ---
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        info_path = self._file(_INFO_FILE)
+        if os.path.exists(info_path):
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            if self.model and info.get("model") != self.model:
+                logger.warning(f"Embedding store at {self.path} was built with model '{info.get('model')}', not '{self.model}'. Starting empty.")
+                for name in (_INFO_FILE, _VECTORS_FILE, _TABLE_FILE, _PENDING_VECTORS_FILE, _PENDING_TABLE_FILE):
+                    if os.path.exists(self._file(name)):
+                        os.remove(self._file(name))
+                return
+            self.model = self.model or info.get("model")
+            self.dim = info.get("dim")
+        if os.path.exists(self._file(_VECTORS_FILE)) and os.path.exists(self._file(_TABLE_FILE)):
+            self.vectors = np.load(self._file(_VECTORS_FILE), mmap_mode="r")
+            self.table = pd.read_parquet(self._file(_TABLE_FILE))
+            self._offsets = dict(zip(self.table["content_hash"], self.table["offset"].astype(int)))
+            logger.info(f"Opened embedding store at {self.path}: {len(self._offsets)} vectors of dimension {self.dim}.")
+        self._recover_pending()
+
+    def _recover_pending(self) -> None:
+        """Re-indexes vectors spilled by a run that never reached save()."""
+        table_path = self._file(_PENDING_TABLE_FILE)
+        vectors_path = self._file(_PENDING_VECTORS_FILE)
+        if not os.path.exists(table_path) or not os.path.exists(vectors_path) or self.dim is None:
+            self._discard_pending()
+            return
+        with open(table_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        # An interrupted add() can leave one file a record ahead of the other; trim both to the complete records
+        complete = min(len(rows), os.path.getsize(vectors_path) // (4 * self.dim))
+        os.truncate(vectors_path, complete * 4 * self.dim)
+        with open(table_path, "w", encoding="utf-8") as f:
+            for row in rows[:complete]:
+                f.write(json.dumps(row) + "\n")
+        for position, row in enumerate(rows[:complete]):
+            self._pending[row["content_hash"]] = position
+        if self._pending:
+            logger.info(f"Recovered {len(self._pending)} unsaved vectors in {self.path}; they will be merged on save().")
+
+    def _discard_pending(self) -> None:
+        for name in (_PENDING_VECTORS_FILE, _PENDING_TABLE_FILE):
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+
+    # --- Lookup ---
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets or key in self._pending
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Returns the vector stored for a content hash, or None."""
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return self.vectors[offset]
+        position = self._pending.get(key)
+        if position is not None:
+            return np.fromfile(self._file(_PENDING_VECTORS_FILE), dtype=np.float32, count=self.dim, offset=position * self.dim * 4)
+        return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for key in keys:
+            vector = self.get(key)
+            if vector is not None:
+                found[key] = vector
+        return found
+
+    def metadata(self, offset: int) -> Dict[str, Any]:
+        """Returns the metadata stored for the vector at a matrix offset."""
+        return json.loads(self.table["metadata"].iloc[offset])
+
+    # --- Writing ---
+    def add(self, ids: List[str], keys: List[str], vectors: List[List[float]], metadatas: List[Dict[str, Any]]) -> int:
+        """
+        Spills new vectors to the pending files. Already-stored content hashes are skipped.
+        Returns the number of vectors added.
+        """
+        with self._lock:
+            new_rows = []
+            new_vectors = []
+            for id_, key, vector, metadata in zip(ids, keys, vectors, metadatas):
+                if key in self._offsets or key in self._pending:
+                    continue
+                array = np.asarray(vector, dtype=np.float32)
+                if self.dim is None:
+                    self.dim = int(array.shape[0])
+                    self._write_info()
+                elif array.shape[0] != self.dim:
+                    raise ValueError(f"Vector dimension {array.shape[0]} does not match store dimension {self.dim}.")
+                self._pending[key] = len(self._pending)
+                new_vectors.append(array)
+                new_rows.append({"content_hash": key, "id": str(id_), "metadata": json.dumps(metadata, default=str)})
+            if new_rows:
+                # Vectors first: recovery trims the table to the vectors that made it to disk
+                with open(self._file(_PENDING_VECTORS_FILE), "ab") as f:
+                    f.write(np.stack(new_vectors).tobytes())
+                with open(self._file(_PENDING_TABLE_FILE), "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(row) + "\n" for row in new_rows))
+            return len(new_rows)
+
+    def _write_info(self) -> None:
+        with open(self._file(_INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": self.dim}, f)
+
+    def save(self) -> None:
+        """
+        Merges pending vectors into vectors.npy and table.parquet.
+        Copies in fixed-size chunks and swaps files atomically, so memory stays bounded
+        and readers never see a half-written store.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            with open(self._file(_PENDING_TABLE_FILE), "r", encoding="utf-8") as f:
+                pending_rows = [json.loads(line) for line in f if line.strip()][:len(self._pending)]
+            n_old = 0 if self.vectors is None else self.vectors.shape[0]
+            n_new = len(pending_rows)
+            pending_vectors = np.memmap(self._file(_PENDING_VECTORS_FILE), dtype=np.float32, mode="r", shape=(n_new, self.dim))
+
+            tmp_vectors = self._file(_VECTORS_FILE + ".tmp")
+            merged = np.lib.format.open_memmap(tmp_vectors, mode="w+", dtype=np.float32, shape=(n_old + n_new, self.dim))
+            for start in range(0, n_old, _COPY_ROWS):
+                end = min(start + _COPY_ROWS, n_old)
+                merged[start:end] = self.vectors[start:end]
+            for start in range(0, n_new, _COPY_ROWS):
+                end = min(start + _COPY_ROWS, n_new)
+                merged[n_old + start:n_old + end] = pending_vectors[start:end]
+            merged.flush()
+            del merged, pending_vectors
+
+            new_table = pd.DataFrame(pending_rows)
+            new_table["offset"] = np.arange(n_old, n_old + n_new)
+            table = pd.concat([self.table, new_table[self.table.columns]], ignore_index=True)
+            tmp_table = self._file(_TABLE_FILE + ".tmp")
+            table.to_parquet(tmp_table, index=False)
+
+            self._write_info()
+            os.replace(tmp_vectors, self._file(_VECTORS_FILE))
+            os.replace(tmp_table, self._file(_TABLE_FILE))
+            self._discard_pending()
+
+            self.vectors = np.load(self._file(_VECTORS_FILE), mmap_mode="r")
+            self.table = table
+            self._offsets = dict(zip(table["content_hash"], table["offset"].astype(int)))
+            self._pending = {}
+            logger.info(f"Saved embedding store at {self.path}: {n_new} new, {n_old + n_new} total vectors.")
@@ -1,12 +1,20 @@
 """
 english_agent.py
-Module for English Agent logic (e.g., LLM or custom logic) using LangGraph for multi-turn, multi-agent conversations.
+Module for English Agent logic (e.g., LLM or custom logic) for multi-turn, multi-agent conversations.
+
+Each turn runs as a dependency graph (services/graph.py): apply_memory -> route -> dispatch, with
+the query embedding prefetched speculatively while the router is still classifying, so the
+recommendation and reviews agents usually find their vector already computed.
 """
 
 from typing import Dict, Any, Optional
 import logging
 from .state import AgentState
-from .router import llm_intent_router
+from .router import classify_intent, route_to_agent
+from .memory import apply_memory, schedule_summary
+from .config import get_cohere_embeddings
+from .graph import Graph, speculate, speculation_scope
+from .logging_setup import lazy
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +29,29 @@ def english_agent(text: str, state_dict: Optional[Dict[str, Any]] = None) -> Dic
     """
     logger.info(f"--- English Agent: Starting processing ---")
     state = AgentState.from_dict(state_dict or {})
+    with speculation_scope():
+        return _run_turn(text, state)
+
+def _start_turn(state: AgentState, text: str) -> None:
+    # Fold old turns into the running summary if last turn's background summary is ready
+    apply_memory(state)
     # Append current user input to history at the beginning of processing
     state.history.append(("user", text))
-    logger.debug(f"Current state: {state.to_dict()}")
+    logger.debug("Current state: %s", lazy(state.to_dict))
+
+def _run_turn(text: str, state: AgentState) -> Dict[str, Any]:
+    try:
+        # Most intents embed the raw user input; start it now so it overlaps the router's LLM call
+        speculate("embed_query", get_cohere_embeddings().embed_query, text)
+    except Exception as e:
+        logger.warning(f"English Agent: Could not start the query embedding prefetch: {e}")
+    turn = Graph("turn")
+    turn.add("apply_memory", lambda r: _start_turn(state, text))
+    turn.add("route", lambda r: classify_intent(state, text), deps=("apply_memory",))
+    # Route and get response from the appropriate agent
+    turn.add("dispatch", lambda r: route_to_agent(state, text, r["route"]), deps=("route",))
     try:
-        # Route and get response from the appropriate agent
-        result, new_state = llm_intent_router(state, text)
+        result, new_state = turn.run()["dispatch"]
 
         # Check if the routed agent returned an error
         if isinstance(result, dict) and "error" in result:
@@ -40,9 +65,13 @@ def english_agent(text: str, state_dict: Optional[Dict[str, Any]] = None) -> Dic
             ai_message = result["justification"]
             # Note: The actual products will need to be handled by the caller/frontend,
             # but the justification is the textual part for the history/response.
+            new_state.last_product_ids = [str(pid) for pid in result["product_ids"]]
+            schedule_summary(new_state)
             return {"ai_message": ai_message, "state": new_state.to_dict(), "product_ids": result["product_ids"]}
         # The new_state returned by the agent functions should now include the agent's response/error in history
         # Returning ai_message (string) and the state (dict)
+        # Summarize the turns the next request will fold, while the client reads this reply
+        schedule_summary(new_state)
         return {"ai_message": ai_message, "state": new_state.to_dict()}  # Return user-facing string response and state
     except Exception as e:
         logger.exception(f"An unexpected error occurred in english_agent for input: {text}. Error: {e}")
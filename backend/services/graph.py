@@ -0,0 +1,198 @@
+"""
+graph.py
+Small dependency-graph executor for the agent flow, plus request-scoped speculative prefetch.
+
+A Graph is a set of named nodes, each a function of the results of the nodes it depends on.
+run() starts every node as soon as its dependencies are done: the caller's thread runs the
+last-added ready node itself and the others go to a shared worker pool, so independent steps (an
+embedding, an index handle, a fuzzy catalog match) overlap instead of queueing behind each
+other. Nodes that wait on other pooled work (a nested graph) should be the ones that run in the
+caller's thread, i.e. the only node ready at that point. Every node runs in a copy of the caller's context (request ID, agent span, admission
+ticket) inside a tracing span named after the node, and the schedule (start offset and duration
+of each node) is logged per run.
+
+Speculation starts work whose result may be needed later in the request, e.g. the query
+embedding while the router is still classifying. It only uses spare upstream capacity (it never
+queues), and a consumer that finds no usable speculation simply does the work itself.
+
+Example:
+    graph = Graph("recommendation")
+    graph.add("embedding", lambda r: embed(text))
+    graph.add("index", lambda r: get_catalog_index())
+    graph.add("vector_query", lambda r: r["index"].query(vector=r["embedding"]), deps=("embedding", "index"))
+    results = graph.run()
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .tracing import span, counter
+from .admission import Overloaded, spare_capacity_only
+from .singleflight import no_coalescing
+
+logger = logging.getLogger(__name__)
+
+GRAPH_WORKERS = int(os.getenv("GRAPH_WORKERS", "32"))
+# A separate pool, so a node waiting for a speculation never waits behind other nodes for a thread
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "16"))
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+SPECULATIONS = counter("everglow_speculations_total", "Speculative prefetches by outcome (started, used, unused, failed, skipped).", ("kind", "outcome"))
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+_speculations: contextvars.ContextVar[Optional["_Speculations"]] = contextvars.ContextVar("speculations", default=None)
+
+
+def _get_executor(name: str, workers: int) -> ThreadPoolExecutor:
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        return _executors[name]
+
+
+class NodeFailed(Exception):
+    """A graph node raised; `node` names it and `error` is the original exception."""
+    def __init__(self, node: str, error: BaseException):
+        super().__init__(f"Graph node '{node}' failed: {error}")
+        self.node = node
+        self.error = error
+
+
+class _Node:
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Sequence[str]):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class Graph:
+    """A set of named steps and their dependencies, run with as much overlap as the dependencies allow."""
+    def __init__(self, name: str):
+        self.name = name
+        self._nodes: Dict[str, _Node] = {}
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Sequence[str] = ()) -> "Graph":
+        """Adds a node; fn receives the results of all finished nodes (at least its deps) keyed by name."""
+        if name in self._nodes:
+            raise ValueError(f"Graph {self.name}: duplicate node '{name}'.")
+        for dep in deps:
+            if dep not in self._nodes:
+                raise ValueError(f"Graph {self.name}: node '{name}' depends on unknown node '{dep}'.")
+        self._nodes[name] = _Node(name, fn, deps)
+        return self
+
+    def run(self, initial: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Runs every node once and returns the results keyed by node name (plus `initial`).
+        Raises NodeFailed for the first node that fails; nodes depending on it are not started and
+        nodes already running elsewhere finish in the background.
+        """
+        results: Dict[str, Any] = dict(initial or {})
+        pending = [node for node in self._nodes.values() if node.name not in results]
+        running: Dict[Future, _Node] = {}
+        timings: List[Tuple[str, float, float]] = []
+        start = time.perf_counter()
+
+        def execute(node: _Node) -> Any:
+            node_start = time.perf_counter()
+            try:
+                with span(node.name):
+                    return node.fn(results)
+            finally:
+                timings.append((node.name, node_start - start, time.perf_counter() - node_start))
+
+        try:
+            while pending or running:
+                ready = [node for node in pending if all(dep in results for dep in node.deps)]
+                for node in ready:
+                    pending.remove(node)
+                # All but one ready node go to the pool; the caller runs the last-added one itself
+                for node in ready[:-1]:
+                    running[_get_executor("graph-node", GRAPH_WORKERS).submit(contextvars.copy_context().run, execute, node)] = node
+                if ready:
+                    node = ready[-1]
+                    try:
+                        results[node.name] = execute(node)
+                    except Exception as e:
+                        raise NodeFailed(node.name, e) from e
+                    continue
+                if not running:
+                    unmet = {node.name: [d for d in node.deps if d not in results] for node in pending}
+                    raise ValueError(f"Graph {self.name}: nodes can never run: {unmet}")
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    if future.exception() is not None:
+                        raise NodeFailed(node.name, future.exception()) from future.exception()
+                    results[node.name] = future.result()
+        finally:
+            schedule = ", ".join(f"{name}=+{offset * 1000:.0f}ms/{elapsed * 1000:.0f}ms"
+                                 for name, offset, elapsed in sorted(timings, key=lambda t: t[1]))
+            logger.debug(f"Graph {self.name}: {(time.perf_counter() - start) * 1000:.0f}ms ({schedule})")
+        return results
+
+
+# --- Speculation ---
+class _Speculations:
+    """The speculative calls started during one request, and which of them were consumed."""
+    def __init__(self):
+        self.futures: Dict[Tuple[Any, ...], Future] = {}
+        self.used: set = set()
+
+
+@contextmanager
+def speculation_scope() -> Iterator[None]:
+    """Makes speculate()/speculative_result() available for the rest of the request."""
+    store = _Speculations()
+    token = _speculations.set(store)
+    try:
+        yield
+    finally:
+        for key in store.futures:
+            if key not in store.used:
+                SPECULATIONS.inc(kind=key[0], outcome="unused")
+        _speculations.reset(token)
+
+
+def _speculate_call(kind: str, fn: Callable, args: Tuple[Any, ...]) -> Any:
+    # Never leads an in-flight call: if it is shed for capacity, requests that joined it would fail too
+    with no_coalescing(), spare_capacity_only(), span(f"{kind}_prefetch"):
+        return fn(*args)
+
+
+def speculate(kind: str, fn: Callable, *args: Any) -> Optional[Future]:
+    """Starts fn(*args) in the background, keyed by (kind, *args), unless outside a speculation scope."""
+    store = _speculations.get()
+    if store is None or not SPECULATION_ENABLED:
+        return None
+    key = (kind,) + args
+    if key not in store.futures:
+        SPECULATIONS.inc(kind=kind, outcome="started")
+        store.futures[key] = _get_executor("speculation", SPECULATION_WORKERS).submit(contextvars.copy_context().run, _speculate_call, kind, fn, args)
+    return store.futures[key]
+
+
+def speculative_result(kind: str, fn: Callable, *args: Any) -> Any:
+    """fn(*args), taken from a matching speculation when there is one (waiting for it if still running)."""
+    store = _speculations.get()
+    key = (kind,) + args
+    future = store.futures.get(key) if store is not None else None
+    if future is not None:
+        store.used.add(key)
+        try:
+            result = future.result()
+            SPECULATIONS.inc(kind=kind, outcome="used")
+            return result
+        except Overloaded:
+            SPECULATIONS.inc(kind=kind, outcome="skipped")
+        except Exception as e:
+            SPECULATIONS.inc(kind=kind, outcome="failed")
+            logger.warning(f"Speculation: {kind} prefetch failed ({e}); computing it directly.")
+    return fn(*args)
@@ -0,0 +1,194 @@
+"""
+hedging.py
+Per-call deadlines and hedged requests for LLM calls.
+
+Every agent LLM call runs under a deadline (LLM_DEADLINE_<AGENT>, never beyond the request's own
+deadline). If the call is still running once it has taken longer than the agent's observed p90
+latency, one duplicate ("hedge") is sent and whichever answer arrives first wins. Hedges are
+capped at HEDGE_MAX_RATE of calls, only run when the llm upstream has a free slot (they never
+queue) and bypass single-flight so they really go to the provider again.
+
+When the deadline passes, DeadlineExceeded is raised and the agent answers with its fallback.
+The losing or abandoned call cannot be cancelled mid-request; it finishes in the background and
+its result is dropped.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, Optional
+
+from .tracing import counter
+from .admission import Overloaded, remaining_time, spare_capacity_only
+from .singleflight import no_coalescing
+from .cassette import CASSETTE_MODE
+
+logger = logging.getLogger(__name__)
+
+# Per-agent LLM deadline in seconds, overridable with LLM_DEADLINE_<AGENT>
+DEFAULT_DEADLINES = {
+    "router": 4.0,
+    "conversational_search": 8.0,
+    "recommendation": 6.0,
+    "reviews": 12.0,
+    "brand": 10.0,
+    "memory": 20.0,
+}
+LLM_DEADLINES: Dict[str, float] = {
+    agent: float(os.getenv(f"LLM_DEADLINE_{agent.upper()}", default))
+    for agent, default in DEFAULT_DEADLINES.items()
+}
+# Recording or replaying a cassette needs exactly one upstream call per invoke
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() in ("1", "true", "yes") and CASSETTE_MODE == "off"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))  # at most this fraction of calls are hedged
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "5"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.2"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # no hedging until the p90 is meaningful
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "64"))
+LATENCY_WINDOW = 256
+
+HEDGES = counter("everglow_llm_hedges_total", "Hedged LLM requests by outcome (sent, won, lost, skipped_rate, skipped_capacity).", ("agent", "outcome"))
+DEADLINES_EXCEEDED = counter("everglow_llm_deadlines_exceeded_total", "LLM calls abandoned at their deadline.", ("agent",))
+FALLBACKS = counter("everglow_agent_fallbacks_total", "Agent answers served from a fallback instead of the LLM.", ("agent", "reason"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """An LLM call did not finish within its agent's deadline."""
+    def __init__(self, agent: str, deadline: float):
+        super().__init__(f"{agent} LLM call exceeded its {deadline:.1f}s deadline")
+        self.agent = agent
+        self.deadline = deadline
+
+
+class _AgentStats:
+    """Recent primary-call latencies and the hedge token bucket for one agent."""
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.hedge_tokens = HEDGE_BURST
+
+    def hedge_delay(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(int(HEDGE_PERCENTILE * len(ordered)), len(ordered) - 1)
+        return max(ordered[index], HEDGE_MIN_DELAY)
+
+
+_stats: Dict[str, _AgentStats] = {}
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-call")
+        return _executor
+
+
+def _agent_stats(agent: str) -> _AgentStats:
+    with _lock:
+        return _stats.setdefault(agent, _AgentStats())
+
+
+def deadline_for(agent: str) -> float:
+    """The agent's LLM deadline, clamped to what is left of the current request."""
+    deadline = LLM_DEADLINES.get(agent, max(DEFAULT_DEADLINES.values()))
+    remaining = remaining_time()
+    return deadline if remaining is None else min(deadline, remaining)
+
+
+def record_fallback(agent: str, reason: str) -> None:
+    FALLBACKS.inc(agent=agent, reason=reason)
+    logger.warning(f"Hedging: {agent} answered from its fallback ({reason}).")
+
+
+def _take_hedge_token(stats: _AgentStats) -> bool:
+    with _lock:
+        if stats.hedge_tokens < 1:
+            return False
+        stats.hedge_tokens -= 1
+        return True
+
+
+def _submit(fn, *args) -> Future:
+    # Each call gets its own copy of the caller's context (request ID, spans, admission ticket)
+    return _get_executor().submit(contextvars.copy_context().run, fn, *args)
+
+
+def _run_hedge(agent: str, runnable: Any, payload: Any) -> Any:
+    with no_coalescing(), spare_capacity_only():
+        try:
+            return runnable.invoke(payload)
+        except Overloaded:
+            HEDGES.inc(agent=agent, outcome="skipped_capacity")
+            raise
+
+
+def invoke_with_deadline(agent: str, runnable: Any, payload: Any) -> Any:
+    """
+    runnable.invoke(payload) under the agent's deadline, hedged once at the agent's p90 latency.
+    Raises DeadlineExceeded when no answer arrives in time; other errors propagate unchanged.
+    """
+    deadline = deadline_for(agent)
+    if deadline <= 0:
+        DEADLINES_EXCEEDED.inc(agent=agent)
+        raise DeadlineExceeded(agent, 0.0)
+    stats = _agent_stats(agent)
+    with _lock:
+        stats.hedge_tokens = min(stats.hedge_tokens + HEDGE_MAX_RATE, HEDGE_BURST)
+    start = time.monotonic()
+    expires = start + deadline
+
+    primary = _submit(runnable.invoke, payload)
+
+    def _observe(future: Future) -> None:
+        # The full primary latency, hedged or not, so the p90 tracks the provider rather than the hedge
+        if future.exception() is None:
+            with _lock:
+                stats.latencies.append(time.monotonic() - start)
+    primary.add_done_callback(_observe)
+
+    futures = [primary]
+    hedge: Optional[Future] = None
+    delay = stats.hedge_delay() if HEDGE_ENABLED else None
+    if delay is not None and delay < deadline:
+        done, _ = wait([primary], timeout=delay)
+        if not done:
+            if _take_hedge_token(stats):
+                HEDGES.inc(agent=agent, outcome="sent")
+                logger.debug(f"Hedging: {agent} call still running after {delay:.2f}s; sending a hedge.")
+                hedge = _submit(_run_hedge, agent, runnable, payload)
+                futures.append(hedge)
+            else:
+                HEDGES.inc(agent=agent, outcome="skipped_rate")
+
+    error: Optional[BaseException] = None
+    while futures:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            break
+        done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            futures.remove(future)
+            if future.exception() is not None:
+                # A failed hedge never masks the primary; a failed primary still lets the hedge answer
+                if future is primary or error is None:
+                    error = future.exception()
+                continue
+            if future is hedge:
+                HEDGES.inc(agent=agent, outcome="won")
+            elif hedge is not None and not (hedge.done() and hedge.exception() is not None):
+                HEDGES.inc(agent=agent, outcome="lost")
+            return future.result()
+    if error is not None and not futures:
+        raise error
+    DEADLINES_EXCEEDED.inc(agent=agent)
+    logger.warning(f"Hedging: {agent} LLM call exceeded its {deadline:.1f}s deadline.")
+    raise DeadlineExceeded(agent, deadline)
@@ -0,0 +1,126 @@
+"""
+json_stream.py
+Incremental parser for the JSON objects the agents ask the LLM for.
+
+Text is fed as it streams in. Anything before the first '{' (prose, a ```json fence) and after
+the matching '}' is ignored, and each top-level field is available in `fields` as soon as its
+value is complete, so a caller can act on {"intent": ...} before the rest of the answer arrives.
+
+Example:
+    parser = JsonObjectStream()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if "intent" in parser.fields:
+            break
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+_WHITESPACE = " \t\r\n"
+
+
+class JsonStreamError(ValueError):
+    """The text did not contain a complete JSON object (or a field value was malformed)."""
+
+
+class JsonObjectStream:
+    """Parses one JSON object incrementally; top-level fields appear in `fields` as they complete."""
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._buffer: List[str] = []  # characters of the object from its opening '{'
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._phase = "key"  # key -> colon -> value -> (',' -> key | '}' -> done)
+        self._token_start: Optional[int] = None  # start of the current key or value in _buffer
+        self._key: Optional[str] = None
+
+    def feed(self, text: str) -> List[str]:
+        """Consumes the next chunk; returns the keys whose values completed within it."""
+        completed: List[str] = []
+        for char in text:
+            if self.complete:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._buffer.append(char)
+                continue
+            position = len(self._buffer)
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._string_closed(position, completed)
+                continue
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._token_start is None:
+                    self._token_start = position
+            elif char in "{[":
+                if self._depth == 1 and self._phase == "value" and self._token_start is None:
+                    self._token_start = position
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._phase == "value":
+                    self._finish_value(position + 1, completed)
+                elif self._depth == 0:
+                    if self._phase == "value" and self._token_start is not None:
+                        self._finish_value(position, completed)
+                    self.complete = True
+            elif self._depth == 1:
+                if char == ":" and self._phase == "colon":
+                    self._phase = "value"
+                elif char == ",":
+                    if self._phase == "value" and self._token_start is not None:
+                        self._finish_value(position, completed)
+                    self._phase = "key"
+                elif char not in _WHITESPACE and self._phase == "value" and self._token_start is None:
+                    self._token_start = position  # number, true, false or null
+        return completed
+
+    def _string_closed(self, end: int, completed: List[str]) -> None:
+        if self._phase == "key":
+            self._key = self._decode(self._token_start, end + 1)
+            self._token_start = None
+            self._phase = "colon"
+        elif self._phase == "value":
+            self._finish_value(end + 1, completed)
+
+    def _finish_value(self, end: int, completed: List[str]) -> None:
+        if self._key is not None and self._token_start is not None:
+            self.fields[self._key] = self._decode(self._token_start, end)
+            completed.append(self._key)
+        self._key = None
+        self._token_start = None
+        self._phase = "done_value"
+
+    def _decode(self, start: int, end: int) -> Any:
+        text = "".join(self._buffer[start:end]).strip()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise JsonStreamError(f"Malformed JSON value {text[:80]!r}: {e}") from e
+
+    def result(self) -> Dict[str, Any]:
+        """The parsed object; raises JsonStreamError unless a complete object was seen."""
+        if not self.complete:
+            raise JsonStreamError("No complete JSON object in the output.")
+        return dict(self.fields)
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """Parses the first JSON object in an LLM answer, ignoring fences and surrounding prose."""
+    parser = JsonObjectStream()
+    parser.feed(text)
+    return parser.result()
@@ -0,0 +1,184 @@
+"""
+logging_setup.py
+Queue-backed application logging: request threads only enqueue records, and a single listener
+thread formats them and writes to stdout.
+
+On the request thread a record is capped before it is queued: each string/container argument is
+rendered with a bounded repr and cut to LOG_MAX_FIELD_CHARS, and the message to
+LOG_MAX_MESSAGE_CHARS, so logging a long conversation costs a few KB instead of the whole
+history. Every record carries the current request ID. DEBUG records are sampled per request
+(LOG_DEBUG_SAMPLE_RATE): a sampled request keeps all of its debug lines, the others drop them
+before any formatting. Payloads that are expensive to build should be passed as lazy(fn, ...),
+which is only evaluated for records that are actually written.
+
+LOG_FORMAT=json writes one JSON object per line (time, level, logger, message, request_id and
+any `extra` fields); the default text format is unchanged.
+"""
+
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
+import reprlib
+import logging
+import threading
+import zlib
+from collections.abc import Mapping
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Optional, TextIO
+
+from .tracing import counter, current_request_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text or json
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "1000"))
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4000"))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+LOG_RECORDS_DROPPED = counter("everglow_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+# Standard LogRecord attributes; anything else on a record came from `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_repr = reprlib.Repr()
+_repr.maxstring = LOG_MAX_FIELD_CHARS
+_repr.maxother = LOG_MAX_FIELD_CHARS
+_repr.maxlevel = 4
+_repr.maxdict = _repr.maxlist = _repr.maxtuple = _repr.maxset = 20
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+class lazy:
+    """A log argument built only when the record is written, e.g. lazy(state.to_dict)."""
+    def __init__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return str(self.fn(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} chars truncated]"
+
+
+def _cap(value: Any) -> Any:
+    # Numbers and other scalars stay as they are so %d/%f directives keep working
+    if isinstance(value, str):
+        return truncate(value, LOG_MAX_FIELD_CHARS)
+    if isinstance(value, lazy):
+        return truncate(str(value), LOG_MAX_FIELD_CHARS)
+    if isinstance(value, (dict, list, tuple, set, frozenset)):
+        return truncate(_repr.repr(value), LOG_MAX_FIELD_CHARS)
+    return value
+
+
+def _request_sampled(request_id: str) -> bool:
+    # Stable per request, so a sampled request keeps all of its debug lines
+    return zlib.crc32(request_id.encode("utf-8")) % 10000 < LOG_DEBUG_SAMPLE_RATE * 10000
+
+
+class RequestContextFilter(logging.Filter):
+    """Attaches the request ID and drops the DEBUG records of unsampled requests."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = current_request_id()
+        record.request_id = request_id
+        if record.levelno <= logging.DEBUG and LOG_DEBUG_SAMPLE_RATE < 1.0:
+            if request_id is not None:
+                return _request_sampled(request_id)
+            return random.random() < LOG_DEBUG_SAMPLE_RATE
+        return True
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """Caps a record's arguments and message on the caller's thread, then queues it without blocking."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        args = record.args
+        if isinstance(args, Mapping) and "%(" in str(record.msg):
+            args = {key: _cap(value) for key, value in args.items()}
+        elif isinstance(args, Mapping):
+            args = (_cap(args),)
+        elif args:
+            args = tuple(_cap(arg) for arg in args)
+        record.args = args
+        message = record.getMessage()
+        record.msg = record.message = truncate(message, LOG_MAX_MESSAGE_CHARS)
+        record.args = None
+        if record.exc_info:
+            # Tracebacks need the live frames, so they are rendered here
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the request ID and any `extra` fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT, stream: Optional[TextIO] = None) -> QueueListener:
+    """
+    Routes the root logger through a bounded queue to a listener thread writing to stream (stdout).
+    Safe to call again (e.g. from a benchmark): the previous listener is flushed and replaced.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+        records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+        handler = TruncatingQueueHandler(records)
+        handler.addFilter(RequestContextFilter())
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        _listener = QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def stop_logging() -> None:
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,168 @@
+"""
+memory.py
+Rolling conversation memory: the last MEMORY_WINDOW_TURNS history entries are kept verbatim and
+older ones are folded into a running summary, so per-turn prompt size stays flat however long
+the session runs.
+
+Summaries are produced in the background after a turn has been answered. Because the client
+sends the state back with the next request, folding happens at the start of that request, once
+the summary for exactly those turns is ready; until then agents simply see the window.
+Folds happen in batches of MEMORY_FOLD_BATCH turns so one summary call covers several turns.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, List, Optional, Tuple
+
+from .state import AgentState
+from .tracing import span, counter
+from .token_budget import truncate_text
+from .hedging import invoke_with_deadline
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "rolling").strip().lower()  # "rolling" or "full"
+MEMORY_WINDOW_TURNS = int(os.getenv("MEMORY_WINDOW_TURNS", "8"))
+MEMORY_FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", "4"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "250"))
+MEMORY_SUMMARY_WORKERS = int(os.getenv("MEMORY_SUMMARY_WORKERS", "2"))
+MEMORY_SUMMARY_WAIT_SECONDS = float(os.getenv("MEMORY_SUMMARY_WAIT_SECONDS", "0"))  # how long a request may wait for a pending summary
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "2048"))
+
+SUMMARIES = counter("everglow_memory_summaries_total", "Background conversation summaries by outcome.", ("outcome",))
+FOLDS = counter("everglow_memory_folds_total", "Turns folded into a conversation summary, by whether the summary was ready.", ("outcome",))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_summaries: "OrderedDict[str, str]" = OrderedDict()
+_pending: dict = {}
+
+
+def rolling_enabled() -> bool:
+    return CONVERSATION_MEMORY == "rolling"
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MEMORY_SUMMARY_WORKERS, thread_name_prefix="memory-summary")
+    return _executor
+
+
+def turns_to_fold(history: List[Any]) -> int:
+    """Number of leading history entries to fold: whole batches beyond the verbatim window."""
+    overflow = len(history) - MEMORY_WINDOW_TURNS
+    if overflow < MEMORY_FOLD_BATCH:
+        return 0
+    return (overflow // MEMORY_FOLD_BATCH) * MEMORY_FOLD_BATCH
+
+
+def fold_fingerprint(summary: str, turns: List[Any]) -> str:
+    """Identifies one fold: the previous summary plus the exact turns being folded into it."""
+    payload = json.dumps([summary or "", [list(t) if isinstance(t, (list, tuple)) else t for t in turns]], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _format_turns(turns: List[Any]) -> str:
+    lines = []
+    for turn in turns:
+        if isinstance(turn, (list, tuple)) and len(turn) == 2:
+            lines.append(f"{str(turn[0]).capitalize()}: {turn[1]}")
+        else:
+            lines.append(str(turn))
+    return "\n".join(lines)
+
+
+def _summarize(previous_summary: str, turns: List[Any]) -> str:
+    from .prompts import summary_llm
+    payload = {"summary": previous_summary or "(none yet)", "turns": _format_turns(turns)}
+    with span("summary_llm", agent="memory"):
+        response = invoke_with_deadline("memory", summary_llm, payload)
+    return truncate_text(str(response.content).strip(), MEMORY_SUMMARY_TOKENS)
+
+
+def _store(fingerprint: str, future: Future) -> None:
+    with _lock:
+        _pending.pop(fingerprint, None)
+        try:
+            summary = future.result()
+        except Exception as e:
+            SUMMARIES.inc(outcome="error")
+            logger.error(f"Conversation summary {fingerprint[:8]} failed: {e}")
+            return
+        _summaries[fingerprint] = summary
+        _summaries.move_to_end(fingerprint)
+        while len(_summaries) > MEMORY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    SUMMARIES.inc(outcome="ok")
+
+
+def schedule_summary(state: AgentState) -> Optional[str]:
+    """
+    Starts a background summary for the turns the next request will want to fold.
+    Returns the fold fingerprint, or None when nothing needs folding yet.
+    """
+    if not rolling_enabled():
+        return None
+    n_fold = turns_to_fold(state.history)
+    if not n_fold:
+        return None
+    turns = list(state.history[:n_fold])
+    fingerprint = fold_fingerprint(state.summary, turns)
+    with _lock:
+        if fingerprint in _summaries or fingerprint in _pending:
+            return fingerprint
+        future = _get_executor().submit(_summarize, state.summary, turns)
+        _pending[fingerprint] = future
+    future.add_done_callback(lambda f: _store(fingerprint, f))
+    logger.debug(f"Scheduled conversation summary {fingerprint[:8]} for {n_fold} turns.")
+    return fingerprint
+
+
+def apply_memory(state: AgentState) -> bool:
+    """
+    Folds old turns into state.summary when their summary is ready (waiting at most
+    MEMORY_SUMMARY_WAIT_SECONDS for a pending one). Returns True if a fold happened.
+    """
+    if not rolling_enabled():
+        return False
+    n_fold = turns_to_fold(state.history)
+    if not n_fold:
+        return False
+    fingerprint = fold_fingerprint(state.summary, list(state.history[:n_fold]))
+    with _lock:
+        summary = _summaries.get(fingerprint)
+        future = _pending.get(fingerprint)
+    if summary is None and future is not None and MEMORY_SUMMARY_WAIT_SECONDS > 0:
+        try:
+            summary = future.result(timeout=MEMORY_SUMMARY_WAIT_SECONDS)
+        except (FutureTimeoutError, Exception):
+            summary = None
+    if summary is None:
+        FOLDS.inc(n_fold, outcome="not_ready")
+        if future is None:
+            schedule_summary(state)  # e.g. served by another worker last turn
+        return False
+    state.summary = summary
+    state.summarized_turns += n_fold
+    state.history = list(state.history[n_fold:])
+    FOLDS.inc(n_fold, outcome="folded")
+    logger.info(f"Conversation memory: folded {n_fold} turns into the summary ({state.summarized_turns} summarized so far).")
+    return True
+
+
+def memory_window(state: AgentState) -> List[Any]:
+    """The history entries agents should see verbatim."""
+    if not rolling_enabled():
+        return list(state.history)
+    return list(state.history[-MEMORY_WINDOW_TURNS:])
+
+
+def memory_context(state: AgentState) -> Tuple[str, List[Any]]:
+    """(summary of earlier conversation, verbatim window) for building agent prompts."""
+    return (state.summary if rolling_enabled() else ""), memory_window(state)
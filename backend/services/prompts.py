@@ -1,11 +1,12 @@
 from typing import Dict, Any, Optional
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from .config import llm
+from .config import get_llm
 from .data_utils import AVAILABLE_CATEGORIES, AVAILABLE_SKIN_CONCERNS, AVAILABLE_INGREDIENTS
 
 def make_agent_llm(system_prompt_template_str: str,
                    human_prompt_template_str: str = "{input}",
-                   template_format_kwargs: Optional[Dict[str, Any]] = None):
+                   template_format_kwargs: Optional[Dict[str, Any]] = None,
+                   task: str = "default"):
     formatted_system_prompt = system_prompt_template_str
     if template_format_kwargs:
         formatted_system_prompt = system_prompt_template_str.format(**template_format_kwargs)
@@ -14,7 +15,7 @@ def make_agent_llm(system_prompt_template_str: str,
         SystemMessagePromptTemplate.from_template(formatted_system_prompt),
         HumanMessagePromptTemplate.from_template(human_prompt_template_str)
     ])
-    return prompt | llm
+    return prompt | get_llm(task)
 
 # System prompts for each agent
 CONVERSATIONAL_SEARCH_SYSTEM_PROMPT_TEMPLATE = """You are a skincare expert. Your task is to perform Named Entity Recognition (NER) to identify and manage lists for 'categories', 'ingredients', and 'skin_concerns'.
@@ -90,18 +91,59 @@ compromising ethics, the environment, or your wallet.
 
 Answer questions conscisely but accurately addressing the user concerns in a positive, cheerful, optimistic and transparent manner."""
 
-# Instantiate LLMChains for each agent
-conversational_search_system_prompt_kwargs = {
-    "available_categories": ", ".join(AVAILABLE_CATEGORIES),
-    "available_ingredients": ", ".join(AVAILABLE_INGREDIENTS),
-    "available_skin_concerns": ", ".join(AVAILABLE_SKIN_CONCERNS)
-}
-
-conversational_search_llm = make_agent_llm(
-    CONVERSATIONAL_SEARCH_SYSTEM_PROMPT_TEMPLATE,
-    CONVERSATIONAL_SEARCH_HUMAN_PROMPT_TEMPLATE,
-    template_format_kwargs=conversational_search_system_prompt_kwargs
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a skincare shopping conversation. "
+    "Merge the new turns into the existing summary. Keep the shopper's stated needs, skin type and concerns, "
+    "categories, ingredients, budget, products discussed and their reactions; drop greetings and repetition. "
+    "Write at most 120 words of plain text."
 )
-recommendation_llm = make_agent_llm(RECOMMENDATION_SYSTEM_PROMPT)
-reviews_llm = make_agent_llm(REVIEWS_SYSTEM_PROMPT)
-brand_llm = make_agent_llm(BRAND_SYSTEM_PROMPT)
\ No newline at end of file
+
+SUMMARY_HUMAN_PROMPT_TEMPLATE = """Existing summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+def generic_brand_prompt(brand_name: str) -> str:
+    """Brand system prompt for a tenant that does not provide its own."""
+    return (f"You are an expert on the {brand_name} brand, its philosophy, sustainability and practices. "
+            "Answer questions concisely but accurately, in a positive, cheerful and transparent manner. "
+            "If you do not know something about the brand, say so rather than guessing.")
+
+def make_brand_prompts(vocabularies, brand_system_prompt: str) -> Dict[str, Any]:
+    """
+    The prompt chains that depend on a brand: NER over its catalog vocabularies and brand answers.
+    Keys: conversational_search (chain), conversational_search_system_prompt (rendered, for token
+    accounting), brand (chain), brand_system_prompt. One set per tenant (services/tenants.py).
+    """
+    categories, skin_concerns, ingredients = vocabularies
+    kwargs = {
+        "available_categories": ", ".join(categories),
+        "available_ingredients": ", ".join(ingredients),
+        "available_skin_concerns": ", ".join(skin_concerns)
+    }
+    # Brand prompts are text, not templates: escape braces before they become a system template
+    brand_template = brand_system_prompt.replace("{", "{{").replace("}", "}}")
+    return {
+        "conversational_search": make_agent_llm(
+            CONVERSATIONAL_SEARCH_SYSTEM_PROMPT_TEMPLATE,
+            CONVERSATIONAL_SEARCH_HUMAN_PROMPT_TEMPLATE,
+            template_format_kwargs=kwargs,
+            task="ner"
+        ),
+        "conversational_search_system_prompt": CONVERSATIONAL_SEARCH_SYSTEM_PROMPT_TEMPLATE.format(**kwargs),
+        "brand": make_agent_llm(brand_template, task="brand"),
+        "brand_system_prompt": brand_system_prompt,
+    }
+
+# Instantiate LLMChains for each agent; the brand-specific ones are the default tenant's
+DEFAULT_BRAND_PROMPTS = make_brand_prompts((AVAILABLE_CATEGORIES, AVAILABLE_SKIN_CONCERNS, AVAILABLE_INGREDIENTS), BRAND_SYSTEM_PROMPT)
+conversational_search_llm = DEFAULT_BRAND_PROMPTS["conversational_search"]
+# Rendered system prompt, used for token accounting (services/token_budget.py)
+conversational_search_system_prompt = DEFAULT_BRAND_PROMPTS["conversational_search_system_prompt"]
+recommendation_llm = make_agent_llm(RECOMMENDATION_SYSTEM_PROMPT, task="justification")
+reviews_llm = make_agent_llm(REVIEWS_SYSTEM_PROMPT, task="reviews")
+brand_llm = DEFAULT_BRAND_PROMPTS["brand"]
+summary_llm = make_agent_llm(SUMMARY_SYSTEM_PROMPT, SUMMARY_HUMAN_PROMPT_TEMPLATE, task="summary")
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+quantization.py
+Compact in-memory copies of the locally held embeddings (catalog and feedback stores) for
+nearest-neighbour search without a float32 matrix in RAM.
+
+Vectors are L2-normalized (search is by cosine) and stored as
+    codes   int8 (n, dim)         per-dimension scalar quantization: 1 byte per value instead of 4
+    bits    uint8 (n, dim / 8)    optional sign bits of the centered vector: 1 bit per value
+A search optionally prefilters by Hamming distance over the bits, scores the surviving
+candidates (or every row) on the int8 codes, and rescores the best of those at full precision
+from `full` when it is given, usually the embedding store's memory-mapped vectors.npy, which stays
+on disk and is paged in only for the few rows rescored.
+
+int8 scores are computed without dequantizing: for x ~ (code + 128) * scale + low per dimension,
+q . x = codes @ (q * scale) + q . (128 * scale + low), so a query costs one int8 x float matrix
+product over the candidates.
+
+See benchmarks/bench_quantization.py for recall@k against exact search and the memory per mode.
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BINARY_OVERSAMPLE = int(os.getenv("QUANT_BINARY_OVERSAMPLE", "30"))  # Hamming candidates per result
+RESCORE_OVERSAMPLE = int(os.getenv("QUANT_RESCORE_OVERSAMPLE", "4"))  # int8 candidates rescored per result
+_BLOCK_ROWS = 65536  # rows converted to float32 at a time
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[values]
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class QuantizedVectors:
+    """int8 (and optionally binary) codes of a set of vectors, searchable by cosine similarity."""
+    def __init__(self, ids: Sequence[str], codes: np.ndarray, scale: np.ndarray, low: np.ndarray,
+                 bits: Optional[np.ndarray] = None, center: Optional[np.ndarray] = None, full: Optional[np.ndarray] = None):
+        self.ids = [str(i) for i in ids]
+        self.codes = codes
+        self.scale = scale
+        self.low = low
+        self.bits = bits
+        self.center = center
+        self.full = full
+
+    @classmethod
+    def build(cls, ids: Sequence[str], vectors: np.ndarray, binary: bool = True, full: Optional[np.ndarray] = None) -> "QuantizedVectors":
+        """
+        Quantizes `vectors` (any float array, including a memmap) block by block, so a float32
+        copy of the whole matrix is never made. `full` (e.g. the same memmap) enables rescoring.
+        """
+        n, dim = vectors.shape
+        low = np.full(dim, np.inf, dtype=np.float32)
+        high = np.full(dim, -np.inf, dtype=np.float32)
+        total = np.zeros(dim, dtype=np.float64)
+        for start in range(0, n, _BLOCK_ROWS):
+            block = _normalized(vectors[start:start + _BLOCK_ROWS])
+            low = np.minimum(low, block.min(axis=0))
+            high = np.maximum(high, block.max(axis=0))
+            total += block.sum(axis=0)
+        scale = np.maximum(high - low, 1e-12) / 255.0
+        center = (total / max(n, 1)).astype(np.float32)
+
+        codes = np.empty((n, dim), dtype=np.int8)
+        bits = np.empty((n, (dim + 7) // 8), dtype=np.uint8) if binary else None
+        for start in range(0, n, _BLOCK_ROWS):
+            block = _normalized(vectors[start:start + _BLOCK_ROWS])
+            codes[start:start + len(block)] = np.clip(np.rint((block - low) / scale) - 128, -128, 127).astype(np.int8)
+            if binary:
+                bits[start:start + len(block)] = np.packbits(block > center, axis=1)
+        return cls(ids, codes, scale.astype(np.float32), low, bits, center if binary else None, full)
+
+    @classmethod
+    def from_store(cls, store: Any, binary: bool = True, rescore: bool = True) -> "QuantizedVectors":
+        """Codes for the vectors saved in an EmbeddingStore; with rescore=True its memmap is kept for rescoring."""
+        if store.vectors is None:
+            return cls([], np.empty((0, store.dim or 0), dtype=np.int8), np.ones(store.dim or 0, dtype=np.float32),
+                       np.zeros(store.dim or 0, dtype=np.float32))
+        # Rows of the memmap in offset order; it is quantized in place, never copied whole
+        ids = [""] * len(store.vectors)
+        for vector_id, offset in zip(store.table["id"].tolist(), store.table["offset"].astype(int).tolist()):
+            ids[offset] = vector_id
+        vectors = store.vectors
+        start = time.perf_counter()
+        quantized = cls.build(ids, vectors, binary=binary, full=vectors if rescore else None)
+        logger.info(f"Quantized {len(quantized)} vectors from {store.path} in {time.perf_counter() - start:.1f}s "
+                    f"({quantized.resident_bytes() / 2**20:.1f} MiB resident).")
+        return quantized
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def resident_bytes(self) -> int:
+        """Bytes of the arrays held in memory (the memory-mapped full-precision vectors are not counted)."""
+        arrays = [self.codes, self.scale, self.low] + [a for a in (self.bits, self.center) if a is not None]
+        return int(sum(a.nbytes for a in arrays))
+
+    def _hamming_candidates(self, query: np.ndarray, k: int) -> np.ndarray:
+        query_bits = np.packbits(query > self.center)
+        distances = np.empty(len(self), dtype=np.uint16)
+        for start in range(0, len(self), _BLOCK_ROWS):
+            block = self.bits[start:start + _BLOCK_ROWS]
+            distances[start:start + len(block)] = _popcount(np.bitwise_xor(block, query_bits)).sum(axis=1, dtype=np.uint16)
+        k = min(k, len(distances))
+        return np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+
+    def int8_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate cosine of a normalized query with the given rows (all rows by default)."""
+        weights = (query * self.scale).astype(np.float32)
+        bias = float(query @ (128.0 * self.scale + self.low))
+        if rows is not None:
+            return self.codes[rows].astype(np.float32) @ weights + bias
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _BLOCK_ROWS):
+            block = self.codes[start:start + _BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights + bias
+        return scores
+
+    def search(self, query: Sequence[float], top_k: int = 10, binary: bool = True, rescore: bool = True,
+               binary_oversample: int = BINARY_OVERSAMPLE, rescore_oversample: int = RESCORE_OVERSAMPLE) -> List[Tuple[str, float]]:
+        """
+        (id, cosine score) of the top_k nearest vectors, best first. binary=True prefilters to
+        top_k * binary_oversample rows by Hamming distance (when bits were built); rescore=True
+        re-ranks top_k * rescore_oversample int8 candidates at full precision (when `full` is set).
+        """
+        if not len(self):
+            return []
+        query = _normalized(np.asarray(query, dtype=np.float32))
+        rows = None
+        if binary and self.bits is not None:
+            rows = self._hamming_candidates(query, top_k * binary_oversample)
+        scores = self.int8_scores(query, rows)
+        if rescore and self.full is not None:
+            best = _top(scores, top_k * rescore_oversample)
+            best_rows = best if rows is None else rows[best]
+            order = np.argsort(best_rows)  # ascending offsets read the memmap sequentially
+            exact = _normalized(self.full[best_rows[order]]) @ query
+            final = _top(exact, top_k)
+            return [(self.ids[best_rows[order][i]], float(exact[i])) for i in final]
+        best = _top(scores, top_k)
+        best_rows = best if rows is None else rows[best]
+        return [(self.ids[row], float(scores[i])) for i, row in zip(best, best_rows)]
+
+    def save(self, path: str) -> None:
+        arrays: Dict[str, np.ndarray] = {"ids": np.asarray(self.ids, dtype=str), "codes": self.codes, "scale": self.scale, "low": self.low}
+        if self.bits is not None:
+            arrays.update(bits=self.bits, center=self.center)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str, full: Optional[np.ndarray] = None) -> "QuantizedVectors":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["ids"], data["codes"], data["scale"], data["low"],
+                       data["bits"] if "bits" in data else None, data["center"] if "center" in data else None, full)
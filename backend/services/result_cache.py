@@ -0,0 +1,107 @@
+"""
+result_cache.py
+In-memory cache of deterministic upstream results: query embeddings and vector-store queries.
+LLM completions are never cached.
+
+Entries are keyed like single-flight (kind, target and whitespace-normalized payload), so a query
+embedded once, by a shopper or by the startup warm-up (services/warmup.py), is served from memory
+afterwards. Each kind is an LRU of RESULT_CACHE_MAX_ENTRIES entries that expire after its TTL;
+vector-store results expire sooner because the catalog index changes on re-ingestion.
+
+Cached results are the same objects for every caller, so callers must treat them as read-only
+(the same contract as single-flight).
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .tracing import counter, gauge
+from .upstream import UpstreamCall, EMBED_QUERY, INDEX_QUERY
+from .singleflight import coalescing_key
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+# kind -> TTL in seconds; override with RESULT_CACHE_<KIND>_TTL_SECONDS
+DEFAULT_TTLS = {
+    EMBED_QUERY: 24 * 3600.0,
+    INDEX_QUERY: 600.0,
+}
+
+CACHE_LOOKUPS = counter("everglow_result_cache_lookups_total", "Result cache lookups by kind and outcome (hit, miss).", ("kind", "outcome"))
+CACHE_ENTRIES = gauge("everglow_result_cache_entries", "Entries held in the result cache.", ("kind",))
+
+
+class ResultCache:
+    """Thread-safe LRU with a per-entry expiry time."""
+    def __init__(self, kind: str, max_entries: int, ttl: float):
+        self.kind = kind
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                CACHE_ENTRIES.set(len(self._entries), kind=self.kind)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            CACHE_ENTRIES.set(len(self._entries), kind=self.kind)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            CACHE_ENTRIES.set(0, kind=self.kind)
+
+
+_caches: Dict[str, ResultCache] = {
+    kind: ResultCache(kind, RESULT_CACHE_MAX_ENTRIES, float(os.getenv(f"RESULT_CACHE_{kind.upper()}_TTL_SECONDS", ttl)))
+    for kind, ttl in DEFAULT_TTLS.items()
+}
+
+
+def get_result_cache(kind: str) -> Optional[ResultCache]:
+    return _caches.get(kind)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Entries, capacity and fill ratio per cached kind."""
+    return {kind: {"entries": len(cache), "capacity": cache.max_entries, "fill": round(len(cache) / cache.max_entries, 4)}
+            for kind, cache in _caches.items()}
+
+
+def result_cache_interceptor(call: UpstreamCall, proceed: Callable[[], Any]) -> Any:
+    """Upstream interceptor: serves repeated embedding and vector-store calls from memory."""
+    cache = _caches.get(call.kind)
+    if cache is None or not RESULT_CACHE_ENABLED:
+        return proceed()
+    key = coalescing_key(call)
+    hit, result = cache.get(key)
+    if hit:
+        CACHE_LOOKUPS.inc(kind=call.kind, outcome="hit")
+        return result
+    CACHE_LOOKUPS.inc(kind=call.kind, outcome="miss")
+    result = proceed()
+    cache.put(key, result)
+    return result
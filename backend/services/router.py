@@ -1,14 +1,22 @@
-import json
 import logging
 from langchain.prompts import PromptTemplate
 from .state import AgentState
-from .config import llm
+from .config import get_llm
+from .tracing import span, agent_span, record_agent_result, INTENTS
+from .token_budget import PromptBudget, record_completion
+from .memory import memory_context
+from .hedging import invoke_with_deadline, record_fallback, DeadlineExceeded
+from .json_stream import JsonObjectStream
 from .agents.conversational_search import conversational_search_agent
 from .agents.reviews import reviews_explanation_agent
 from .agents.brand import brand_answer_agent
+from .agents.similar import similar_products_agent, similar_seeds
 
 logger = logging.getLogger(__name__)
 
+router_llm = get_llm("router")
+VALID_INTENTS = ["recommend", "review_explanation", "brand_info", "search"]
+
 # Router prompt template
 router_prompt_template = """
 You are an AI assistant for a beauty and skincare store. Your task is to analyze the user's input and determine their primary intent to route them to the correct specialized agent.
@@ -35,79 +43,120 @@ router_prompt = PromptTemplate(
     template=router_prompt_template
 )
 
-def llm_intent_router(state: AgentState, user_input: str) -> (str, AgentState):
+class _StreamUntilField:
+    """Streams an LLM's JSON answer and stops reading (cancelling the rest) once `field` is complete."""
+    def __init__(self, llm, field: str):
+        self.llm = llm
+        self.field = field
+
+    def invoke(self, prompt):
+        parser = JsonObjectStream()
+
+        def on_chunk(text: str) -> bool:
+            parser.feed(text)
+            return self.field not in parser.fields
+
+        return self.llm.stream_until(prompt, on_chunk)
+
+def _dispatch(agent_name: str, agent_fn, state: AgentState, user_input: str):
+    """Runs a routed agent inside its tracing span and counts its outcome."""
+    with agent_span(agent_name):
+        result, new_state = agent_fn(state, user_input)
+    record_agent_result(agent_name, result)
+    return result, new_state
+
+def classify_intent(state: AgentState, user_input: str) -> str:
     """
-    Uses the LLM to classify intent from user input and route to the appropriate agent.
+    Uses the LLM to classify intent from user input and records it on the state.
     Does NOT perform entity extraction.
-    Returns the response and updated state from the routed agent.
     """
     logger.info(f"Intent Router: Starting intent classification for input: '{user_input}'.")
+
+    # "More like this" with a resolvable product is answered from the precomputed neighbour table
+    if similar_seeds(state, user_input):
+        state.intent = "similar"
+        INTENTS.inc(intent="similar")
+        logger.info("Intent Router: Similar-products request; skipping the router LLM.")
+        return "similar"
     
     router_output = None
     intent = "search"  # Default intent
     
     try:
-        # Prepare prompt input
+        # Prepare prompt input: up to 10 recent turns, fewer if they do not fit the router's token budget
+        budget = PromptBudget("router")
+        budget.add("template", router_prompt_template)
+        budget.add("input", user_input)
+        summary, window = memory_context(state)
+        summary = budget.fit_text("summary", summary) if summary else ""
+        history = budget.fit_history("history", window[-10:])
+        if summary:
+            # Earlier turns reach the router as a running summary instead of verbatim history
+            history = [("summary", summary)] + history
         prompt_input = {
             "input": user_input,
-            "history": state.history[-10:] if len(state.history) > 10 else state.history
+            "history": history
         }
-        logger.debug(f"Intent Router: Prompt input: {prompt_input}")
-        router_output = llm.invoke(router_prompt.format(**prompt_input))
-        logger.debug(f"Intent Router: Raw LLM output: {router_output}")
-
-        # Attempt to strip any leading/trailing whitespace and then parse
-        cleaned_output = str(router_output.content).strip()
-        # Handle cases where the LLM might output more than just JSON
-        if "```json" in cleaned_output:
-            cleaned_output = cleaned_output.split("```json")[1].split("```")[0].strip()
-        elif "```" in cleaned_output:
-            cleaned_output = cleaned_output.split("```")[1].strip()
-
-        # Further cleaning: try to find and extract the JSON object
-        json_start = cleaned_output.find('{')
-        json_end = cleaned_output.rfind('}')
-
-        if json_start != -1 and json_end != -1 and json_end > json_start:
-            cleaned_output = cleaned_output[json_start : json_end + 1]
-            logger.debug(f"Intent Router: Extracted potential JSON block: {cleaned_output}")
-        else:
-            logger.debug(f"Intent Router: No JSON block found, using cleaned output for fallback: {cleaned_output}")
-
-        logger.debug(f"Intent Router: Final cleaned LLM output for parsing: {cleaned_output}")
-
-        router_json = json.loads(cleaned_output)
-        intent = router_json.get("intent", "search")
-        logger.info(f"Intent Router: Classified intent: {intent}")
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Intent Router: Failed to decode JSON from LLM output. Error: {e}. Output was: {cleaned_output}", exc_info=True)
-        # If JSON decode fails, check if the output string is a valid intent name
-        valid_intents = ["recommend", "review_explanation", "brand_info", "search"]
-        if cleaned_output in valid_intents:
-            intent = cleaned_output
+        budget.record()
+        logger.debug("Intent Router: Prompt input: %s", prompt_input)
+        with span("router_llm", agent="router"):
+            # Streamed: the agent is dispatched as soon as the intent value is complete, not after the whole answer
+            router_output = invoke_with_deadline("router", _StreamUntilField(router_llm, "intent"), router_prompt.format(**prompt_input))
+        record_completion("router", router_output)
+        logger.debug("Intent Router: Raw LLM output: %s", router_output)
+
+        # The incremental parser skips ```json fences and prose around the object
+        raw_output = str(router_output.content).strip()
+        parser = JsonObjectStream()
+        parser.feed(raw_output)
+        if "intent" in parser.fields:
+            intent = str(parser.fields["intent"])
+            logger.info(f"Intent Router: Classified intent: {intent}")
+        elif raw_output in VALID_INTENTS:
+            # The LLM returned a bare intent name instead of JSON
+            intent = raw_output
             logger.warning(f"Intent Router: LLM returned non-JSON intent string: '{intent}'. Using it directly.")
         else:
             intent = "search"
-            logger.warning(f"Intent Router: LLM returned unexpected non-JSON output: '{cleaned_output}'. Falling back to search intent.")
+            logger.warning(f"Intent Router: LLM returned unexpected output without an intent: '{raw_output}'. Falling back to search intent.")
+
+    except DeadlineExceeded as e:
+        # A slow classification costs more than a generic search answer
+        logger.warning(f"Intent Router: {e}. Falling back to search intent.")
+        intent = "search"
+        record_fallback("router", "deadline")
     except Exception as e:
         logger.error(f"Intent Router: An unexpected error occurred during intent parsing. Error: {e}. Output was: {router_output}", exc_info=True)
         intent = "search"
         logger.warning("Intent Router: Unexpected error. Falling back to search intent.")
 
     state.intent = intent
+    INTENTS.inc(intent=intent)
     logger.info(f"Intent Router: Updated state intent: {state.intent}. State entities remain unchanged by router: {state.entities}")
 
-    # Route to the appropriate agent
+    return intent
+
+def route_to_agent(state: AgentState, user_input: str, intent: str) -> (str, AgentState):
+    """Runs the agent for a classified intent; returns its response and updated state."""
     if intent == "recommend":
         logger.info("Intent Router: Routing to conversational_search_agent with recommend intent.")
-        return conversational_search_agent(state, user_input)
+        return _dispatch("conversational_search", conversational_search_agent, state, user_input)
     elif intent == "review_explanation":
         logger.info("Intent Router: Routing to reviews_explanation_agent with review_explanation intent.")
-        return reviews_explanation_agent(state, user_input)
+        return _dispatch("reviews", reviews_explanation_agent, state, user_input)
+    elif intent == "similar":
+        logger.info("Intent Router: Routing to similar_products_agent with similar intent.")
+        return _dispatch("similar_products", similar_products_agent, state, user_input)
     elif intent == "brand_info":
         logger.info("Intent Router: Routing to brand_answer_agent with brand_info intent.")
-        return brand_answer_agent(state, user_input)
+        return _dispatch("brand", brand_answer_agent, state, user_input)
     else:
         logger.info("Intent Router: Routing to conversational_search_agent with default/search intent.")
-        return conversational_search_agent(state, user_input)
\ No newline at end of file
+        return _dispatch("conversational_search", conversational_search_agent, state, user_input)
+
+def llm_intent_router(state: AgentState, user_input: str) -> (str, AgentState):
+    """
+    Uses the LLM to classify intent from user input and route to the appropriate agent.
+    Returns the response and updated state from the routed agent.
+    """
+    return route_to_agent(state, user_input, classify_intent(state, user_input))
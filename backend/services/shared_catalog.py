@@ -0,0 +1,255 @@
+"""
+shared_catalog.py
+Product catalog published once into a read-only, memory-mapped Arrow segment shared by every
+uvicorn worker process.
+
+Layout of a segment directory (SHARED_CATALOG_DIR/catalog-<fingerprint>/):
+    products.arrow  the cleaned catalog rows (product_id first), in catalog order
+    ids.arrow       ID index: product_id, row, sorted by product_id
+    names.arrow     name index: lower-cased name, row, sorted by name
+    facets.arrow    facet index: facet (category/tag/ingredient), value, rows (list<int32>), sorted
+
+The fingerprint covers the source file's path, size and mtime, so editing the catalog publishes a
+new segment. The first worker to take the directory lock builds and publishes it (write to a temp
+directory, then rename); every other worker just memory-maps the files. The pages live once in
+/dev/shm (or the page cache), and the pandas view returned by frame() is zero-copy (ArrowDtype).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.compute as pc
+
+try:
+    import fcntl
+except ImportError:  # POSIX only; elsewhere concurrent first publishes are not serialised
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SHARED_CATALOG = os.getenv("SHARED_CATALOG", "true").lower() in ("1", "true", "yes")
+SHARED_CATALOG_DIR = os.getenv("SHARED_CATALOG_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+SEGMENT_VERSION = 1  # bump when the segment layout changes
+
+_PRODUCTS_FILE = "products.arrow"
+_IDS_FILE = "ids.arrow"
+_NAMES_FILE = "names.arrow"
+_FACETS_FILE = "facets.arrow"
+_SEGMENT_PREFIX = "catalog-"
+
+FACETS = ("category", "tag", "ingredient")
+
+
+def process_memory() -> Dict[str, int]:
+    """
+    Memory of this process in bytes from /proc: rss (resident), rss_anon (private heap),
+    rss_file and rss_shmem (shared mappings) and pss (shared pages split between their users).
+    Empty where /proc is unavailable.
+    """
+    fields = {"VmRSS:": "rss", "RssAnon:": "rss_anon", "RssFile:": "rss_file", "RssShmem:": "rss_shmem"}
+    memory: Dict[str, int] = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    memory[fields[parts[0]]] = int(parts[1]) * 1024
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] == "Pss:":
+                    memory["pss"] = int(parts[1]) * 1024
+    except OSError:
+        pass
+    return memory
+
+
+def format_memory(memory: Dict[str, int]) -> str:
+    return ", ".join(f"{key} {value / 2**20:.1f} MiB" for key, value in memory.items()) or "unavailable"
+
+
+def source_fingerprint(path: str) -> Optional[str]:
+    """Identifies one version of the source catalog file; None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, SEGMENT_VERSION])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _split_values(value: Any, separator: str) -> List[str]:
+    return [v.strip().lower() for v in str(value).split(separator) if v.strip()]
+
+
+def build_tables(df: pd.DataFrame) -> Dict[str, pa.Table]:
+    """The products table and its ID, name and facet indexes from a catalog DataFrame indexed by product_id."""
+    frame = df.reset_index()
+    frame["product_id"] = frame["product_id"].astype(str)
+    products = pa.Table.from_pandas(frame, preserve_index=False)
+
+    ids = sorted((pid, row) for row, pid in enumerate(frame["product_id"]))
+    names = sorted((str(name).lower(), row) for row, name in enumerate(frame["name"]))
+    postings: Dict[tuple, List[int]] = {}
+    extractors = {
+        "category": lambda r: [str(r["category"]).strip().lower()] if "category" in r else [],
+        "tag": lambda r: _split_values(r["tags"], "|") if "tags" in r else [],
+        "ingredient": lambda r: _split_values(r["top_ingredients"], ";") if "top_ingredients" in r else [],
+    }
+    for row, record in enumerate(frame.to_dict("records")):
+        for facet, extract in extractors.items():
+            for value in dict.fromkeys(extract(record)):
+                postings.setdefault((facet, value), []).append(row)
+    facet_keys = sorted(postings)
+
+    return {
+        _PRODUCTS_FILE: products,
+        _IDS_FILE: pa.table({"product_id": [i for i, _ in ids], "row": pa.array([r for _, r in ids], pa.int32())}),
+        _NAMES_FILE: pa.table({"name": [n for n, _ in names], "row": pa.array([r for _, r in names], pa.int32())}),
+        _FACETS_FILE: pa.table({
+            "facet": [f for f, _ in facet_keys],
+            "value": [v for _, v in facet_keys],
+            "rows": pa.array([postings[k] for k in facet_keys], pa.list_(pa.int32())),
+        }),
+    }
+
+
+def _write_table(path: str, table: pa.Table) -> None:
+    with pa.OSFile(path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path: str) -> pa.Table:
+    # Memory-mapped and zero-copy: the table's buffers point straight into the shared pages
+    return ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+class SharedCatalog:
+    """Read-only view of one published catalog segment."""
+    def __init__(self, path: str):
+        self.path = path
+        self.products = _read_table(os.path.join(path, _PRODUCTS_FILE))
+        self.ids = _read_table(os.path.join(path, _IDS_FILE))
+        self.names = _read_table(os.path.join(path, _NAMES_FILE))
+        self.facets = _read_table(os.path.join(path, _FACETS_FILE))
+        self._frame: Optional[pd.DataFrame] = None
+
+    def __len__(self) -> int:
+        return self.products.num_rows
+
+    def frame(self) -> pd.DataFrame:
+        """The catalog as a DataFrame indexed by product_id, backed by the shared Arrow buffers."""
+        if self._frame is None:
+            self._frame = self.products.to_pandas(types_mapper=pd.ArrowDtype).set_index("product_id")
+        return self._frame
+
+    @staticmethod
+    def _lower_bound(column: pa.ChunkedArray, key: str) -> int:
+        lo, hi = 0, len(column)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if column[mid].as_py() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def row_for_id(self, product_id: str) -> Optional[int]:
+        column = self.ids.column("product_id")
+        i = self._lower_bound(column, str(product_id))
+        if i < len(column) and column[i].as_py() == str(product_id):
+            return self.ids.column("row")[i].as_py()
+        return None
+
+    def products_by_ids(self, product_ids: List[str]) -> List[Dict[str, Any]]:
+        """Product records in request order; raises KeyError for an unknown ID (like DataFrame.loc)."""
+        rows = []
+        for product_id in product_ids:
+            row = self.row_for_id(product_id)
+            if row is None:
+                raise KeyError(product_id)
+            rows.append(row)
+        return self.products.take(pa.array(rows, pa.int32())).to_pylist()
+
+    def rows_with_name_prefix(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """Rows whose lower-cased name starts with prefix, in name order."""
+        prefix = prefix.lower()
+        column = self.names.column("name")
+        rows = []
+        i = self._lower_bound(column, prefix)
+        while i < len(column) and (limit is None or len(rows) < limit):
+            if not column[i].as_py().startswith(prefix):
+                break
+            rows.append(self.names.column("row")[i].as_py())
+            i += 1
+        return rows
+
+    def facet_values(self, facet: str) -> List[str]:
+        """Sorted distinct values of a facet (category, tag or ingredient)."""
+        return self.facets.filter(pc.equal(self.facets.column("facet"), facet)).column("value").to_pylist()
+
+    def facet_rows(self, facet: str, value: str) -> List[int]:
+        """Rows carrying a facet value, in catalog order."""
+        mask = pc.and_(pc.equal(self.facets.column("facet"), facet), pc.equal(self.facets.column("value"), value.lower()))
+        matches = self.facets.filter(mask).column("rows")
+        return matches[0].as_py() if len(matches) else []
+
+
+def _segment_path(fingerprint: str, directory: str) -> str:
+    return os.path.join(directory, f"{_SEGMENT_PREFIX}{fingerprint}")
+
+
+def publish(df: pd.DataFrame, fingerprint: str, directory: str = SHARED_CATALOG_DIR) -> str:
+    """Writes a segment for df under fingerprint (atomically) and removes older segments. Returns its path."""
+    path = _segment_path(fingerprint, directory)
+    staging = tempfile.mkdtemp(prefix=f".{_SEGMENT_PREFIX}", dir=directory)
+    try:
+        for name, table in build_tables(df).items():
+            _write_table(os.path.join(staging, name), table)
+        os.rename(staging, path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    for entry in os.listdir(directory):
+        # Workers still mapping an old segment keep their pages; the files just lose their names
+        if entry.startswith(_SEGMENT_PREFIX) and entry != os.path.basename(path):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    logger.info(f"Shared catalog: published {len(df)} products to {path}.")
+    return path
+
+
+def attach_or_publish(source_path: str, loader: Callable[[], pd.DataFrame],
+                      directory: str = SHARED_CATALOG_DIR) -> Optional[SharedCatalog]:
+    """
+    Attaches to the segment for the current version of source_path, publishing it first (from
+    loader()) if no worker has yet. Returns None when the source is missing or loads empty.
+    """
+    fingerprint = source_fingerprint(source_path)
+    if fingerprint is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = _segment_path(fingerprint, directory)
+    with open(os.path.join(directory, f".{_SEGMENT_PREFIX}lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.isdir(path):
+                df = loader()
+                if df is None or df.empty:
+                    return None
+                publish(df, fingerprint, directory)
+            else:
+                logger.info(f"Shared catalog: attaching to {path}.")
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return SharedCatalog(path)
@@ -0,0 +1,133 @@
+"""
+similar.py
+Precomputed "similar products" neighbour table.
+
+build_neighbour_table() computes every product's top-N cosine neighbours from the catalog
+embeddings in row blocks (one block x all-products matrix product at a time, sized to
+SIMILAR_BLOCK_BYTES), keeping the N best per row with argpartition. The table is stored as
+an .npz with
+    product_ids  (n,)    product IDs in row order
+    neighbours   (n, N)  int32 rows of the neighbours, best first (-1 pads rows with fewer)
+    scores       (n, N)  float16 cosine similarities
+so a lookup is a dict hit for the row and a slice of two small arrays. It is built offline by
+build_similar_products.py (also run at the end of preprocess_catalog_for_rag.py).
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .tenants import current_tenant
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_PRODUCTS_PATH = os.getenv("SIMILAR_PRODUCTS_PATH", os.path.join(os.path.dirname(__file__), "..", "similar_products.npz"))
+SIMILAR_TOP_N = int(os.getenv("SIMILAR_TOP_N", "20"))
+SIMILAR_BLOCK_BYTES = int(os.getenv("SIMILAR_BLOCK_BYTES", str(256 * 2**20)))  # per similarity block
+
+
+def build_neighbour_table(vectors: np.ndarray, top_n: int = SIMILAR_TOP_N,
+                          block_bytes: int = SIMILAR_BLOCK_BYTES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-N cosine neighbours of every row of `vectors` (a product is never its own neighbour).
+    Returns (neighbours int32 (n, N), scores float16 (n, N)), best first.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms > 0, norms, 1.0)
+    top_n = max(0, min(top_n, n - 1))
+    neighbours = np.full((n, top_n), -1, dtype=np.int32)
+    scores = np.zeros((n, top_n), dtype=np.float16)
+    if top_n == 0:
+        return neighbours, scores
+
+    block = max(1, min(n, block_bytes // (4 * n)))
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        similarity = unit[start:end] @ unit.T  # (block, n)
+        rows = np.arange(end - start)
+        similarity[rows, start + rows] = -np.inf
+        candidates = np.argpartition(-similarity, top_n - 1, axis=1)[:, :top_n]
+        candidate_scores = np.take_along_axis(similarity, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        neighbours[start:end] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:end] = np.take_along_axis(candidate_scores, order, axis=1)
+    return neighbours, scores
+
+
+def save_neighbour_table(path: str, product_ids: List[str], neighbours: np.ndarray, scores: np.ndarray) -> None:
+    """Writes the table atomically (temp file, then rename)."""
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, product_ids=np.asarray(product_ids, dtype=str),
+             neighbours=neighbours.astype(np.int32), scores=scores.astype(np.float16))
+    os.replace(tmp_path, path)
+    logger.info(f"Saved similar-products table for {len(product_ids)} products (top {neighbours.shape[1]}) to {path} "
+                f"({os.path.getsize(path) / 2**20:.1f} MiB).")
+
+
+class SimilarProducts:
+    """Read side of the neighbour table."""
+    def __init__(self, product_ids: np.ndarray, neighbours: np.ndarray, scores: np.ndarray):
+        self.product_ids = [str(pid) for pid in product_ids]
+        self.neighbours = neighbours
+        self.scores = scores
+        self._rows: Dict[str, int] = {pid: row for row, pid in enumerate(self.product_ids)}
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarProducts":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["product_ids"], data["neighbours"], data["scores"])
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def __contains__(self, product_id: str) -> bool:
+        return str(product_id) in self._rows
+
+    def similar(self, product_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """(product_id, cosine score) of the product's nearest neighbours, best first; [] if unknown."""
+        row = self._rows.get(str(product_id))
+        if row is None:
+            return []
+        ids = self.neighbours[row, :limit]
+        return [(self.product_ids[i], float(s)) for i, s in zip(ids, self.scores[row, :limit]) if i >= 0]
+
+    def similar_to_many(self, product_ids: Iterable[str], limit: int = 10) -> List[Tuple[str, float]]:
+        """Neighbours of several products merged by best score, excluding the products themselves."""
+        seeds = [str(pid) for pid in product_ids]
+        best: Dict[str, float] = {}
+        for seed in seeds:
+            for pid, score in self.similar(seed, self.neighbours.shape[1]):
+                if pid not in seeds and score > best.get(pid, -np.inf):
+                    best[pid] = score
+        return sorted(best.items(), key=lambda item: -item[1])[:limit]
+
+
+_similar: Optional[SimilarProducts] = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_similar_products() -> Optional[SimilarProducts]:
+    """The current tenant's neighbour table (SIMILAR_PRODUCTS_PATH for the default tenant), or None if not built."""
+    global _similar, _loaded
+    tenant = current_tenant()
+    if not tenant.is_default:
+        path = tenant.config.similar_products_path
+        return tenant.derived("similar_products", lambda: SimilarProducts.load(path) if path and os.path.exists(path) else None)
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if os.path.exists(SIMILAR_PRODUCTS_PATH):
+                    start = time.perf_counter()
+                    _similar = SimilarProducts.load(SIMILAR_PRODUCTS_PATH)
+                    logger.info(f"Loaded similar-products table for {len(_similar)} products in {(time.perf_counter() - start) * 1000:.0f}ms.")
+                else:
+                    logger.warning(f"No similar-products table at {SIMILAR_PRODUCTS_PATH}; run build_similar_products.py.")
+                _loaded = True
+    return _similar
@@ -0,0 +1,115 @@
+"""
+singleflight.py
+Coalesces identical concurrent upstream calls: while one LLM invoke, embedding or vector query is
+in flight, identical calls (same kind, target and whitespace-normalized inputs) wait for it and
+share its result instead of hitting the provider again. Nothing is cached after the call returns.
+
+Shared results are the same objects for every caller, so callers must treat them as read-only
+(the agents only read message content, vectors and match metadata).
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .tracing import counter, gauge
+from .upstream import UpstreamCall
+from .admission import remaining_time
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+COALESCED = counter("everglow_singleflight_coalesced_total", "Upstream calls served by another identical in-flight call.", ("kind",))
+LEADERS = gauge("everglow_singleflight_in_flight", "Distinct upstream calls currently in flight through single-flight.", ())
+
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("singleflight_bypass", default=False)
+
+
+@contextmanager
+def no_coalescing() -> Iterator[None]:
+    """
+    Calls made inside always go upstream themselves and are never joined by others: a hedge must
+    not join the call it hedges, and best-effort calls (spare_capacity_only) that may be shed must
+    not take identical request calls down with them.
+    """
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def coalescing_key(call: UpstreamCall) -> str:
+    canonical = json.dumps([call.kind, call.target, _normalize(call.payload)], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key share the outcome."""
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], kind: str = "") -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                LEADERS.set(len(self._flights))
+            else:
+                flight.followers += 1
+        if not leader:
+            COALESCED.inc(kind=kind)
+            if not flight.done.wait(remaining_time()):
+                raise TimeoutError(f"Timed out waiting for a coalesced {kind} call.")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                LEADERS.set(len(self._flights))
+            flight.done.set()
+            if flight.followers:
+                logger.debug(f"Single-flight: {kind} call shared with {flight.followers} identical concurrent callers.")
+
+
+_single_flight = SingleFlight()
+
+
+def singleflight_interceptor(call: UpstreamCall, proceed: Callable[[], Any]) -> Any:
+    """Upstream interceptor: identical concurrent calls share one in-flight upstream request."""
+    if not SINGLEFLIGHT_ENABLED or _bypass.get():
+        return proceed()
+    return _single_flight.do(coalescing_key(call), proceed, kind=call.kind)
@@ -19,12 +19,13 @@ MODEL = "#g1_whisper-large"  # You can make this configurable if needed
 
 logger = logging.getLogger(__name__)
 
-async def speech_to_text(audio_bytes: bytes, filename: str = "audio.mp3") -> str:
+async def speech_to_text(audio_bytes: bytes, filename: str = "audio.mp3", content_type: str = "audio/mpeg") -> str:
     """
     Converts audio bytes to text using the AIML API (async).
     Args:
-        audio_bytes (bytes): The audio data in bytes (must be mp3 or compatible with AIML API).
+        audio_bytes (bytes): The audio data in bytes (mp3, wav, or Opus in an Ogg/WebM container).
         filename (str): The filename to use for the upload (default: audio.mp3).
+        content_type (str): The MIME type of the upload (default: audio/mpeg).
     Returns:
         str: The transcribed text, or raises an error.
     """
@@ -35,7 +36,7 @@ async def speech_to_text(audio_bytes: bytes, filename: str = "audio.mp3") -> str
     url = f"{BASE_URL}/stt/create"
     headers = {"Authorization": f"Bearer {AIML_API_KEY}"}
     data = {"model": MODEL}
-    files = {"audio": (filename, io.BytesIO(audio_bytes), "audio/mpeg")}
+    files = {"audio": (filename, io.BytesIO(audio_bytes), content_type)}
     try:
         async with httpx.AsyncClient() as client:
             response = await client.post(url, data=data, headers=headers, files=files)
@@ -81,4 +82,5 @@ async def speech_to_text(audio_bytes: bytes, filename: str = "audio.mp3") -> str
         logger.exception("Exception in speech_to_text: %s", e)
         raise
 
-# TODO: Document required audio format for frontend (e.g., mp3).
\ No newline at end of file
+# Supported upload formats are listed in audio_formats.INPUT_FORMATS; compressed
+# formats (webm/ogg Opus) are sent to the API as-is without transcoding.
\ No newline at end of file
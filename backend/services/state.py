@@ -4,12 +4,16 @@ class AgentState:
     """
     Tracks the conversation state, including history, extracted entities, user intent, and active agent.
     """
-    def __init__(self, history=None, entities=None, intent=None, active_agent=None, followup_questions=None):
+    def __init__(self, history=None, entities=None, intent=None, active_agent=None, followup_questions=None,
+                 summary=None, summarized_turns=0, last_product_ids=None):
         self.history: List[Tuple[str, str]] = history or []  # List of (user, agent) tuples
         self.entities: Dict[str, Any] = entities or {}  # e.g., {"categories": ["serum"]}
         self.intent: Optional[str] = intent  # e.g., "search", "recommend", "review_explanation", "brand_info"
         self.active_agent: Optional[str] = active_agent  # e.g., "conversational_search"
         self.followup_questions: List[str] = followup_questions or []
+        self.summary: str = summary or ""  # running summary of turns folded out of history (services/memory.py)
+        self.summarized_turns: int = summarized_turns or 0
+        self.last_product_ids: List[str] = last_product_ids or []  # products shown last turn, for "more like these"
 
     def to_dict(self):
         return {
@@ -18,6 +22,9 @@ class AgentState:
             "intent": self.intent,
             "active_agent": self.active_agent,
             "followup_questions": self.followup_questions,
+            "summary": self.summary,
+            "summarized_turns": self.summarized_turns,
+            "last_product_ids": self.last_product_ids,
         }
 
     @classmethod
@@ -28,4 +35,7 @@ class AgentState:
             intent=d.get("intent"),
             active_agent=d.get("active_agent"),
             followup_questions=d.get("followup_questions", []),
+            summary=d.get("summary", ""),
+            summarized_turns=d.get("summarized_turns", 0),
+            last_product_ids=d.get("last_product_ids", []),
         )
\ No newline at end of file
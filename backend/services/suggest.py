@@ -0,0 +1,230 @@
+"""
+suggest.py
+Typeahead suggestions over product names, categories, skin-concern tags and ingredients, served
+from memory without touching the LLM, embedding or vector-store path.
+
+The index is a sorted array of lower-cased keys searched with bisect. Every word-start suffix of
+a term is a key ("hydra serum 3" and "serum 3" for "EverGlow Hydra Serum 3"), so typing any word
+of a name matches. Results are ranked by a popularity score precomputed at build time:
+  products   the catalog's `popularity` column, or SUGGEST_POPULARITY_PATH (JSON product_id -> score)
+  facets     the number of products carrying the category / tag / ingredient
+Both are scaled to 0..1 per type. The top results for every prefix of up to
+PRECOMPUTED_PREFIX_CHARS characters, and for any longer prefix matching more than MAX_SCAN_RANGE
+keys, are computed up front; any other prefix only scans a short key range.
+When the prefix search finds fewer than `limit` results, misspelt words are corrected to the
+closest catalog word (rapidfuzz, over the few hundred distinct words rather than every term) and
+the corrected query fills the rest, so typos still get an answer.
+"""
+
+import os
+import re
+import json
+import heapq
+import bisect
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from .data_utils import get_product_catalog_data
+from .tenants import current_tenant
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", "8"))
+SUGGEST_MAX_LIMIT = 25
+SUGGEST_FUZZY_CUTOFF = float(os.getenv("SUGGEST_FUZZY_CUTOFF", "75"))
+SUGGEST_POPULARITY_PATH = os.getenv("SUGGEST_POPULARITY_PATH", os.path.join(os.path.dirname(__file__), "..", "product_popularity.json"))
+PRECOMPUTED_PREFIX_CHARS = 3
+MAX_SCAN_RANGE = 256  # longer prefixes matching more keys than this get precomputed results too
+MIN_FUZZY_CHARS = 3
+
+# Facets shown as suggestions: (type, catalog column, separator or None for a single value)
+FACET_COLUMNS = [("category", "category", None), ("tag", "tags", "|"), ("ingredient", "top_ingredients", ";")]
+# Rank order between types at equal popularity: products first, then categories, tags, ingredients
+TYPE_ORDER = {"product": 0, "category": 1, "tag": 2, "ingredient": 3}
+
+_WORD = re.compile(r"\S+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+class _Term:
+    """One suggestable term: a product name or a facet value."""
+    __slots__ = ("text", "type", "product_id", "score", "rank")
+
+    def __init__(self, text: str, type_: str, product_id: Optional[str], score: float):
+        self.text = text
+        self.type = type_
+        self.product_id = product_id
+        self.score = score
+        # Sort key: most popular first, then by type, then shorter (more specific) text
+        self.rank = (-score, TYPE_ORDER[type_], len(text), text)
+
+    def to_dict(self) -> Dict[str, Any]:
+        suggestion = {"text": self.text, "type": self.type, "score": round(self.score, 4)}
+        if self.product_id is not None:
+            suggestion["product_id"] = self.product_id
+        return suggestion
+
+
+def _load_popularity(path: str) -> Dict[str, float]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {str(k): float(v) for k, v in json.load(f).items()}
+    except Exception as e:
+        logger.warning(f"Suggest: could not read popularity scores from {path}: {e}")
+        return {}
+
+
+def _scaled(values: Dict[Any, float]) -> Dict[Any, float]:
+    top = max(values.values(), default=0.0)
+    return {key: (value / top if top > 0 else 0.0) for key, value in values.items()}
+
+
+class SuggestIndex:
+    """Sorted-array prefix index with precomputed short-prefix results and a typo-correcting fallback."""
+    def __init__(self, terms: List[_Term]):
+        # Term IDs follow rank order, so the best matches in a key range are simply the smallest IDs
+        self.terms = sorted(terms, key=lambda term: term.rank)
+        entries: List[Tuple[str, int]] = []
+        for i, term in enumerate(self.terms):
+            key = normalize(term.text)
+            for match in _WORD.finditer(key):
+                entries.append((key[match.start():], i))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.term_ids = [i for _, i in entries]
+
+        # Top results for every short prefix, and for longer ones whose key range is too wide to scan
+        self.top: Dict[str, List[int]] = {}
+        candidates = list(zip(self.keys, self.term_ids))
+        n = 1
+        while candidates:
+            groups: Dict[str, List[int]] = {}
+            for key, i in candidates:
+                if len(key) >= n:
+                    groups.setdefault(key[:n], []).append(i)
+            wide = set()
+            for prefix, ids in groups.items():
+                if n <= PRECOMPUTED_PREFIX_CHARS or len(ids) > MAX_SCAN_RANGE:
+                    self.top[prefix] = heapq.nsmallest(SUGGEST_MAX_LIMIT, set(ids))
+                if len(ids) > MAX_SCAN_RANGE or n < PRECOMPUTED_PREFIX_CHARS:
+                    wide.add(prefix)
+            candidates = [(key, i) for key, i in candidates if key[:n] in wide and len(key) > n]
+            n += 1
+        # Words the fuzzy fallback corrects typed words to
+        self.vocabulary = sorted({word for key in self.keys for word in key.split()
+                                  if len(word) >= MIN_FUZZY_CHARS and word.isalpha()})
+        self._vocabulary_set = set(self.vocabulary)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _prefix(self, prefix: str, limit: int) -> List[int]:
+        if prefix in self.top:
+            return self.top[prefix][:limit]
+        if len(prefix) <= PRECOMPUTED_PREFIX_CHARS:
+            return []
+        # Not precomputed, so the key range holds at most MAX_SCAN_RANGE entries
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+        return heapq.nsmallest(limit, set(self.term_ids[lo:hi]))
+
+    def _known_prefix(self, word: str) -> bool:
+        i = bisect.bisect_left(self.vocabulary, word)
+        return i < len(self.vocabulary) and self.vocabulary[i].startswith(word)
+
+    def _corrected(self, query: str) -> Optional[str]:
+        """The query with misspelt words replaced by their closest vocabulary words; None if nothing changed."""
+        words = query.split()
+        changed = False
+        for j, word in enumerate(words):
+            if len(word) < MIN_FUZZY_CHARS or not word.isalpha():
+                continue
+            if j == len(words) - 1:
+                # Still being typed: compare with vocabulary prefixes of the same length
+                if self._known_prefix(word):
+                    continue
+                choices = list({w[:len(word)] for w in self.vocabulary})
+            else:
+                if word in self._vocabulary_set:
+                    continue
+                choices = self.vocabulary
+            match = process.extractOne(word, choices, scorer=fuzz.ratio, score_cutoff=SUGGEST_FUZZY_CUTOFF)
+            if match is not None:
+                words[j] = match[0]
+                changed = True
+        return " ".join(words) if changed else None
+
+    def suggest(self, query: str, limit: int = SUGGEST_LIMIT) -> List[Dict[str, Any]]:
+        """Up to `limit` suggestions for a partial query, prefix matches first, then typo-corrected ones."""
+        query = normalize(query)
+        limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+        if not query or not self.terms:
+            return []
+        ids = self._prefix(query, limit)
+        if len(ids) < limit:
+            corrected = self._corrected(query)
+            if corrected is not None:
+                seen = set(ids)
+                ids = ids + [i for i in self._prefix(corrected, limit) if i not in seen][:limit - len(ids)]
+        return [self.terms[i].to_dict() for i in ids]
+
+
+def build_suggest_index(df: pd.DataFrame, popularity: Optional[Dict[str, float]] = None) -> SuggestIndex:
+    """Builds the index from a catalog DataFrame indexed by product_id (as load_products_catalog returns it)."""
+    if df is None or df.empty or "name" not in df.columns:
+        return SuggestIndex([])
+    product_ids = [str(pid) for pid in df.index]
+    if popularity is None:
+        popularity = _load_popularity(SUGGEST_POPULARITY_PATH)
+    if "popularity" in df.columns:
+        column = pd.to_numeric(df["popularity"], errors="coerce").fillna(0.0).tolist()
+        popularity = {**dict(zip(product_ids, column)), **popularity}
+    product_scores = _scaled({pid: float(popularity.get(pid, 0.0)) for pid in product_ids})
+
+    terms = [_Term(str(name).strip(), "product", pid, product_scores[pid])
+             for pid, name in zip(product_ids, df["name"].tolist()) if str(name).strip()]
+    for type_, column, separator in FACET_COLUMNS:
+        if column not in df.columns:
+            continue
+        counts: Dict[str, int] = {}
+        for value in df[column].dropna().tolist():
+            parts = str(value).split(separator) if separator else [str(value)]
+            for part in {normalize(p) for p in parts if p.strip()}:
+                counts[part] = counts.get(part, 0) + 1
+        terms.extend(_Term(text, type_, None, score) for text, score in _scaled(counts).items())
+    return SuggestIndex(terms)
+
+
+_index: Optional[SuggestIndex] = None
+_index_source: Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """The index for the current catalog, rebuilt when the catalog DataFrame is replaced."""
+    global _index, _index_source
+    tenant = current_tenant()
+    if not tenant.is_default:
+        # Kept in the tenant's bundle, so it is evicted with the tenant's catalog
+        return tenant.derived("suggest_index", lambda: build_suggest_index(tenant.catalog))
+    df = get_product_catalog_data()
+    if _index is None or _index_source != id(df):
+        with _lock:
+            if _index is None or _index_source != id(df):
+                _index = build_suggest_index(df)
+                _index_source = id(df)
+                logger.info(f"Suggest: indexed {len(_index)} terms ({len(_index.keys)} keys).")
+    return _index
+
+
+def suggest(query: str, limit: int = SUGGEST_LIMIT) -> List[Dict[str, Any]]:
+    return get_suggest_index().suggest(query, limit)
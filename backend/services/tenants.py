@@ -0,0 +1,292 @@
+"""
+tenants.py
+Serves several brands (storefronts) from one process. Each tenant has a catalog bundle: its
+product catalog, the category / skin-concern / ingredient vocabularies derived from it, its
+Pinecone index names, its brand-specific prompt chains (NER vocabularies, brand answers) and any
+per-catalog structures built from those (suggest index, similar-products table).
+
+A request selects its tenant with the X-Tenant-ID header (main.py); the bundle is bound to the
+request context, so every service reads the right catalog through the usual accessors
+(get_product_catalog_data, get_catalog_index, get_tenant_prompts, ...). Requests without the header
+use the default tenant, which is the deployment's own configuration (CATALOG_PATH, the
+CATALOG/FEEDBACK_PINECONE_INDEX_NAME variables, prompts.py) and is always resident.
+
+Other tenants are declared in TENANTS_CONFIG_PATH, a JSON object of
+    tenant_id -> {"name", "catalog_path", "catalog_index", "feedback_index",
+                  "brand_prompt" or "brand_prompt_path", "similar_products_path"}
+and loaded on first use (concurrent first requests share one load). catalog_path, catalog_index
+and feedback_index are required: a tenant never falls back to the deployment's catalog or indexes. Loaded bundles are kept in
+LRU order and the least recently used are evicted once their catalogs exceed
+TENANT_MEMORY_BUDGET_MB; a request already holding an evicted bundle keeps using it.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .tracing import counter, gauge
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT_ID = os.getenv("DEFAULT_TENANT_ID", "everglow")
+TENANT_HEADER = "X-Tenant-ID"
+TENANTS_CONFIG_PATH = os.getenv("TENANTS_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "..", "tenants.json"))
+TENANT_MEMORY_BUDGET_MB = float(os.getenv("TENANT_MEMORY_BUDGET_MB", "1024"))
+
+TENANT_EVENTS = counter("everglow_tenant_bundle_events_total", "Tenant bundle lookups by event (hit, load, evict, error).", ("event",))
+TENANT_BUNDLES = gauge("everglow_tenant_bundles_loaded", "Non-default tenant bundles currently loaded.", ())
+TENANT_BYTES = gauge("everglow_tenant_bundle_bytes", "Estimated memory of the loaded non-default tenant bundles.", ())
+
+# (categories, skin concerns, ingredients)
+Vocabularies = Tuple[List[str], List[str], List[str]]
+
+
+class UnknownTenant(KeyError):
+    """The requested tenant ID is not configured."""
+
+
+REQUIRED_TENANT_FIELDS = ("catalog_path", "catalog_index", "feedback_index")
+
+
+class TenantConfig:
+    """Where a tenant's data lives. None means the deployment default (only the default tenant uses it)."""
+    def __init__(self, tenant_id: str, name: Optional[str] = None, catalog_path: Optional[str] = None,
+                 catalog_index: Optional[str] = None, feedback_index: Optional[str] = None,
+                 brand_prompt: Optional[str] = None, similar_products_path: Optional[str] = None):
+        self.tenant_id = tenant_id
+        self.name = name or tenant_id
+        self.catalog_path = catalog_path
+        self.catalog_index = catalog_index
+        self.feedback_index = feedback_index
+        self.brand_prompt = brand_prompt
+        self.similar_products_path = similar_products_path
+
+    @classmethod
+    def from_dict(cls, tenant_id: str, d: Dict[str, Any], base_dir: str) -> "TenantConfig":
+        missing = [field for field in REQUIRED_TENANT_FIELDS if not d.get(field)]
+        if missing:
+            # Left out, these would silently serve the default brand's catalog and reviews
+            raise ValueError(f"Tenant {tenant_id}: {', '.join(missing)} must be set in the tenants config.")
+        resolve = lambda path: os.path.join(base_dir, path) if path and not os.path.isabs(path) else path
+        brand_prompt = d.get("brand_prompt")
+        if brand_prompt is None and d.get("brand_prompt_path"):
+            with open(resolve(d["brand_prompt_path"]), "r", encoding="utf-8") as f:
+                brand_prompt = f.read()
+        return cls(
+            tenant_id,
+            name=d.get("name"),
+            catalog_path=resolve(d.get("catalog_path")),
+            catalog_index=d.get("catalog_index"),
+            feedback_index=d.get("feedback_index"),
+            brand_prompt=brand_prompt,
+            similar_products_path=resolve(d.get("similar_products_path")),
+        )
+
+
+class TenantBundle:
+    """Everything tenant-specific a request needs, loaded together and evicted together."""
+    def __init__(self, config: TenantConfig, catalog: Any = None, vocabularies: Optional[Vocabularies] = None,
+                 prompts: Optional[Dict[str, Any]] = None, is_default: bool = False):
+        self.config = config
+        self.tenant_id = config.tenant_id
+        self.is_default = is_default
+        self._catalog = catalog
+        self.vocabularies = vocabularies
+        self._prompts = prompts
+        self._derived: Dict[str, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+        self.nbytes = int(catalog.memory_usage(deep=True).sum()) if catalog is not None and not is_default else 0
+
+    @property
+    def catalog(self):
+        if self.is_default:
+            # The default catalog can be replaced at runtime (set_product_catalog_data)
+            from . import data_utils
+            return data_utils.PRODUCT_CATALOG_DATA
+        return self._catalog
+
+    @property
+    def prompts(self) -> Dict[str, Any]:
+        if self._prompts is None:
+            from .prompts import DEFAULT_BRAND_PROMPTS
+            self._prompts = DEFAULT_BRAND_PROMPTS
+        return self._prompts
+
+    def derived(self, name: str, factory: Callable[[], Any]) -> Any:
+        """A structure built from this tenant's catalog (e.g. its suggest index), built once per catalog object."""
+        source = id(self.catalog)
+        entry = self._derived.get(name)
+        if entry is None or entry[0] != source:
+            with self._lock:
+                entry = self._derived.get(name)
+                if entry is None or entry[0] != source:
+                    entry = self._derived[name] = (source, factory())
+        return entry[1]
+
+
+def load_tenant_bundle(config: TenantConfig) -> TenantBundle:
+    """Reads a tenant's catalog and builds its vocabularies and prompt chains."""
+    from .data_utils import load_products_catalog, catalog_vocabularies
+    from .prompts import make_brand_prompts, generic_brand_prompt
+    start = time.perf_counter()
+    catalog = load_products_catalog(config.catalog_path)
+    if catalog.empty:
+        # Not cached: the next request retries instead of serving an empty storefront
+        raise ValueError(f"Tenant {config.tenant_id}: catalog at {config.catalog_path} is missing or empty.")
+    vocabularies = catalog_vocabularies(catalog)
+    prompts = make_brand_prompts(vocabularies, config.brand_prompt or generic_brand_prompt(config.name))
+    bundle = TenantBundle(config, catalog, vocabularies, prompts)
+    logger.info(f"Tenant {config.tenant_id}: loaded {len(catalog)} products ({bundle.nbytes / 2**20:.1f} MiB) "
+                f"in {time.perf_counter() - start:.2f}s.")
+    return bundle
+
+
+def load_tenant_configs(path: str = TENANTS_CONFIG_PATH) -> Dict[str, TenantConfig]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return {str(tenant_id): TenantConfig.from_dict(str(tenant_id), d, base_dir) for tenant_id, d in entries.items()}
+
+
+class TenantRegistry:
+    """Lazily loaded tenant bundles in LRU order, evicted to stay under a memory budget."""
+    def __init__(self, configs: Dict[str, TenantConfig], memory_budget_bytes: float,
+                 loader: Callable[[TenantConfig], TenantBundle] = load_tenant_bundle):
+        self.configs = {tenant_id: config for tenant_id, config in configs.items() if tenant_id != DEFAULT_TENANT_ID}
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loader = loader
+        self.default = TenantBundle(TenantConfig(DEFAULT_TENANT_ID), is_default=True)
+        self._bundles: "OrderedDict[str, TenantBundle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads = SingleFlight()
+
+    def tenant_ids(self) -> List[str]:
+        return [DEFAULT_TENANT_ID] + sorted(self.configs)
+
+    def resident_bytes(self) -> int:
+        return sum(bundle.nbytes for bundle in self._bundles.values())
+
+    def get(self, tenant_id: Optional[str]) -> TenantBundle:
+        """The bundle for a tenant ID (the default tenant when empty); raises UnknownTenant."""
+        if not tenant_id or tenant_id == DEFAULT_TENANT_ID:
+            return self.default
+        if tenant_id not in self.configs:
+            raise UnknownTenant(tenant_id)
+        with self._lock:
+            bundle = self._bundles.get(tenant_id)
+            if bundle is not None:
+                self._bundles.move_to_end(tenant_id)
+                TENANT_EVENTS.inc(event="hit")
+                return bundle
+        return self._loads.do(tenant_id, lambda: self._load(tenant_id), kind="tenant")
+
+    def loaded(self, tenant_id: Optional[str]) -> Optional[TenantBundle]:
+        """Like get(), but returns None instead of loading, so async callers can load off the event loop."""
+        if not tenant_id or tenant_id == DEFAULT_TENANT_ID:
+            return self.default
+        if tenant_id not in self.configs:
+            raise UnknownTenant(tenant_id)
+        with self._lock:
+            bundle = self._bundles.get(tenant_id)
+            if bundle is not None:
+                self._bundles.move_to_end(tenant_id)
+                TENANT_EVENTS.inc(event="hit")
+            return bundle
+
+    def _load(self, tenant_id: str) -> TenantBundle:
+        try:
+            bundle = self.loader(self.configs[tenant_id])
+        except Exception:
+            TENANT_EVENTS.inc(event="error")
+            raise
+        TENANT_EVENTS.inc(event="load")
+        with self._lock:
+            self._bundles[tenant_id] = bundle
+            self._evict(keep=tenant_id)
+            TENANT_BUNDLES.set(len(self._bundles))
+            TENANT_BYTES.set(self.resident_bytes())
+        return bundle
+
+    def _evict(self, keep: str) -> None:
+        # Least recently used first; the bundle just loaded stays even if it alone exceeds the budget
+        while self.resident_bytes() > self.memory_budget_bytes:
+            victim = next((tenant_id for tenant_id in self._bundles if tenant_id != keep), None)
+            if victim is None:
+                logger.warning(f"Tenant {keep}: bundle of {self._bundles[keep].nbytes / 2**20:.1f} MiB exceeds the "
+                               f"{self.memory_budget_bytes / 2**20:.0f} MiB tenant memory budget on its own.")
+                return
+            evicted = self._bundles.pop(victim)
+            TENANT_EVENTS.inc(event="evict")
+            logger.info(f"Tenant {victim}: evicted ({evicted.nbytes / 2**20:.1f} MiB) to stay under the tenant memory budget.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": DEFAULT_TENANT_ID,
+            "configured": self.tenant_ids(),
+            "loaded": list(self._bundles),
+            "resident_mb": round(self.resident_bytes() / 2**20, 1),
+            "budget_mb": round(self.memory_budget_bytes / 2**20, 1),
+        }
+
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+_current: contextvars.ContextVar[Optional[TenantBundle]] = contextvars.ContextVar("tenant_bundle", default=None)
+
+
+def get_tenant_registry() -> TenantRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TenantRegistry(load_tenant_configs(), TENANT_MEMORY_BUDGET_MB * 2**20)
+                if _registry.configs:
+                    logger.info(f"Tenants: {', '.join(_registry.tenant_ids())} (default {DEFAULT_TENANT_ID}), "
+                                f"memory budget {TENANT_MEMORY_BUDGET_MB:.0f} MiB.")
+    return _registry
+
+
+def bind_tenant(bundle: TenantBundle) -> None:
+    """Binds a bundle to the current request context (and the worker threads it starts)."""
+    _current.set(bundle)
+
+
+def use_tenant(tenant_id: Optional[str]) -> TenantBundle:
+    """Loads (if needed) and binds the tenant's bundle to the current request context."""
+    bundle = get_tenant_registry().get(tenant_id)
+    bind_tenant(bundle)
+    return bundle
+
+
+def current_tenant() -> TenantBundle:
+    """The bundle bound to the current request, or the default tenant's."""
+    bundle = _current.get()
+    return bundle if bundle is not None else get_tenant_registry().default
+
+
+def current_tenant_id() -> str:
+    return current_tenant().tenant_id
+
+
+def tenant_setting(name: str, default: Any) -> Any:
+    """A TenantConfig field for the current tenant; `default` (the deployment setting) applies to the default tenant only."""
+    tenant = current_tenant()
+    value = getattr(tenant.config, name, None)
+    if value is None:
+        if not tenant.is_default:
+            raise ValueError(f"Tenant {tenant.tenant_id}: {name} is not configured.")
+        return default
+    return value
+
+
+def get_tenant_prompts() -> Dict[str, Any]:
+    """The current tenant's brand-specific prompt chains and rendered system prompts (prompts.make_brand_prompts)."""
+    return current_tenant().prompts
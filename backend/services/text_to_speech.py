@@ -8,6 +8,8 @@ import httpx
 import asyncio
 from dotenv import load_dotenv
 import logging
+from typing import Optional
+from .audio_formats import OUTPUT_FORMATS, transcode_audio
 
 # Load environment variables from .env
 load_dotenv()
@@ -15,22 +17,47 @@ load_dotenv()
 AIML_API_KEY = os.getenv("AIML_API_KEY")
 BASE_URL = "https://api.aimlapi.com/v1"
 TTS_MODEL = "#g1_aura-angus-en"
-CONTAINER = "wav"
 ENCODING = "linear16"
 SAMPLE_RATE = 24000
 
 logger = logging.getLogger(__name__)
 
-async def text_to_speech(text: str) -> bytes:
+def build_tts_payload(text: str, output_format: str = "wav", bitrate: Optional[int] = None) -> dict:
+    """
+    Builds the AIML TTS request payload for a natively supported output format.
+    Compressed encodings (opus/mp3) have a fixed sample rate upstream, so only WAV sends one.
+    """
+    fmt = OUTPUT_FORMATS[output_format]
+    payload = {
+        "model": TTS_MODEL,
+        "text": text,
+        "container": fmt["container"],
+        "encoding": fmt["encoding"],
+    }
+    if fmt["encoding"] == ENCODING:
+        payload["sample_rate"] = SAMPLE_RATE
+    if bitrate and fmt["bitrate"]:
+        payload["bit_rate"] = bitrate
+    return payload
+
+async def text_to_speech(text: str, output_format: str = "wav", bitrate: Optional[int] = None) -> bytes:
     """
     Converts text to audio bytes using the AIML API (async).
     Args:
         text (str): The text to synthesize.
+        output_format (str): One of audio_formats.OUTPUT_FORMATS (default: wav).
+        bitrate (int): Target bitrate in bits/s for compressed formats.
     Returns:
-        bytes: The audio data in WAV format.
+        bytes: The audio data in the requested format. Formats the upstream service
+        produces natively are returned untouched; the rest are transcoded from WAV.
     Raises:
         RuntimeError: If the API call fails or audio is not found in the response.
     """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported TTS output format: {output_format}")
+    if not OUTPUT_FORMATS[output_format]["native"]:
+        wav_bytes = await text_to_speech(text, output_format="wav")
+        return await transcode_audio(wav_bytes, output_format, bitrate)
     if not AIML_API_KEY:
         logger.error("AIML_API_KEY not set in environment variables.")
         raise ValueError("AIML_API_KEY not set in environment variables.")
@@ -41,13 +68,7 @@ async def text_to_speech(text: str) -> bytes:
         "Content-Type": "application/json",
         "Accept": "*/*"
     }
-    payload = {
-        "model": TTS_MODEL,
-        "text": text,
-        "container": CONTAINER,
-        "encoding": ENCODING,
-        "sample_rate": SAMPLE_RATE
-    }
+    payload = build_tts_payload(text, output_format, bitrate)
     try:
         async with httpx.AsyncClient() as client:
             response = await client.post(url, json=payload, headers=headers)
@@ -56,7 +77,7 @@ async def text_to_speech(text: str) -> bytes:
                 logger.error("AIML TTS error: %d - %s", response.status_code, response.text)
                 raise RuntimeError(f"AIML TTS error: {response.status_code} - {response.text}")
             if response.headers.get("content-type", "").startswith("audio") or response.headers.get("content-type", "").endswith("wav"):
-                logger.info("TTS succeeded, returning audio bytes.")
+                logger.info("TTS succeeded, returning %d bytes of %s audio.", len(response.content), output_format)
                 return response.content
             try:
                 data = response.json()
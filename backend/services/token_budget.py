@@ -0,0 +1,207 @@
+"""
+token_budget.py
+Token accounting and per-agent prompt budgets.
+
+Each agent assembles its prompt through a PromptBudget: fixed parts (system prompt, user input)
+are added first, then variable parts (history, retrieved context) are fitted into whatever is
+left of the agent's budget, newest/most relevant first. Every call records per-part token counts
+as metrics and in an in-process contributor report.
+"""
+
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .tracing import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4.0  # Gemini/SentencePiece averages ~4 characters per token on English text
+
+# Total prompt budget per agent, overridable with PROMPT_TOKEN_BUDGET_<AGENT>
+DEFAULT_BUDGETS = {
+    "router": 1200,
+    "conversational_search": 3000,
+    "recommendation": 1500,
+    "reviews": 3000,
+    "brand": 1500,
+}
+AGENT_TOKEN_BUDGETS: Dict[str, int] = {
+    agent: int(os.getenv(f"PROMPT_TOKEN_BUDGET_{agent.upper()}", default))
+    for agent, default in DEFAULT_BUDGETS.items()
+}
+MAX_TURN_TOKENS = int(os.getenv("PROMPT_MAX_TURN_TOKENS", "200"))  # long agent replies are clipped inside history
+
+PROMPT_TOKENS = histogram("everglow_prompt_tokens", "Estimated prompt tokens per LLM call.", ("agent",),
+                          buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+PROMPT_PART_TOKENS = counter("everglow_prompt_part_tokens_total", "Estimated prompt tokens by agent and prompt part.", ("agent", "part"))
+PROMPT_TRUNCATIONS = counter("everglow_prompt_truncations_total", "Prompt parts truncated to fit the agent's token budget.", ("agent", "part"))
+COMPLETION_TOKENS = counter("everglow_completion_tokens_total", "Completion tokens per agent (usage metadata, else estimated).", ("agent",))
+
+_report_lock = threading.Lock()
+_report: Dict[tuple, Dict[str, float]] = {}
+
+
+def count_tokens(text: Any) -> int:
+    """Cheap token estimate; no tokenizer round-trip on the request path."""
+    text = str(text or "")
+    return int(len(text) / CHARS_PER_TOKEN + 0.999) if text else 0
+
+
+def truncate_text(text: Any, max_tokens: int, marker: str = " ...") -> str:
+    """Clips text to roughly max_tokens, on a word boundary where possible."""
+    text = str(text or "")
+    max_chars = int(max(max_tokens, 0) * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    clipped = text[:max(max_chars - len(marker), 0)]
+    space = clipped.rfind(" ")
+    if space > len(clipped) * 0.8:
+        clipped = clipped[:space]
+    return clipped + marker
+
+
+def budget_for(agent: str) -> int:
+    return AGENT_TOKEN_BUDGETS.get(agent, max(DEFAULT_BUDGETS.values()))
+
+
+class PromptBudget:
+    """
+    Builds up one prompt's token accounting for an agent.
+
+    Example:
+        budget = PromptBudget("router")
+        budget.add("template", router_prompt_template)
+        budget.add("input", user_input)
+        history = budget.fit_history("history", state.history)
+        ...
+        budget.record()
+    """
+    def __init__(self, agent: str, budget: Optional[int] = None):
+        self.agent = agent
+        self.budget = budget if budget is not None else budget_for(agent)
+        self.parts: Dict[str, int] = {}
+        self.truncated: List[str] = []
+
+    @property
+    def used(self) -> int:
+        return sum(self.parts.values())
+
+    @property
+    def remaining(self) -> int:
+        return max(self.budget - self.used, 0)
+
+    def add(self, part: str, text: Any) -> Any:
+        """Accounts for a fixed part of the prompt and returns it unchanged."""
+        self.parts[part] = self.parts.get(part, 0) + count_tokens(text)
+        return text
+
+    def fit_text(self, part: str, text: Any, max_tokens: Optional[int] = None) -> str:
+        """Truncates a single text to the remaining budget (or max_tokens, if smaller)."""
+        limit = self.remaining if max_tokens is None else min(max_tokens, self.remaining)
+        fitted = truncate_text(text, limit)
+        if len(fitted) < len(str(text or "")):
+            self.truncated.append(part)
+            PROMPT_TRUNCATIONS.inc(agent=self.agent, part=part)
+        return self.add(part, fitted)
+
+    def fit_texts(self, part: str, texts: Sequence[Any], separator: str = "\n") -> List[str]:
+        """Keeps texts in order (most relevant first) while they fit; the last one may be clipped."""
+        kept: List[str] = []
+        available = self.remaining
+        truncated = False
+        for text in texts:
+            text = str(text)
+            cost = count_tokens(text) + count_tokens(separator)
+            if cost <= available:
+                kept.append(text)
+                available -= cost
+                continue
+            truncated = True
+            if available > 20:
+                kept.append(truncate_text(text, available - count_tokens(separator)))
+            break
+        if truncated:
+            self.truncated.append(part)
+            PROMPT_TRUNCATIONS.inc(agent=self.agent, part=part)
+            logger.info(f"Prompt budget ({self.agent}): kept {len(kept)} of {len(texts)} {part} entries to fit {self.budget} tokens.")
+        self.add(part, separator.join(kept))
+        return kept
+
+    def fit_history(self, part: str, history: Sequence[Any], format_turn: Callable[[Any], str] = str) -> List[Any]:
+        """
+        Keeps the most recent turns that fit the remaining budget, oldest first.
+        Turns longer than MAX_TURN_TOKENS are clipped rather than dropped.
+        """
+        kept: List[Any] = []
+        available = self.remaining
+        for turn in reversed(list(history)):
+            turn = _clip_turn(turn)
+            cost = count_tokens(format_turn(turn)) + 1
+            if cost > available:
+                break
+            kept.append(turn)
+            available -= cost
+        kept.reverse()
+        if len(kept) < len(history):
+            self.truncated.append(part)
+            PROMPT_TRUNCATIONS.inc(agent=self.agent, part=part)
+            logger.info(f"Prompt budget ({self.agent}): kept the last {len(kept)} of {len(history)} {part} turns to fit {self.budget} tokens.")
+        self.add(part, "\n".join(format_turn(t) for t in kept))
+        return kept
+
+    def record(self) -> int:
+        """Emits the per-part token counts as metrics and into the contributor report. Returns the total."""
+        total = self.used
+        PROMPT_TOKENS.observe(total, agent=self.agent)
+        with _report_lock:
+            for part, tokens in self.parts.items():
+                PROMPT_PART_TOKENS.inc(tokens, agent=self.agent, part=part)
+                stats = _report.setdefault((self.agent, part), {"calls": 0, "total_tokens": 0, "max_tokens": 0})
+                stats["calls"] += 1
+                stats["total_tokens"] += tokens
+                stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        if total > self.budget:
+            logger.warning(f"Prompt budget ({self.agent}): {total} tokens exceed the budget of {self.budget} (parts: {self.parts}).")
+        logger.debug(f"Prompt budget ({self.agent}): {total}/{self.budget} tokens {self.parts}")
+        return total
+
+
+def _clip_turn(turn: Any) -> Any:
+    """Clips the text of a (role, text) history turn to MAX_TURN_TOKENS."""
+    if isinstance(turn, (list, tuple)) and len(turn) == 2 and count_tokens(turn[1]) > MAX_TURN_TOKENS:
+        return (turn[0], truncate_text(turn[1], MAX_TURN_TOKENS))
+    return turn
+
+
+def record_completion(agent: str, message: Any) -> int:
+    """Counts completion tokens from the model's usage metadata when present, else estimates them."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    tokens = usage.get("output_tokens") or count_tokens(getattr(message, "content", message))
+    COMPLETION_TOKENS.inc(tokens, agent=agent)
+    return tokens
+
+
+def prompt_report(top: int = 20) -> List[Dict[str, Any]]:
+    """The biggest prompt contributors so far, by total tokens, with their share of the agent's prompt tokens."""
+    with _report_lock:
+        items = [(agent, part, dict(stats)) for (agent, part), stats in _report.items()]
+    agent_totals: Dict[str, float] = {}
+    for agent, _, stats in items:
+        agent_totals[agent] = agent_totals.get(agent, 0) + stats["total_tokens"]
+    rows = [
+        {
+            "agent": agent,
+            "part": part,
+            "calls": int(stats["calls"]),
+            "total_tokens": int(stats["total_tokens"]),
+            "mean_tokens": round(stats["total_tokens"] / stats["calls"], 1),
+            "max_tokens": int(stats["max_tokens"]),
+            "share_of_agent": round(stats["total_tokens"] / agent_totals[agent], 3) if agent_totals[agent] else 0.0,
+            "budget": budget_for(agent),
+        }
+        for agent, part, stats in items
+    ]
+    rows.sort(key=lambda r: r["total_tokens"], reverse=True)
+    return rows[:top]
@@ -0,0 +1,280 @@
+"""
+tracing.py
+Lightweight request tracing: per-stage latency spans attached to a request ID, and an
+in-process Prometheus-style metrics registry (counters, gauges and histograms) that is
+rendered in the text exposition format on /metrics.
+"""
+
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast local work up to slow LLM/STT calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_current_agent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_agent", default=None)
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, Optional[str], float, str]]]] = contextvars.ContextVar("request_spans", default=None)
+
+
+# --- Metrics registry ---
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (n, _escape(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def bucket_quantile(buckets: Sequence[float], counts: Optional[Sequence[int]], q: float) -> Optional[float]:
+    """Upper bound of the bucket holding quantile q, given per-bucket counts (last one is +Inf)."""
+    if not counts or not sum(counts):
+        return None
+    target = q * sum(counts)
+    running = 0
+    for bound, count in zip(tuple(buckets) + (float("inf"),), counts):
+        running += count
+        if running >= target:
+            return bound
+    return None
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        """Copy of every label set's bucket counts and sum, e.g. to diff two points in time."""
+        with self._lock:
+            return {k: (list(v), self._sums[k]) for k, v in self._counts.items()}
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Approximate quantile (upper bucket bound) for one label set, or None without data."""
+        return bucket_quantile(self.buckets, self._counts.get(self._key(labels)), q)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, list(v), self._sums[k]) for k, v in self._counts.items())
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {running}")
+            running += counts[-1]
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render_metrics() -> str:
+    """Renders every registered metric in the Prometheus text exposition format."""
+    return REGISTRY.render()
+
+
+STAGE_DURATION = histogram("everglow_stage_duration_seconds", "Latency of each request stage (LLM calls, embedding, vector query, STT, TTS).", ("stage", "agent"))
+STAGE_ERRORS = counter("everglow_stage_errors_total", "Stages that raised an exception.", ("stage", "agent"))
+REQUEST_DURATION = histogram("everglow_request_duration_seconds", "End-to-end request latency per endpoint.", ("endpoint",))
+REQUESTS = counter("everglow_requests_total", "Requests per endpoint and HTTP status.", ("endpoint", "status"))
+INTENTS = counter("everglow_intent_total", "Classified user intents.", ("intent",))
+AGENT_DURATION = histogram("everglow_agent_duration_seconds", "Latency of each agent, including its upstream calls.", ("agent",))
+AGENT_RESULTS = counter("everglow_agent_results_total", "Agent invocations by outcome (response, products, error).", ("agent", "outcome"))
+
+
+# --- Request context and spans ---
+def start_request(request_id: Optional[str] = None) -> str:
+    """Binds a (new) request ID and an empty span list to the current context. Returns the ID."""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    _request_spans.set([])
+    _current_agent.set(None)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def request_spans() -> List[Tuple[str, Optional[str], float, str]]:
+    """Completed spans of the current request as (stage, agent, seconds, status)."""
+    return list(_request_spans.get() or [])
+
+
+def format_request_spans() -> str:
+    return ", ".join(f"{stage}{'[' + agent + ']' if agent else ''}={seconds * 1000:.0f}ms{'' if status == 'ok' else ' (' + status + ')'}"
+                     for stage, agent, seconds, status in request_spans())
+
+
+@contextmanager
+def span(stage: str, agent: Optional[str] = None) -> Iterator[None]:
+    """
+    Times a stage of the current request. The agent label defaults to the enclosing
+    agent_span(), so e.g. the 'embedding' stage is broken down per agent.
+    """
+    agent = agent or _current_agent.get()
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        STAGE_ERRORS.inc(stage=stage, agent=agent or "")
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage, agent=agent or "")
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, agent, elapsed, status))
+        logger.debug(f"[{_request_id.get()}] span {stage} ({agent or '-'}) {elapsed * 1000:.1f}ms {status}")
+
+
+@contextmanager
+def agent_span(agent: str) -> Iterator[None]:
+    """Marks the current agent for nested spans and records the agent's own latency."""
+    token = _current_agent.set(agent)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        AGENT_DURATION.observe(time.perf_counter() - start, agent=agent)
+        _current_agent.reset(token)
+
+
+def record_agent_result(agent: str, result) -> None:
+    """Counts an agent result by outcome, based on the agents' shared result dict shape."""
+    if isinstance(result, dict) and "error" in result:
+        outcome = "error"
+    elif isinstance(result, dict) and "product_ids" in result:
+        outcome = "products"
+    else:
+        outcome = "response"
+    AGENT_RESULTS.inc(agent=agent, outcome=outcome)
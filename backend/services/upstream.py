@@ -0,0 +1,179 @@
+"""
+upstream.py
+Thin proxies around the upstream clients (Gemini chat model, Cohere embeddings, Pinecone indexes).
+Every call is described as an UpstreamCall and passed through a chain of interceptors before it
+reaches the real client, so cross-cutting behaviour (record/replay, caching, ...) can be added
+in one place instead of in every agent.
+"""
+
+import json
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+LLM_INVOKE = "llm_invoke"
+LLM_STREAM = "llm_stream"  # a streamed completion, possibly stopped early by the caller
+EMBED_QUERY = "embed_query"
+EMBED_DOCUMENTS = "embed_documents"
+INDEX_QUERY = "index_query"
+
+
+class UpstreamCall:
+    """One upstream request: its kind, the client it targets and a JSON-serializable payload."""
+    def __init__(self, kind: str, target: str, payload: Dict[str, Any]):
+        self.kind = kind
+        self.target = target
+        self.payload = payload
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of kind, target and payload; identical requests share a fingerprint."""
+        if self._fingerprint is None:
+            canonical = json.dumps([self.kind, self.target, self.payload], sort_keys=True, default=str, separators=(",", ":"))
+            self._fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def describe(self, limit: int = 120) -> str:
+        text = json.dumps(self.payload, default=str)
+        return f"{self.kind}:{self.target} {text[:limit]}{'...' if len(text) > limit else ''}"
+
+
+# An interceptor receives the call and a `proceed` function that runs the rest of the chain
+Interceptor = Callable[[UpstreamCall, Callable[[], Any]], Any]
+
+_interceptors: List[Interceptor] = []
+_interceptors_lock = threading.Lock()
+
+
+def add_interceptor(interceptor: Interceptor) -> None:
+    """Appends an interceptor; earlier interceptors wrap later ones."""
+    with _interceptors_lock:
+        if interceptor not in _interceptors:
+            _interceptors.append(interceptor)
+
+
+def remove_interceptor(interceptor: Interceptor) -> None:
+    with _interceptors_lock:
+        if interceptor in _interceptors:
+            _interceptors.remove(interceptor)
+
+
+def call_upstream(call: UpstreamCall, send: Callable[[], Any]) -> Any:
+    """Runs `send` (the real client call) behind every registered interceptor."""
+    chain = list(_interceptors)
+
+    def proceed(position: int = 0) -> Any:
+        if position == len(chain):
+            return send()
+        return chain[position](call, lambda: proceed(position + 1))
+
+    return proceed()
+
+
+# --- Result codecs: plain-JSON forms of each call kind's result (used by record/replay and caches) ---
+def encode_result(kind: str, result: Any) -> Any:
+    if kind in (LLM_INVOKE, LLM_STREAM):
+        return {"content": result.content, "response_metadata": getattr(result, "response_metadata", {}) or {}}
+    if kind == INDEX_QUERY:
+        return {"matches": [
+            {"id": m.id, "score": m.score, "metadata": dict(m.metadata or {})}
+            for m in result.matches
+        ]}
+    return result  # embeddings are already lists of floats
+
+
+def decode_result(kind: str, data: Any) -> Any:
+    if kind in (LLM_INVOKE, LLM_STREAM):
+        return AIMessage(content=data["content"], response_metadata=data.get("response_metadata", {}))
+    if kind == INDEX_QUERY:
+        return SimpleNamespace(matches=[SimpleNamespace(**m) for m in data["matches"]])
+    return data
+
+
+def _require(client: Any, target: str) -> Any:
+    if client is None:
+        raise RuntimeError(f"No upstream client configured for '{target}' (replay-only mode?).")
+    return client
+
+
+def _prompt_payload(value: Any) -> Any:
+    """JSON form of whatever is passed to a chat model: a string, a prompt value or messages."""
+    if hasattr(value, "to_messages"):
+        value = value.to_messages()
+    if isinstance(value, list):
+        return [{"type": getattr(m, "type", type(m).__name__), "content": getattr(m, "content", str(m))} for m in value]
+    return str(value)
+
+
+class LLMProxy(Runnable):
+    """Runnable wrapper around a chat model, so it still composes as `prompt | llm`."""
+    def __init__(self, inner: Optional[Runnable], name: str):
+        self.inner = inner
+        self.name = name
+
+    def invoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        call = UpstreamCall(LLM_INVOKE, self.name, {"input": _prompt_payload(input)})
+        return call_upstream(call, lambda: _require(self.inner, self.name).invoke(input, config=config, **kwargs))
+
+    def stream_until(self, input: Any, on_chunk: Callable[[str], bool], config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """
+        Streams the completion, passing each chunk's text to on_chunk until it returns False; the
+        stream is then closed, cancelling the remaining tokens. Returns the message received so far.
+        Replayed or coalesced calls return their message without calling on_chunk.
+        """
+        def send() -> Any:
+            message = None
+            stream = _require(self.inner, self.name).stream(input, config=config, **kwargs)
+            try:
+                for chunk in stream:
+                    message = chunk if message is None else message + chunk
+                    if on_chunk(str(chunk.content)) is False:
+                        break
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+            return message if message is not None else AIMessage(content="")
+
+        call = UpstreamCall(LLM_STREAM, self.name, {"input": _prompt_payload(input)})
+        return call_upstream(call, send)
+
+
+class EmbeddingsProxy:
+    """Wrapper around a LangChain embeddings model (embed_query / embed_documents)."""
+    def __init__(self, inner: Any, name: str):
+        self.inner = inner
+        self.name = name
+
+    def embed_query(self, text: str) -> List[float]:
+        call = UpstreamCall(EMBED_QUERY, self.name, {"text": text})
+        return call_upstream(call, lambda: _require(self.inner, self.name).embed_query(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        call = UpstreamCall(EMBED_DOCUMENTS, self.name, {"texts": list(texts)})
+        return call_upstream(call, lambda: _require(self.inner, self.name).embed_documents(texts))
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(_require(self.inner, self.name), attr)
+
+
+class IndexProxy:
+    """Wrapper around a Pinecone index; query() goes through the interceptors, the rest passes through."""
+    def __init__(self, inner: Any, name: str):
+        self.inner = inner
+        self.name = name
+
+    def query(self, **kwargs) -> Any:
+        call = UpstreamCall(INDEX_QUERY, self.name, kwargs)
+        return call_upstream(call, lambda: _require(self.inner, self.name).query(**kwargs))
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(_require(self.inner, self.name), attr)
@@ -0,0 +1,206 @@
+"""
+warmup.py
+Startup warm-up: replays popular queries through the embedding and retrieval layers in the
+background, so the first shoppers after a deploy find established upstream connections, resolved
+index handles and a filled result cache (services/result_cache.py).
+
+The queries come from WARMUP_QUERIES_PATH, a JSON list of strings or {"query", "entities"} objects
+(e.g. exported from the most frequent search queries), or else from the cross product of the
+WARMUP_TOP_CATEGORIES categories and WARMUP_TOP_SKIN_CONCERNS skin concerns with the most products
+("serum for dryness", filtered the way the recommendation agent filters). Each query is embedded
+and run against the catalog index exactly as recommendation_agent does.
+
+Cache entries are keyed on the exact query text (whitespace-normalized, case-sensitive), and the
+index query on the embedding of that text, so only replayed real queries fill entries that later
+shoppers hit. The synthetic fallback almost never matches what shoppers type: it opens upstream
+connections and resolves index handles, but adds few useful cache entries. The /ready report
+says which source was used ("configured" or "synthetic").
+
+Warm-up is rate-limited (WARMUP_QUERIES_PER_SECOND) and only uses spare upstream capacity, so it
+never queues ahead of a shopper's call. /ready reports not-ready until it finishes, or until
+WARMUP_READY_TIMEOUT_SECONDS have passed, and returns the warm-up report.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tracing import span, start_request, counter
+from .admission import Overloaded, spare_capacity_only
+from .singleflight import no_coalescing
+from .config import get_cohere_embeddings, get_catalog_index
+from .embedding_pipeline import TokenBucket
+from .result_cache import cache_stats
+from .data_utils import AVAILABLE_CATEGORIES, AVAILABLE_SKIN_CONCERNS, get_product_catalog_data
+from .agents.recommendation import build_metadata_filter
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_QUERIES_PATH = os.getenv("WARMUP_QUERIES_PATH", os.path.join(os.path.dirname(__file__), "..", "warmup_queries.json"))
+WARMUP_TOP_CATEGORIES = int(os.getenv("WARMUP_TOP_CATEGORIES", "8"))
+WARMUP_TOP_SKIN_CONCERNS = int(os.getenv("WARMUP_TOP_SKIN_CONCERNS", "6"))
+WARMUP_MAX_QUERIES = int(os.getenv("WARMUP_MAX_QUERIES", "200"))
+WARMUP_QUERIES_PER_SECOND = float(os.getenv("WARMUP_QUERIES_PER_SECOND", "5"))
+WARMUP_READY_TIMEOUT_SECONDS = float(os.getenv("WARMUP_READY_TIMEOUT_SECONDS", "120"))
+WARMUP_TOP_K = 10  # recommendation_agent's top_k; a different value would be a different cache key
+
+WARMUP_QUERIES = counter("everglow_warmup_queries_total", "Warm-up queries by outcome (warmed, skipped, failed).", ("outcome",))
+
+# (query text, entities for the metadata filter)
+WarmupQuery = Tuple[str, Dict[str, Any]]
+
+
+def _ranked(values: List[str], column: str, separator: Optional[str]) -> List[str]:
+    """Vocabulary values ordered by how many catalog products carry them (vocabulary order on ties)."""
+    counts: Dict[str, int] = {}
+    try:
+        df = get_product_catalog_data()
+        if df is not None and column in df.columns:
+            for value in df[column].dropna().tolist():
+                parts = str(value).split(separator) if separator else [str(value)]
+                for part in {p.strip().lower() for p in parts if p.strip()}:
+                    counts[part] = counts.get(part, 0) + 1
+    except Exception as e:
+        logger.warning(f"Warm-up: could not count catalog {column} values: {e}")
+    return sorted(values, key=lambda v: -counts.get(str(v).lower(), 0))
+
+
+def _load_queries(path: str) -> List[WarmupQuery]:
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    queries = []
+    for entry in entries:
+        if isinstance(entry, str):
+            queries.append((entry, {}))
+        else:
+            queries.append((str(entry["query"]), dict(entry.get("entities") or {})))
+    return queries
+
+
+def warmup_queries() -> Tuple[str, List[WarmupQuery]]:
+    """
+    ("configured", the top queries from WARMUP_QUERIES_PATH), or ("synthetic", the top categories x
+    skin concerns cross product), which warms connections rather than the cache.
+    """
+    if WARMUP_QUERIES_PATH and os.path.exists(WARMUP_QUERIES_PATH):
+        try:
+            return "configured", _load_queries(WARMUP_QUERIES_PATH)[:WARMUP_MAX_QUERIES]
+        except Exception as e:
+            logger.warning(f"Warm-up: could not read {WARMUP_QUERIES_PATH} ({e}); using categories x skin concerns.")
+    categories = _ranked(AVAILABLE_CATEGORIES, "category", None)[:WARMUP_TOP_CATEGORIES]
+    concerns = _ranked(AVAILABLE_SKIN_CONCERNS, "tags", "|")[:WARMUP_TOP_SKIN_CONCERNS]
+    queries = [(f"{category} for {concern}", {"categories": [category], "skin_concerns": [concern], "ingredients": []})
+               for category, concern in product(categories, concerns)]
+    return "synthetic", queries[:WARMUP_MAX_QUERIES]
+
+
+class Warmup:
+    """Runs the warm-up once in a background thread and keeps its report."""
+    def __init__(self, queries_per_second: float = WARMUP_QUERIES_PER_SECOND, ready_timeout: float = WARMUP_READY_TIMEOUT_SECONDS):
+        self.limiter = TokenBucket(queries_per_second)
+        self.ready_timeout = ready_timeout
+        self.state = "pending"  # pending, running, done, failed, disabled
+        self.queries = 0
+        self.source: Optional[str] = None  # configured, synthetic
+        self.outcomes = {"warmed": 0, "skipped": 0, "failed": 0}
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.cache_before: Dict[str, Dict[str, Any]] = {}
+        self.cache_after: Dict[str, Dict[str, Any]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            if not WARMUP_ENABLED:
+                self.state = "disabled"
+                return
+            self.started_at = time.monotonic()
+            self.state = "running"
+            self._thread = threading.Thread(target=contextvars.Context().run, args=(self._run,), name="warmup", daemon=True)
+            self._thread.start()
+
+    def _warm(self, text: str, entities: Dict[str, Any]) -> None:
+        # Same calls, in the same shape, as recommendation_agent. Not coalesced: a shopper's identical call
+        # must not join one that may be shed for capacity (the result cache is still filled)
+        with no_coalescing(), spare_capacity_only(), span("warmup"):
+            vector = get_cohere_embeddings().embed_query(text)
+            get_catalog_index().query(vector=vector, top_k=WARMUP_TOP_K, include_metadata=True,
+                                      filter=build_metadata_filter(entities) or {})
+
+    def _run(self) -> None:
+        start_request("warmup")
+        self.cache_before = cache_stats()
+        try:
+            self.source, queries = warmup_queries()
+            self.queries = len(queries)
+            logger.info(f"Warm-up: replaying {len(queries)} {self.source} queries at up to {self.limiter.rate:g}/s.")
+            if self.source == "synthetic":
+                logger.info(f"Warm-up: no {WARMUP_QUERIES_PATH}; synthetic queries warm upstream connections, "
+                            f"but rarely match the cache keys of real queries.")
+            for text, entities in queries:
+                self.limiter.acquire()
+                try:
+                    self._warm(text, entities)
+                    outcome = "warmed"
+                except Overloaded:
+                    # Shoppers are already using the upstream; their calls warm it anyway
+                    outcome = "skipped"
+                except Exception as e:
+                    logger.warning(f"Warm-up: query '{text}' failed: {e}")
+                    outcome = "failed"
+                self.outcomes[outcome] += 1
+                WARMUP_QUERIES.inc(outcome=outcome)
+            self.state = "done"
+        except Exception as e:
+            logger.exception(f"Warm-up: aborted: {e}")
+            self.state = "failed"
+        finally:
+            self.duration = time.monotonic() - self.started_at
+            self.cache_after = cache_stats()
+            logger.info(f"Warm-up: {self.report()}")
+
+    def is_ready(self) -> bool:
+        """True once warm-up has finished (however it ended), is disabled, or has run past its timeout."""
+        if self.state in ("done", "failed", "disabled"):
+            return True
+        return self.started_at is not None and time.monotonic() - self.started_at >= self.ready_timeout
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = self.duration if self.duration is not None else (time.monotonic() - self.started_at if self.started_at else 0.0)
+        cache = self.cache_after or cache_stats()
+        filled = {kind: stats["entries"] - self.cache_before.get(kind, {}).get("entries", 0) for kind, stats in cache.items()}
+        return {
+            "state": self.state,
+            "seconds": round(elapsed, 2),
+            "source": self.source,
+            "queries": self.queries,
+            **self.outcomes,
+            "cache_entries_added": filled,
+            "cache": cache,
+        }
+
+
+_warmup: Optional[Warmup] = None
+
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
+
+
+def start_warmup() -> Warmup:
+    """Starts the background warm-up (once per process) and returns it."""
+    warmup = get_warmup()
+    warmup.start()
+    return warmup
@@ -27,6 +27,8 @@ interface AgentState {
   intent: string | null;
   active_agent: string | null;
   followup_questions: string[];
+  summary?: string;
+  summarized_turns?: number;
 }
 
 interface ChatSearchBarProps {
@@ -322,7 +324,7 @@ export function ChatSearchBar({
         return;
       }
 
-      const ws = new WebSocket('ws://localhost:8000/ws/voice-agent'); // Ensure this URL is correct
+      const ws = new WebSocket('ws://localhost:8000/ws/voice-agent?input_format=webm&output_format=opus&bitrate=24000'); // MediaRecorder emits WebM/Opus; ask for Ogg/Opus back
       setWebsocket(ws);
 
       ws.onopen = () => {